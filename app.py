@@ -1,170 +1,153 @@
-from flask import Flask, jsonify, request # Импорт необходимых классов из Flask
-from sqlalchemy import create_engine, or_ # Импорт классов для создания движка базы данных и выполнения операций OR
-from sqlalchemy.orm import sessionmaker # Импорт класса для создания сессий
-from datetime import datetime # Импорт класса для работы с датой и временем
-from database_setup import Base, Doctor, Specialization, Patient, Appointment, Service, get_engine, create_all, drop_all # Импорт моделей и вспомогательных функций
+import io # Импорт модуля для потокового чтения тела запроса
+from flask import Flask, Response, jsonify, request, stream_with_context # Импорт необходимых классов из Flask
+from sqlalchemy.orm import sessionmaker, scoped_session # Импорт классов для создания сессий
+from database_setup import Doctor, get_engine, migrate # Импорт модели доктора и вспомогательных функций
+from archive import Archive, with_archived # Импорт архива старых назначений
+from bookings import create_appointment, update_appointment, patch_appointment, move_appointments, delete_appointment as remove_appointment # Импорт функций изменения назначений
+from bulk_import import DEFAULT_CHUNK_SIZE, read_csv, read_json_lines, import_records # Импорт массовой загрузки назначений
+from instrumentation import DatabaseStats, track_engine, track_sessions # Импорт счетчиков сессий и соединений пула
+from profiling import RequestProfiler # Импорт сбора метрик запросов и профилей медленных запросов
+from response_cache import ResponseCache # Импорт кэша ответов
+from scheduling import availability, parse_availability_args # Импорт расчета свободного времени
+from queries import TIME_FORMAT, serialize_row, search_statement, page_statement, group_by_day, encode_cursor, stream_json # Импорт общей проекции, сериализации и постраничной выдачи назначений
 
 app = Flask(__name__) # Создание экземпляра приложения Flask
 
 engine = get_engine() # Создание движка базы данных
-create_all(engine) # Создание всех таблиц в базе данных
-DBSession = sessionmaker(bind=engine) # Создание класса для создания сессий
+migrate(engine) # Создание всех таблиц и недостающих индексов в базе данных
+session_factory = sessionmaker(bind=engine) # Создание класса для создания сессий
+DBSession = scoped_session(session_factory) # Одна сессия на поток обработки запроса
+db_stats = DatabaseStats() # Счетчики открытых сессий и соединений пула
+track_engine(engine, db_stats) # Подсчет выдачи соединений из пула
+track_sessions(session_factory, db_stats) # Подсчет открытых сессий
+response_cache = ResponseCache(DBSession) # Кэш ответов GET-запросов до следующего изменения назначений
+profiler = RequestProfiler(engine) # Метрики запросов, включаются переменной окружения METRICS_ENABLED
+profiler.init_app(app) # Измерение каждого запроса приложения
+archive = Archive() # Архив старых назначений, подключается при первом поиске с include_archived
+
+@app.teardown_request # Регистрация функции, вызываемой после завершения каждого запроса
+@app.teardown_appcontext # и контекста приложения (запрос может выполняться внутри уже открытого контекста)
+def remove_session(exception=None): # Функция закрытия сессии запроса
+    DBSession.remove() # Откат незавершенной транзакции, закрытие сессии и возврат соединения в пул
 
 @app.route('/') # Определение маршрута для главной страницы
 def index(): # Функция для обработки запроса к главной странице
     return jsonify({"message": "Welcome to the Dental Clinic API"}) # Возвращает приветственное сообщение в формате JSON
 
+@app.route('/stats', methods=['GET']) # Определение маршрута для получения счетчиков базы данных
+def stats(): # Функция для обработки запроса на получение счетчиков базы данных
+    return jsonify(db_stats.as_dict()) # Возвращает счетчики сессий и соединений пула в формате JSON
+
+@app.route('/metrics', methods=['GET']) # Определение маршрута для получения метрик в формате Prometheus
+def metrics(): # Функция для обработки запроса на получение метрик
+    if not profiler.enabled: # Если сбор метрик выключен
+        return jsonify({"error": "Metrics are disabled"}), 404 # Возвращает ошибку отсутствия метрик
+    return Response(profiler.render(db_stats.as_dict()), mimetype='text/plain; version=0.0.4') # Возвращает гистограммы запросов и счетчики базы данных
+
+@app.route('/doctors/<int:doctor_id>/availability', methods=['GET']) # Определение маршрута для получения свободного времени доктора
+def doctor_availability(doctor_id): # Функция для обработки запроса на получение свободного времени доктора
+    try:
+        first_day, last_day, minutes = parse_availability_args(request.args) # Получение периода и нужной длительности свободного промежутка из запроса
+    except ValueError: # Обработка исключения, если параметры неверны
+        return jsonify({"error": "Invalid availability parameters"}), 400 # Возвращает ошибку параметров
+    session = DBSession() # Создание сессии
+    if session.get(Doctor, doctor_id) is None: # Проверка, что доктор существует
+        return jsonify({"error": "Doctor not found"}), 404 # Возвращает ошибку отсутствия доктора
+
+    slots = availability(session, doctor_id, first_day, last_day, minutes) # Вычисление свободных промежутков по рабочим дням
+    return jsonify({
+        "doctor_id": doctor_id,
+        "free": [{"start": start.strftime(TIME_FORMAT), "end": end.strftime(TIME_FORMAT)} for start, end in slots]
+    }) # Возвращает свободное время доктора в формате JSON
+
 @app.route('/search', methods=['GET']) # Определение маршрута для поиска назначений
+@response_cache.cached # Кэширование ответа до следующего изменения данных
 def search(): # Функция для обработки запроса на поиск назначений
-    query = request.args.get('query', '') # Получение параметра query из запроса
-    datetime_str = request.args.get('datetime', '') # Получение параметра datetime из запроса
+    group = request.args.get('group', '') # Получение параметра группировки из запроса
     session = DBSession() # Создание сессии
 
     try:
-        if datetime_str: # Проверка, если параметр datetime указан
-            search_date = datetime.strptime(datetime_str, '%Y-%m-%dT%H:%M') # Преобразование строки в объект datetime
-            results = session.query(Appointment).join(Doctor).join(Patient).join(Service).join(Specialization).filter(
-                Appointment.appointment_time == search_date
-            ).all() # Поиск назначений по дате и времени
-        else: # Если параметр datetime не указан
-            results = session.query(Appointment).join(Doctor).join(Patient).join(Service).join(Specialization).filter(or_(
-                Doctor.name.like(f'%{query}%'),
-                Specialization.name.like(f'%{query}%'),
-                Patient.name.like(f'%{query}%'),
-                Service.name.like(f'%{query}%')
-            )).all() # Поиск назначений по ключевому слову
-
-        return jsonify([{
-            'id': appointment.id,
-            'doctor': appointment.doctor.name,
-            'specialization': appointment.specialization.name,
-            'patient': appointment.patient.name,
-            'service': appointment.service.name,
-            'appointment_time': appointment.appointment_time.strftime('%Y-%m-%dT%H:%M')
-        } for appointment in results]) # Возвращает результаты поиска в формате JSON
-    except ValueError: # Обработка исключения, если формат даты и времени неверный
-        return jsonify({"error": "Invalid datetime format"}), 400 # Возвращает ошибку формата даты и времени
+        statement = search_statement(request.args) # Построение запроса по ключевому слову, периоду, доктору, пациенту и услуге
+    except ValueError as error: # Обработка исключения, если формат даты и времени или id неверный
+        return jsonify({"error": str(error)}), 400 # Возвращает ошибку параметров поиска
+    results = session.execute(statement).all() # Выполнение одного запроса для всех строк
+    if request.args.get('include_archived', '') in ('1', 'true'): # Поиск в архиве только по явному запросу
+        results = with_archived(request.args, results, archive) # Добавление архивных назначений
+
+    if group == 'day': # Если запрошена группировка по дням
+        return jsonify(group_by_day(results)) # Возвращает назначения, сгруппированные по дням
+    return jsonify([serialize_row(row) for row in results]) # Возвращает результаты поиска в формате JSON
 
 @app.route('/appointments', methods=['GET']) # Определение маршрута для получения списка назначений
+@response_cache.cached # Кэширование ответа до следующего изменения данных
 def get_appointments(): # Функция для обработки запроса на получение списка назначений
+    stream = request.args.get('stream', '') in ('1', 'true') # Получение признака потоковой выдачи из запроса
     session = DBSession() # Создание сессии
-    results = session.query(Appointment).join(Doctor).join(Patient).all() # Получение списка всех назначений
-    return jsonify([{
-        'id': appointment.id,
-        'doctor': appointment.doctor.name,
-        'specialization': appointment.specialization.name,
-        'patient': appointment.patient.name,
-        'service': appointment.service.name,
-        'appointment_time': appointment.appointment_time.strftime('%Y-%m-%dT%H:%M')
-    } for appointment in results]) # Возвращает список назначений в формате JSON
+
+    try:
+        statement, limit = page_statement(request.args) # Построение запроса страницы по параметрам limit и after
+    except ValueError: # Обработка исключения, если параметры постраничной выдачи неверны
+        return jsonify({"error": "Invalid pagination parameters"}), 400 # Возвращает ошибку параметров постраничной выдачи
+
+    if stream: # Если запрошена потоковая выдача
+        return Response(stream_with_context(stream_json(session, statement)), mimetype='application/json') # Возвращает JSON-массив по частям
+
+    results = session.execute(statement).all() # Получение страницы назначений одним запросом
+    response = jsonify([serialize_row(row) for row in results]) # Формирование списка назначений в формате JSON
+    if limit and len(results) == limit: # Если страница заполнена, возможно есть следующая
+        response.headers['X-Next-Cursor'] = encode_cursor(results[-1]) # Передача курсора следующей страницы в заголовке
+    return response # Возвращает список назначений в формате JSON
 
 @app.route('/appointments', methods=['POST']) # Определение маршрута для создания нового назначения
 def new_appointment(): # Функция для обработки запроса на создание нового назначения
-    data = request.get_json() # Получение данных из запроса в формате JSON
-    doctor_name = data.get('doctor_name') # Получение имени доктора из данных запроса
-    specialization_name = data.get('specialization_name') # Получение названия специализации из данных запроса
-    patient_name = data.get('patient_name') # Получение имени пациента из данных запроса
-    appointment_time = data.get('appointment_time') # Получение времени назначения из данных запроса
-    service_name = data.get('service') # Получение названия услуги из данных запроса
-    session = DBSession() # Создание сессии
-
-    appointment_time = datetime.strptime(appointment_time, '%Y-%m-%dT%H:%M') # Преобразование строки времени назначения в объект datetime
-
-    doctor = session.query(Doctor).filter_by(name=doctor_name).first() # Поиск записи о докторе по имени
-    if not doctor: # Если запись о докторе не найдена
-        doctor = Doctor(name=doctor_name) # Создание новой записи о докторе
-        session.add(doctor) # Добавление записи о докторе в сессию
-        session.commit() # Сохранение изменений в базе данных
-
-    patient = session.query(Patient).filter_by(name=patient_name).first() # Поиск записи о пациенте по имени
-    if not patient: # Если запись о пациенте не найдена
-        patient = Patient(name=patient_name) # Создание новой записи о пациенте
-        session.add(patient) # Добавление записи о пациенте в сессию
-        session.commit() # Сохранение изменений в базе данных
-
-    service = session.query(Service).filter_by(name=service_name).first() # Поиск записи об услуге по названию
-    if not service: # Если запись об услуге не найдена
-        service = Service(name=service_name) # Создание новой записи об услуге
-        session.add(service) # Добавление записи об услуге в сессию
-        session.commit() # Сохранение изменений в базе данных
-
-    specialization = session.query(Specialization).filter_by(name=specialization_name).first() # Поиск записи о специализации по названию
-    if not specialization: # Если запись о специализации не найдена
-        specialization = Specialization(name=specialization_name) # Создание новой записи о специализации
-        session.add(specialization) # Добавление записи о специализации в сессию
-        session.commit() # Сохранение изменений в базе данных
-
-    new_appointment = Appointment( # Создание нового назначения
-        doctor_id=doctor.id,
-        patient_id=patient.id,
-        service_id=service.id,
-        specialization_id=specialization.id,
-        appointment_time=appointment_time
-    )
-    session.add(new_appointment) # Добавление нового назначения в сессию
-    session.commit() # Сохранение изменений в базе данных
-
-    return jsonify({"id": new_appointment.id, "message": "Appointment created successfully"}), 201 # Возвращает сообщение об успешном создании назначения
+    data = request.get_json(silent=True) # Получение данных запроса в формате JSON или None
+    if not isinstance(data, dict): # Проверка, что тело запроса является объектом
+        return jsonify({"error": "Invalid JSON body"}), 400 # Возвращает ошибку тела запроса
+    body, status = create_appointment(DBSession(), data) # Создание назначения по данным запроса в формате JSON
+    return jsonify(body), status # Возвращает результат создания назначения
+
+@app.route('/appointments/bulk', methods=['POST']) # Определение маршрута для массовой загрузки назначений
+def bulk_import_appointments(): # Функция для обработки запроса на массовую загрузку назначений
+    try:
+        chunk_size = int(request.args.get('chunk_size', DEFAULT_CHUNK_SIZE)) # Получение размера порции из запроса
+        if chunk_size < 1: # Проверка, что размер порции положительный
+            raise ValueError(chunk_size)
+    except ValueError: # Обработка исключения, если размер порции неверный
+        return jsonify({"error": "Invalid chunk size"}), 400 # Возвращает ошибку размера порции
+
+    if request.mimetype == 'text/csv': # Если тело запроса в формате CSV
+        records = read_csv(io.TextIOWrapper(request.stream, encoding='utf-8', errors='surrogateescape', newline='')) # Потоковое чтение CSV
+    elif request.mimetype in ('application/x-ndjson', 'application/jsonl'): # Если тело запроса в формате JSON Lines
+        records = read_json_lines(io.TextIOWrapper(request.stream, encoding='utf-8', errors='surrogateescape')) # Потоковое чтение JSON Lines
+    elif request.mimetype == 'application/json' and isinstance(request.get_json(silent=True), list): # Если тело запроса является JSON-массивом
+        records = request.get_json() # Получение списка записей
+    else: # Если формат тела запроса не поддерживается
+        return jsonify({"error": "Unsupported content type"}), 415 # Возвращает ошибку формата
+
+    return jsonify(import_records(engine, records, chunk_size)) # Возвращает отчет о загрузке с ошибками строк и пропускной способностью
 
 @app.route('/appointments/<int:appointment_id>', methods=['PUT']) # Определение маршрута для обновления существующего назначения
 def edit_appointment(appointment_id): # Функция для обработки запроса на обновление существующего назначения
-    data = request.get_json() # Получение данных из запроса в формате JSON
-    session = DBSession() # Создание сессии
-    appointment = session.query(Appointment).filter_by(id=appointment_id).one() # Поиск назначения по id
-
-    doctor_name = data.get('doctor_name') # Получение имени доктора из данных запроса
-    specialization_name = data.get('specialization_name') # Получение названия специализации из данных запроса
-    patient_name = data.get('patient_name') # Получение имени пациента из данных запроса
-    appointment_time = data.get('appointment_time') # Получение времени назначения из данных запроса
-    service_name = data.get('service') # Получение названия услуги из данных запроса
-
-    appointment_time = datetime.strptime(appointment_time, '%Y-%m-%dT%H:%M') # Преобразование строки времени назначения в объект datetime
-
-    doctor = session.query(Doctor).filter_by(id=appointment.doctor_id).first() # Поиск записи о докторе по id
-    if doctor: # Если запись о докторе найдена
-        doctor.name = doctor_name # Обновление имени доктора
-    else: # Если запись о докторе не найдена
-        doctor = Doctor(name=doctor_name) # Создание новой записи о докторе
-        session.add(doctor) # Добавление записи о докторе в сессию
-
-    patient = session.query(Patient).filter_by(id=appointment.patient_id).first() # Поиск записи о пациенте по id
-    if patient: # Если запись о пациенте найдена
-        patient.name = patient_name # Обновление имени пациента
-    else: # Если запись о пациенте не найдена
-        patient = Patient(name=patient_name) # Создание новой записи о пациенте
-        session.add(patient) # Добавление записи о пациенте в сессию
-
-    service = session.query(Service).filter_by(id=appointment.service_id).first() # Поиск записи об услуге по id
-    if service: # Если запись об услуге найдена
-        service.name = service_name # Обновление названия услуги
-    else: # Если запись об услуге не найдена
-        service = Service(name=service_name) # Создание новой записи об услуге
-        session.add(service) # Добавление записи об услуге в сессию
-
-    specialization = session.query(Specialization).filter_by(id=appointment.specialization_id).first() # Поиск записи о специализации по id
-    if specialization: # Если запись о специализации найдена
-        specialization.name = specialization_name # Обновление названия специализации
-    else: # Если запись о специализации не найдена
-        specialization = Specialization(name=specialization_name) # Создание новой записи о специализации
-        session.add(specialization) # Добавление записи о специализации в сессию
-
-    appointment.doctor_id = doctor.id # Обновление id доктора в записи о назначении
-    appointment.patient_id = patient.id # Обновление id пациента в записи о назначении
-    appointment.service_id = service.id # Обновление id услуги в записи о назначении
-    appointment.specialization_id = specialization.id # Обновление id специализации в записи о назначении
-    appointment.appointment_time = appointment_time # Обновление времени назначения
-
-    session.commit() # Сохранение изменений в базе данных
-
-    return jsonify({"message": "Appointment updated successfully"}) # Возвращает сообщение об успешном обновлении назначения
+    data = request.get_json(silent=True) # Получение данных запроса в формате JSON или None
+    if not isinstance(data, dict): # Проверка, что тело запроса является объектом
+        return jsonify({"error": "Invalid JSON body"}), 400 # Возвращает ошибку тела запроса
+    body, status = update_appointment(DBSession(), appointment_id, data) # Обновление назначения по данным запроса в формате JSON
+    return jsonify(body), status # Возвращает результат обновления назначения
+
+@app.route('/appointments/<int:appointment_id>', methods=['PATCH']) # Определение маршрута для частичного обновления назначения
+def partial_update_appointment(appointment_id): # Функция для обработки запроса на изменение только переданных полей назначения
+    body, status = patch_appointment(DBSession(), appointment_id, request.get_json(silent=True)) # Перенаправление назначения на строки справочников одним запросом UPDATE
+    return jsonify(body), status # Возвращает результат обновления назначения
+
+@app.route('/doctors/<int:doctor_id>/appointments', methods=['PATCH']) # Определение маршрута для изменения всех назначений доктора за период
+def move_doctor_appointments(doctor_id): # Функция для обработки запроса на перенос или переназначение назначений доктора за период
+    body, status = move_appointments(DBSession(), doctor_id, request.args, request.get_json(silent=True)) # Изменение назначений периода одним запросом UPDATE
+    return jsonify(body), status # Возвращает количество измененных назначений
 
 @app.route('/appointments/<int:appointment_id>', methods=['DELETE']) # Определение маршрута для удаления существующего назначения
 def delete_appointment(appointment_id): # Функция для обработки запроса на удаление существующего назначения
-    session = DBSession() # Создание сессии
-    appointment = session.query(Appointment).filter_by(id=appointment_id).one() # Поиск назначения по id
-    session.delete(appointment) # Удаление назначения из базы данных
-    session.commit() # Сохранение изменений в базе данных
-    return jsonify({"message": "Appointment deleted successfully"}) # Возвращает сообщение об успешном удалении назначения
+    body, status = remove_appointment(DBSession(), appointment_id) # Удаление назначения
+    return jsonify(body), status # Возвращает результат удаления назначения
 
 if __name__ == '__main__': # Проверка, выполняется ли скрипт напрямую
     app.debug = True # Включение режима отладки
@@ -0,0 +1,187 @@
+import argparse # Импорт модуля для разбора аргументов командной строки
+import json # Импорт модуля для вывода отчета в JSON
+import os # Импорт модуля для работы с файлами и переменными окружения
+import time # Импорт модуля для измерения времени и паузы между запусками
+from datetime import datetime, timedelta # Импорт классов для работы с датой и временем
+from threading import Lock # Импорт блокировки для ленивого создания движка архива
+from sqlalchemy import MetaData, Table, Column, Integer, String, DateTime, Index, DDL, event, func, select, delete, update, text, table, column, literal_column # Импорт классов для описания таблиц и построения запросов
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert # Импорт INSERT с поддержкой ON CONFLICT для SQLite
+from sqlalchemy.engine import make_url # Импорт функции для разбора URL базы данных
+from database_setup import Appointment, CacheGeneration, get_engine, migrate # Импорт моделей и вспомогательных функций
+from queries import appointment_rows, match_expression, range_filters # Импорт общей проекции назначений, полнотекстового запроса и фильтров периода
+
+DEFAULT_ARCHIVE_URL = 'sqlite:///dental_clinic_archive.db' # URL архива по умолчанию (отдельный файл рядом с основной базой данных)
+ARCHIVE_AFTER_DAYS = 365 # Назначения старше этого количества дней переносятся в архив
+DEFAULT_CHUNK_SIZE = 1000 # Количество назначений, переносимых одной транзакцией
+FILTER_PARAMS = ('datetime', 'from', 'to', 'doctor_id', 'patient_id', 'service') # Параметры /search, при которых результаты упорядочены по времени
+
+archive_metadata = MetaData() # Схема архива отдельно от схемы основной базы данных
+
+archived = Table( # Архив назначений: строки справочников сохраняются названиями, чтобы архив не зависел от основной базы данных
+    'archived_appointment', archive_metadata,
+    Column('id', Integer, primary_key=True), # id назначения в основной базе данных
+    Column('doctor_id', Integer),
+    Column('patient_id', Integer),
+    Column('service_id', Integer),
+    Column('specialization_id', Integer),
+    Column('doctor', String(250)),
+    Column('specialization', String(250)),
+    Column('patient', String(250)),
+    Column('service', String(250)),
+    Column('appointment_time', DateTime, nullable=False),
+    Index('ix_archived_appointment_time', 'appointment_time'),
+    Index('ix_archived_appointment_doctor_time', 'doctor_id', 'appointment_time'),
+    Index('ix_archived_appointment_patient_time', 'patient_id', 'appointment_time'),
+)
+
+ARCHIVE_INDEX_DDL = [ # Полнотекстовый индекс архива без копии текста (external content), синхронизируемый триггерами
+    "CREATE VIRTUAL TABLE IF NOT EXISTS archived_appointment_fts USING fts5("
+    "doctor, specialization, patient, service, content='archived_appointment', content_rowid='id', "
+    "tokenize='unicode61 remove_diacritics 2', prefix='2 3')",
+    "CREATE TRIGGER IF NOT EXISTS archived_appointment_fts_insert AFTER INSERT ON archived_appointment BEGIN "
+    "INSERT INTO archived_appointment_fts(rowid, doctor, specialization, patient, service) "
+    "VALUES (new.id, new.doctor, new.specialization, new.patient, new.service); END",
+    "CREATE TRIGGER IF NOT EXISTS archived_appointment_fts_update AFTER UPDATE ON archived_appointment BEGIN "
+    "INSERT INTO archived_appointment_fts(archived_appointment_fts, rowid, doctor, specialization, patient, service) "
+    "VALUES ('delete', old.id, old.doctor, old.specialization, old.patient, old.service); "
+    "INSERT INTO archived_appointment_fts(rowid, doctor, specialization, patient, service) "
+    "VALUES (new.id, new.doctor, new.specialization, new.patient, new.service); END",
+    "CREATE TRIGGER IF NOT EXISTS archived_appointment_fts_delete AFTER DELETE ON archived_appointment BEGIN "
+    "INSERT INTO archived_appointment_fts(archived_appointment_fts, rowid, doctor, specialization, patient, service) "
+    "VALUES ('delete', old.id, old.doctor, old.specialization, old.patient, old.service); END",
+]
+
+for statement in ARCHIVE_INDEX_DDL: # Создание индекса и триггеров вместе с таблицей архива
+    event.listen(archived, 'after_create', DDL(statement).execute_if(dialect='sqlite'))
+event.listen(archived, 'after_drop', DDL('DROP TABLE IF EXISTS archived_appointment_fts').execute_if(dialect='sqlite')) # Удаление индекса вместе с таблицей архива
+
+archive_search_index = table('archived_appointment_fts', column('rowid'), column('rank')) # Полнотекстовый индекс архива
+
+def archive_statement(args): # Функция построения запроса поиска в архиве по тем же параметрам, что и /search
+    filters = range_filters(args, archived.c.appointment_time, archived.c.doctor_id, archived.c.patient_id, archived.c.service) # Условия периода, доктора, пациента и услуги
+    by_time = bool(filters) or args.get('group') == 'day' # Порядок по времени, как в search_statement
+    statement = select(
+        archived.c.id, archived.c.doctor, archived.c.specialization, archived.c.patient, archived.c.service, archived.c.appointment_time
+    ).where(*filters) # Проекция в том же порядке столбцов, что и appointment_rows
+    match = match_expression(args.get('query', '')) # Построение запроса FTS5
+    if match: # Поиск по ключевому слову через индекс архива
+        statement = statement.join(archive_search_index, archive_search_index.c.rowid == archived.c.id).where(
+            literal_column('archived_appointment_fts').op('MATCH')(match)
+        )
+        if not by_time: # Без фильтров и группировки результаты упорядочены по релевантности
+            statement = statement.order_by(archive_search_index.c.rank)
+    return statement.order_by(archived.c.appointment_time, archived.c.id) if by_time else statement # Возвращает запрос поиска в архиве
+
+class Archive: # Определение архива назначений в отдельной базе данных с ленивым подключением
+    def __init__(self, url=None): # Инициализация по аргументу или переменной окружения
+        self.url = make_url(url or os.environ.get('ARCHIVE_DATABASE_URL', DEFAULT_ARCHIVE_URL)) # URL архива
+        self.engine = None # Движок создается при первом обращении к архиву
+        self.lock = Lock() # Блокировка для создания движка из нескольких потоков
+
+    def exists(self): # Проверка, есть ли что искать в архиве, без создания файла
+        return self.engine is not None or self.url.database in (None, '', ':memory:') or os.path.exists(self.url.database)
+
+    def get_engine(self): # Получение движка архива с созданием схемы при первом обращении
+        with self.lock:
+            if self.engine is None: # Если к архиву еще не обращались
+                self.engine = get_engine(self.url) # Те же настройки SQLite, что и у основной базы данных
+                archive_metadata.create_all(self.engine) # Создание таблицы архива, индексов и полнотекстового индекса
+            return self.engine # Возвращает движок архива
+
+    def search(self, args): # Поиск назначений в архиве
+        if not self.exists(): # Если архив еще не создан, запросов к нему нет
+            return []
+        with self.get_engine().connect() as connection: # Соединение с архивом на время запроса
+            return connection.execute(archive_statement(args)).all() # Возвращает строки в формате appointment_rows
+
+def with_archived(args, rows, archive): # Функция добавления результатов архива к результатам основной базы данных
+    archived_rows = archive.search(args) # Поиск в архиве по тем же параметрам
+    if args.get('group') == 'day' or any(args.get(name) for name in FILTER_PARAMS): # Результаты с фильтрами и группировкой по дням упорядочены по времени
+        return sorted([*archived_rows, *rows], key=lambda row: (row.appointment_time, row.id)) # Слияние двух упорядоченных списков
+    return [*rows, *archived_rows] # Результаты по релевантности: сначала текущие назначения, затем архивные
+
+def reserve_archived_ids(engine, archive_engine): # Функция, запрещающая основной базе данных выдавать id, уже занятые в архиве
+    if engine.dialect.name != 'sqlite': # Счетчик AUTOINCREMENT ведется в sqlite_sequence только в SQLite
+        return
+    with archive_engine.connect() as archive_connection:
+        last_id = archive_connection.execute(select(func.max(archived.c.id))).scalar() # Наибольший id в архиве
+    if last_id is None: # Если архив пуст
+        return
+    with engine.begin() as connection:
+        connection.execute(text(
+            "UPDATE sqlite_sequence SET seq = :seq WHERE name = 'appointment' AND seq < :seq"
+        ), {'seq': last_id}) # Счетчик не опускается ниже архива (архив, заполненный до AUTOINCREMENT)
+        connection.execute(text(
+            "INSERT INTO sqlite_sequence (name, seq) SELECT 'appointment', :seq "
+            "WHERE NOT EXISTS (SELECT 1 FROM sqlite_sequence WHERE name = 'appointment')"
+        ), {'seq': last_id}) # Счетчика еще нет, если в таблицу ничего не вставлялось после пересоздания
+
+def archive_appointments(engine, archive, cutoff, chunk_size=DEFAULT_CHUNK_SIZE): # Функция переноса назначений раньше cutoff в архив порциями
+    archive_engine = archive.get_engine() # Движок архива
+    reserve_archived_ids(engine, archive_engine) # Новые назначения не получат id архивных и не перезапишут их при следующем переносе
+    columns = [column.name for column in archived.columns if column.name != 'id'] # Столбцы, обновляемые при повторном переносе
+    moved = 0 # Количество перенесенных назначений
+    while True:
+        with engine.begin() as connection: # Одна короткая транзакция основной базы данных на порцию
+            rows = connection.execute(
+                appointment_rows().add_columns(
+                    Appointment.doctor_id, Appointment.patient_id, Appointment.service_id, Appointment.specialization_id
+                ).where(Appointment.appointment_time < cutoff).order_by(Appointment.id).limit(chunk_size)
+            ).mappings().all() # Порция старых назначений с названиями по индексу времени
+            if not rows: # Если старых назначений не осталось
+                break
+            deleted = set(connection.execute(
+                delete(Appointment).where(
+                    Appointment.id.in_([row['id'] for row in rows]),
+                    Appointment.appointment_time < cutoff # Назначение, перенесенное после чтения порции, остается в основной базе данных
+                ).returning(Appointment.id)
+            ).scalars()) # Удаление берет блокировку записи до фиксации
+            rows = [dict(row) for row in rows if row['id'] in deleted] # В архив попадают только удаленные назначения
+            if rows: # Если порция не изменилась полностью
+                with archive_engine.begin() as archive_connection: # Архив фиксируется раньше основной базы данных, поэтому сбой между фиксациями не теряет назначения
+                    statement = sqlite_insert(archived) # Вставка в архив
+                    archive_connection.execute(
+                        statement.on_conflict_do_update(index_elements=['id'], set_={name: statement.excluded[name] for name in columns}),
+                        rows
+                    ) # Повторный перенос после сбоя между фиксациями заменяет строку архива ее последней версией
+        moved += len(rows)
+    return moved # Возвращает количество перенесенных назначений
+
+def purge_archive(engine, archive, before): # Функция удаления из архива назначений раньше before (срок хранения)
+    with archive.get_engine().begin() as connection: # Одна транзакция архива
+        purged = connection.execute(delete(archived).where(archived.c.appointment_time < before)).rowcount # Удаление по индексу времени
+    if purged: # Результаты поиска с архивом изменились
+        with engine.begin() as connection: # Увеличение поколения, чтобы кэш ответов не вернул удаленные назначения
+            connection.execute(update(CacheGeneration).where(CacheGeneration.id == 1).values(generation=CacheGeneration.generation + 1))
+    return purged # Возвращает количество удаленных назначений
+
+def run_archival(engine, archive, older_than_days=ARCHIVE_AFTER_DAYS, retain_days=None, chunk_size=DEFAULT_CHUNK_SIZE, vacuum=False): # Функция одного запуска архивации
+    started = time.perf_counter() # Время начала
+    now = datetime.now() # Текущее время
+    report = {'cutoff': (now - timedelta(days=older_than_days)).isoformat(timespec='minutes')} # Отчет о запуске
+    report['archived'] = archive_appointments(engine, archive, now - timedelta(days=older_than_days), chunk_size) # Перенос старых назначений
+    if retain_days is not None: # Если задан срок хранения архива
+        report['purged'] = purge_archive(engine, archive, now - timedelta(days=retain_days)) # Удаление назначений старше срока хранения
+    if vacuum and report['archived']: # Возврат освободившегося места файлу основной базы данных
+        with engine.connect().execution_options(isolation_level='AUTOCOMMIT') as connection: # VACUUM нельзя выполнить внутри транзакции
+            connection.execute(text('VACUUM'))
+    report['seconds'] = round(time.perf_counter() - started, 3) # Длительность запуска
+    return report # Возвращает отчет
+
+if __name__ == '__main__': # Проверка, выполняется ли скрипт напрямую
+    parser = argparse.ArgumentParser(description='Move old appointments into the archive database') # Создание разборщика аргументов
+    parser.add_argument('--older-than-days', type=int, default=int(os.environ.get('ARCHIVE_AFTER_DAYS', ARCHIVE_AFTER_DAYS))) # Возраст назначений для переноса
+    parser.add_argument('--retain-days', type=int, help='delete archived appointments older than this') # Срок хранения архива
+    parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE) # Размер порции
+    parser.add_argument('--interval', type=float, help='repeat every N seconds instead of running once') # Период повторного запуска
+    parser.add_argument('--vacuum', action='store_true', help='compact the main database file after archiving') # Сжатие файла основной базы данных
+    args = parser.parse_args() # Разбор аргументов
+
+    engine = get_engine() # Создание движка основной базы данных
+    migrate(engine) # Создание таблиц и индексов при необходимости
+    archive = Archive() # Архив из переменной окружения ARCHIVE_DATABASE_URL
+    while True:
+        print(json.dumps(run_archival(engine, archive, args.older_than_days, args.retain_days, args.chunk_size, args.vacuum)), flush=True) # Запуск и вывод отчета
+        if not args.interval: # Однократный запуск
+            break
+        time.sleep(args.interval) # Пауза до следующего запуска
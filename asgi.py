@@ -0,0 +1,155 @@
+import json # Импорт модуля для сериализации в JSON
+import os # Импорт модуля для чтения переменных окружения
+from contextlib import asynccontextmanager # Импорт декоратора для создания асинхронного контекстного менеджера
+from sqlalchemy import event # Импорт системы событий SQLAlchemy
+from sqlalchemy.engine import make_url # Импорт функции разбора URL базы данных
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker # Импорт асинхронного движка и фабрики сессий (требуется пакет aiosqlite)
+from sqlalchemy.pool import StaticPool # Импорт пула с одним общим соединением
+from starlette.applications import Starlette # Импорт ASGI-приложения (требуется пакет starlette)
+from starlette.responses import JSONResponse, StreamingResponse # Импорт классов ответов
+from starlette.concurrency import run_in_threadpool # Импорт выполнения синхронной функции в пуле потоков
+from starlette.routing import Route # Импорт класса маршрута
+from database_setup import Doctor, DEFAULT_DATABASE_URL, set_sqlite_pragmas, upgrade # Импорт моделей и вспомогательных функций
+from archive import Archive, with_archived # Импорт архива старых назначений
+from bookings import create_appointment, update_appointment, patch_appointment, move_appointments, delete_appointment # Импорт функций изменения назначений
+from scheduling import availability, parse_availability_args # Импорт расчета свободного времени
+from queries import TIME_FORMAT, STREAM_CHUNK_SIZE, serialize_row, search_statement, page_statement, group_by_day, encode_cursor # Импорт общей проекции, сериализации и постраничной выдачи назначений
+
+# ASGI-версия API для запуска через uvicorn asgi:app: те же маршруты и модели, что в app.py,
+# но запросы к базе данных не блокируют обработку других запросов.
+# Массовая загрузка, /stats и кэш ответов доступны только в WSGI-версии.
+
+def get_async_engine(url=None): # Функция для создания асинхронного движка базы данных
+    url = make_url(url or os.environ.get('DATABASE_URL', DEFAULT_DATABASE_URL)) # URL из аргумента, переменной окружения или по умолчанию
+    if url.get_backend_name() != 'sqlite': # Если используется не SQLite, в URL должен быть указан асинхронный драйвер
+        return create_async_engine(url, pool_pre_ping=True) # Создание движка с настройками пула по умолчанию
+    url = url.set(drivername='sqlite+aiosqlite') # Асинхронный драйвер SQLite
+    if url.database in (None, '', ':memory:'): # Если база данных SQLite в памяти
+        return create_async_engine(url, poolclass=StaticPool) # Одно общее соединение, чтобы все запросы видели одну базу
+    engine = create_async_engine(
+        url,
+        pool_size=int(os.environ.get('DATABASE_POOL_SIZE', 5)), # Количество постоянно открытых соединений
+        max_overflow=int(os.environ.get('DATABASE_MAX_OVERFLOW', 10)), # Количество дополнительных соединений под нагрузкой
+    ) # Создание движка базы данных SQLite в файле
+    event.listen(engine.sync_engine, 'connect', set_sqlite_pragmas) # Применение тех же настроек SQLite к каждому новому соединению
+    return engine # Возвращает асинхронный движок базы данных
+
+engine = get_async_engine() # Создание асинхронного движка базы данных
+AsyncDBSession = async_sessionmaker(engine, expire_on_commit=False) # Создание класса для создания асинхронных сессий
+archive = Archive() # Архив старых назначений, подключается при первом поиске с include_archived
+
+@asynccontextmanager
+async def lifespan(app): # Функция запуска и остановки приложения
+    async with engine.begin() as connection: # Одна транзакция на обновление схемы
+        await connection.run_sync(upgrade) # Создание всех таблиц и недостающих индексов, как при запуске app.py
+    yield
+    await engine.dispose() # Закрытие соединений пула при остановке
+
+async def index(request): # Функция для обработки запроса к главной странице
+    return JSONResponse({"message": "Welcome to the Dental Clinic API"}) # Возвращает приветственное сообщение в формате JSON
+
+async def read_json(request): # Функция получения тела запроса в формате JSON или None
+    try:
+        return await request.json() # Разбор тела запроса
+    except ValueError: # Обработка исключения, если тело не является JSON
+        return None
+
+async def doctor_availability(request): # Функция для обработки запроса на получение свободного времени доктора
+    doctor_id = request.path_params['doctor_id'] # Получение id доктора из пути
+    try:
+        first_day, last_day, minutes = parse_availability_args(request.query_params) # Получение периода и нужной длительности свободного промежутка из запроса
+    except ValueError: # Обработка исключения, если параметры неверны
+        return JSONResponse({"error": "Invalid availability parameters"}, 400) # Возвращает ошибку параметров
+    async with AsyncDBSession() as session: # Создание сессии на время запроса
+        if await session.get(Doctor, doctor_id) is None: # Проверка, что доктор существует
+            return JSONResponse({"error": "Doctor not found"}, 404) # Возвращает ошибку отсутствия доктора
+        slots = await session.run_sync(availability, doctor_id, first_day, last_day, minutes) # Вычисление свободных промежутков по рабочим дням
+    return JSONResponse({
+        "doctor_id": doctor_id,
+        "free": [{"start": start.strftime(TIME_FORMAT), "end": end.strftime(TIME_FORMAT)} for start, end in slots]
+    }) # Возвращает свободное время доктора в формате JSON
+
+async def search(request): # Функция для обработки запроса на поиск назначений
+    try:
+        statement = search_statement(request.query_params) # Построение запроса по ключевому слову, периоду, доктору, пациенту и услуге
+    except ValueError as error: # Обработка исключения, если формат даты и времени или id неверный
+        return JSONResponse({"error": str(error)}, 400) # Возвращает ошибку параметров поиска
+    async with AsyncDBSession() as session: # Создание сессии на время запроса
+        results = (await session.execute(statement)).all() # Выполнение одного запроса для всех строк
+    if request.query_params.get('include_archived', '') in ('1', 'true'): # Поиск в архиве только по явному запросу
+        results = await run_in_threadpool(with_archived, request.query_params, results, archive) # Синхронный движок архива не блокирует цикл событий
+
+    if request.query_params.get('group', '') == 'day': # Если запрошена группировка по дням
+        return JSONResponse(group_by_day(results)) # Возвращает назначения, сгруппированные по дням
+    return JSONResponse([serialize_row(row) for row in results]) # Возвращает результаты поиска в формате JSON
+
+async def stream_json(statement): # Асинхронный генератор потоковой выдачи JSON-массива назначений
+    async with AsyncDBSession() as session: # Сессия живет, пока генератор выдает ответ, и закрывается в том числе при обрыве соединения
+        result = await session.stream(statement.execution_options(yield_per=STREAM_CHUNK_SIZE)) # Выполнение запроса с порционным чтением из курсора
+        yield '[' # Начало JSON-массива
+        separator = '' # Разделитель перед первой строкой не нужен
+        async for rows in result.partitions(): # Чтение строк порциями, чтобы не держать всю таблицу в памяти
+            yield separator + ','.join(json.dumps(serialize_row(row)) for row in rows) # Выдача порции строк
+            separator = ',' # Последующие порции отделяются запятой
+        yield ']' # Конец JSON-массива
+
+async def get_appointments(request): # Функция для обработки запроса на получение списка назначений
+    try:
+        statement, limit = page_statement(request.query_params) # Построение запроса страницы по параметрам limit и after
+    except ValueError: # Обработка исключения, если параметры постраничной выдачи неверны
+        return JSONResponse({"error": "Invalid pagination parameters"}, 400) # Возвращает ошибку параметров постраничной выдачи
+
+    if request.query_params.get('stream', '') in ('1', 'true'): # Если запрошена потоковая выдача
+        return StreamingResponse(stream_json(statement), media_type='application/json') # Возвращает JSON-массив по частям
+
+    async with AsyncDBSession() as session: # Создание сессии на время запроса
+        results = (await session.execute(statement)).all() # Получение страницы назначений одним запросом
+    headers = {} # Дополнительные заголовки ответа
+    if limit and len(results) == limit: # Если страница заполнена, возможно есть следующая
+        headers['X-Next-Cursor'] = encode_cursor(results[-1]) # Передача курсора следующей страницы в заголовке
+    return JSONResponse([serialize_row(row) for row in results], headers=headers) # Возвращает список назначений в формате JSON
+
+async def new_appointment(request): # Функция для обработки запроса на создание нового назначения
+    data = await read_json(request) # Получение данных запроса в формате JSON
+    if not isinstance(data, dict): # Проверка, что тело запроса является объектом
+        return JSONResponse({"error": "Invalid JSON body"}, 400) # Возвращает ошибку тела запроса
+    async with AsyncDBSession() as session: # Создание сессии на время запроса
+        body, status = await session.run_sync(create_appointment, data) # Та же логика создания, что в WSGI-версии, через синхронный адаптер сессии
+    return JSONResponse(body, status) # Возвращает результат создания назначения
+
+async def edit_appointment(request): # Функция для обработки запроса на обновление существующего назначения
+    data = await read_json(request) # Получение данных запроса в формате JSON
+    if not isinstance(data, dict): # Проверка, что тело запроса является объектом
+        return JSONResponse({"error": "Invalid JSON body"}, 400) # Возвращает ошибку тела запроса
+    async with AsyncDBSession() as session: # Создание сессии на время запроса
+        body, status = await session.run_sync(update_appointment, request.path_params['appointment_id'], data) # Обновление назначения
+    return JSONResponse(body, status) # Возвращает результат обновления назначения
+
+async def partial_update_appointment(request): # Функция для обработки запроса на изменение только переданных полей назначения
+    data = await read_json(request) # Получение данных запроса в формате JSON
+    async with AsyncDBSession() as session: # Создание сессии на время запроса
+        body, status = await session.run_sync(patch_appointment, request.path_params['appointment_id'], data) # Перенаправление назначения на строки справочников одним запросом UPDATE
+    return JSONResponse(body, status) # Возвращает результат обновления назначения
+
+async def move_doctor_appointments(request): # Функция для обработки запроса на перенос или переназначение назначений доктора за период
+    data = await read_json(request) # Получение данных запроса в формате JSON
+    async with AsyncDBSession() as session: # Создание сессии на время запроса
+        body, status = await session.run_sync(move_appointments, request.path_params['doctor_id'], request.query_params, data) # Изменение назначений периода одним запросом UPDATE
+    return JSONResponse(body, status) # Возвращает количество измененных назначений
+
+async def remove_appointment(request): # Функция для обработки запроса на удаление существующего назначения
+    async with AsyncDBSession() as session: # Создание сессии на время запроса
+        body, status = await session.run_sync(delete_appointment, request.path_params['appointment_id']) # Удаление назначения
+    return JSONResponse(body, status) # Возвращает результат удаления назначения
+
+app = Starlette(routes=[ # Создание ASGI-приложения с теми же маршрутами, что в app.py
+    Route('/', index),
+    Route('/doctors/{doctor_id:int}/availability', doctor_availability, methods=['GET']),
+    Route('/search', search, methods=['GET']),
+    Route('/appointments', get_appointments, methods=['GET']),
+    Route('/appointments', new_appointment, methods=['POST']),
+    Route('/appointments/{appointment_id:int}', edit_appointment, methods=['PUT']),
+    Route('/appointments/{appointment_id:int}', partial_update_appointment, methods=['PATCH']),
+    Route('/appointments/{appointment_id:int}', remove_appointment, methods=['DELETE']),
+    Route('/doctors/{doctor_id:int}/appointments', move_doctor_appointments, methods=['PATCH']),
+], lifespan=lifespan)
@@ -0,0 +1,254 @@
+import argparse # Импорт модуля для разбора аргументов командной строки
+import json # Импорт модуля для сохранения результатов в JSON
+import os # Импорт модуля для работы с переменными окружения
+import random # Импорт модуля для генерации случайных данных
+import statistics # Импорт модуля для вычисления медианы
+import sys # Импорт модуля для вывода в стандартный поток ошибок
+import time # Импорт модуля для измерения времени
+from datetime import date, datetime, timedelta # Импорт классов для работы с датой и временем
+from itertools import islice # Импорт функции для разбиения потока на порции
+from urllib.parse import quote # Импорт функции кодирования параметров URL
+from sqlalchemy import insert, or_, select, func, event # Импорт функций для массовой вставки, запросов, операций OR и системы событий
+from database_setup import Doctor, Specialization, Patient, Appointment, Service # Импорт моделей
+from archive import archive_appointments # Импорт переноса старых назначений в архив
+from loadtest import percentile # Импорт вычисления процентилей
+from scheduling import WORKDAY_START, WORKDAY_END # Импорт границ рабочего дня
+from queries import appointment_rows, keyword_search, range_filters, ordered # Импорт общей проекции, полнотекстового поиска и фильтров периода
+
+FIRST_NAMES = ['John', 'Jane', 'Anna', 'Ivan', 'Maria', 'Peter', 'Olga', 'Alex', 'Elena', 'Sergey'] # Имена для генерации данных
+LAST_NAMES = ['Smith', 'Brown', 'Ivanov', 'Petrova', 'Johnson', 'Sidorov', 'Miller', 'Kuznetsova', 'Wilson', 'Popov'] # Фамилии для генерации данных
+SPECIALIZATIONS = ['Dentistry', 'Orthodontics', 'Periodontics', 'Endodontics', 'Prosthodontics', 'Oral Surgery'] # Специализации для генерации данных
+SERVICES = ['Cleaning', 'Braces', 'Filling', 'Extraction', 'Whitening', 'Implant', 'Crown', 'Root Canal', 'Checkup', 'X-Ray'] # Услуги для генерации данных
+SERVICE_DURATIONS = [30, 30, 45, 60, 90] # Длительности услуг в минутах для генерации данных
+SEED_GAPS = [0, 0, 0, 15, 30] # Перерывы между назначениями доктора в минутах
+SEED_FIRST_DAY = date(2020, 1, 1) # Первый день синтетических назначений
+SEED_CHUNK_SIZE = 10000 # Количество назначений, вставляемых одним executemany
+PAGE_SIZE = 50 # Размер страницы при измерении постраничной выдачи
+DEFAULT_TOLERANCE = 0.25 # Допустимый рост медианы относительно базового прогона
+MIN_REGRESSION_MS = 1.0 # Рост медианы меньше этого значения считается шумом измерений
+
+def generate_appointments(rng, doctors, patients, durations, specializations, days, per_day, first_day): # Генератор расписаний докторов по рабочим дням без пересечений
+    doctor_specializations = [rng.randint(1, specializations) for _ in range(doctors)] # Каждый доктор работает по одной специализации
+    for offset in range(days): # Перебор дней периода
+        day = first_day + timedelta(days=offset) # Текущий день
+        if day.weekday() >= 5: # Выходные дни пропускаются
+            continue
+        day_end = datetime.combine(day, WORKDAY_END) # Конец рабочего дня
+        for doctor_id in range(1, doctors + 1): # Расписание каждого доктора на день
+            cursor = datetime.combine(day, WORKDAY_START) # Начало рабочего дня
+            for _ in range(rng.randint(per_day // 2, per_day)): # Количество назначений доктора в этот день
+                cursor += timedelta(minutes=rng.choice(SEED_GAPS)) # Перерыв перед назначением
+                service_id = rng.randint(1, len(durations)) # Услуга назначения
+                end = cursor + timedelta(minutes=durations[service_id - 1]) # Окончание назначения
+                if end > day_end: # Назначение не помещается в рабочий день
+                    break
+                yield {
+                    'doctor_id': doctor_id,
+                    'patient_id': rng.randint(1, patients),
+                    'service_id': service_id,
+                    'specialization_id': doctor_specializations[doctor_id - 1],
+                    'appointment_time': cursor
+                } # Назначение доктора
+                cursor = end # Следующее назначение не раньше окончания текущего
+
+def seed(engine, doctors=50, patients=20000, services=len(SERVICES), days=365, per_day=8, first_day=SEED_FIRST_DAY, random_seed=0): # Функция заполнения пустой базы синтетическими данными
+    rng = random.Random(random_seed) # Генератор случайных чисел с фиксированным зерном для воспроизводимости
+    durations = [rng.choice(SERVICE_DURATIONS) for _ in range(services)] # Длительность каждой услуги
+    count = 0 # Количество вставленных назначений
+    with engine.begin() as connection: # Заполнение в одной транзакции
+        connection.execute(insert(Specialization), [{'name': name} for name in SPECIALIZATIONS]) # Массовая вставка специализаций
+        connection.execute(insert(Service), [
+            {'name': SERVICES[i % len(SERVICES)] + (f' {i // len(SERVICES)}' if i >= len(SERVICES) else ''), 'duration_minutes': durations[i]}
+            for i in range(services)
+        ]) # Массовая вставка услуг
+        connection.execute(insert(Doctor), [
+            {'name': f'Dr. {rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)} {i}'} for i in range(doctors)
+        ]) # Массовая вставка докторов
+        connection.execute(insert(Patient), [
+            {'name': f'{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)} {i}'} for i in range(patients)
+        ]) # Массовая вставка пациентов
+        rows = generate_appointments(rng, doctors, patients, durations, len(SPECIALIZATIONS), days, per_day, first_day) # Поток назначений
+        while True:
+            chunk = list(islice(rows, SEED_CHUNK_SIZE)) # Очередная порция назначений
+            if not chunk: # Если назначения закончились
+                break
+            connection.execute(insert(Appointment), chunk) # Массовая вставка порции назначений
+            count += len(chunk)
+    return count # Возвращает количество назначений
+
+def like_search(statement, query): # Прежний поиск через четыре LIKE с ведущим шаблоном, для сравнения
+    return statement.where(or_(
+        Doctor.name.like(f'%{query}%'),
+        Specialization.name.like(f'%{query}%'),
+        Patient.name.like(f'%{query}%'),
+        Service.name.like(f'%{query}%')
+    )) # Условие, которое не может использовать индекс
+
+def latency_summary(timings, statements=None): # Функция вычисления процентилей времени выполнения и количества SQL-запросов
+    timings = sorted(timings) # Сортировка для вычисления процентилей
+    summary = {
+        'runs': len(timings),
+        'p50_ms': round(percentile(timings, 0.50), 3),
+        'p95_ms': round(percentile(timings, 0.95), 3),
+        'p99_ms': round(percentile(timings, 0.99), 3),
+        'max_ms': round(timings[-1], 3),
+    } # Процентили в миллисекундах
+    if statements: # Если подсчитывались SQL-запросы
+        summary['statements_median'] = statistics.median(statements) # Типичное количество запросов
+        summary['statements_max'] = max(statements) # Наибольшее количество запросов
+    return summary # Возвращает сводку измерений
+
+def measure(connection, statement, repeat): # Функция измерения времени выполнения запроса
+    timings = [] # Список времен выполнения в миллисекундах
+    for _ in range(repeat): # Повторение запроса несколько раз
+        started = time.perf_counter() # Время начала
+        rows = connection.execute(statement).all() # Выполнение запроса и чтение всех строк
+        timings.append((time.perf_counter() - started) * 1000) # Сохранение времени выполнения
+    return {**latency_summary(timings), 'rows': len(rows)} # Возвращает процентили и количество строк
+
+def compare_search(engine, keywords, repeat): # Функция сравнения LIKE и полнотекстового поиска
+    results = {} # Результаты измерений по названию
+    with engine.connect() as connection: # Открытие соединения для измерений
+        for keyword in keywords: # Перебор ключевых слов
+            results[f'sql search LIKE {keyword!r}'] = measure(connection, like_search(appointment_rows(), keyword), repeat) # Измерение прежнего поиска
+            results[f'sql search FTS5 {keyword!r}'] = measure(connection, keyword_search(appointment_rows(), keyword), repeat) # Измерение поиска по индексу
+    return results # Возвращает результаты измерений
+
+def day_view(engine, day, doctors, repeat): # Функция измерения выборки дневного расписания доктора
+    results = {} # Результаты измерений по названию
+    with engine.connect() as connection: # Открытие соединения для измерений
+        for doctor_id in (1, doctors): # Первый и последний доктор
+            statement = ordered(appointment_rows().where(*range_filters({'from': day, 'to': day, 'doctor_id': doctor_id}))) # Запрос дневного расписания
+            results[f'sql day view doctor {doctor_id}'] = measure(connection, statement, repeat) # Измерение запроса
+    return results # Возвращает результаты измерений
+
+def sample_names(connection, model, count, rng): # Функция выборки воспроизводимого случайного набора названий справочника
+    last_id = connection.execute(select(func.max(model.id))).scalar() # Наибольший id справочника
+    ids = [rng.randint(1, last_id) for _ in range(count)] # Случайные id
+    names = dict(connection.execute(select(model.id, model.name).where(model.id.in_(set(ids)))).all()) # Названия одним запросом
+    return [names[entity_id] for entity_id in ids if entity_id in names] # Возвращает названия в порядке выборки
+
+def benchmark_endpoints(client, engine, response_cache=None, iterations=200, random_seed=0, include_archived=False): # Функция измерения задержек API и количества SQL-запросов на запрос
+    rng = random.Random(random_seed) # Генератор случайных чисел с фиксированным зерном для воспроизводимости
+    with engine.connect() as connection: # Параметры запросов берутся из данных базы
+        first, last = connection.execute(select(func.min(Appointment.appointment_time), func.max(Appointment.appointment_time))).one() # Период назначений
+        patients = sample_names(connection, Patient, iterations, rng) # Пациенты для поиска по ключевому слову
+        doctors = connection.execute(select(Doctor.name).order_by(Doctor.id)).scalars().all() # Доктора для новых назначений
+        specialization = connection.execute(select(Specialization.name)).scalars().first() # Специализация новых назначений
+        service = connection.execute(select(Service.name)).scalars().first() # Услуга новых назначений
+    span = (last.date() - first.date()).days # Длина периода в днях
+
+    statements = [0] # Счетчик SQL-запросов текущего HTTP-запроса
+    def count_statement(*args): # Обработчик события выполнения запроса
+        statements[0] += 1
+    timings, counts = {}, {} # Времена выполнения и количества запросов по названию
+
+    def call(name, method, url, expected, **kwargs): # Выполнение одного измеряемого HTTP-запроса
+        if response_cache is not None: # Кэш ответов очищается, чтобы измерять выполнение запроса, а не чтение из кэша
+            response_cache.entries.clear()
+        statements[0] = 0 # Сброс счетчика SQL-запросов
+        started = time.perf_counter() # Время начала
+        response = client.open(url, method=method, **kwargs) # Выполнение запроса
+        elapsed = (time.perf_counter() - started) * 1000 # Время выполнения в миллисекундах
+        if response.status_code != expected: # Неожиданный ответ делает измерение бессмысленным
+            raise RuntimeError(f'{name} {url} returned {response.status_code}: {response.get_data(as_text=True)[:200]}')
+        timings.setdefault(name, []).append(elapsed) # Сохранение времени выполнения
+        counts.setdefault(name, []).append(statements[0]) # Сохранение количества SQL-запросов
+        return response # Возвращает ответ
+
+    event.listen(engine, 'before_cursor_execute', count_statement) # Подписка на событие выполнения запросов
+    try:
+        for i in range(iterations): # Каждая итерация выполняет все измеряемые запросы
+            moment = first + timedelta(minutes=rng.randint(0, span * 24 * 60)) # Случайный момент периода
+            day = (first.date() + timedelta(days=rng.randint(0, span))).isoformat() # Случайный день периода
+            call('GET /appointments', 'GET', f'/appointments?limit={PAGE_SIZE}&after={moment.isoformat()},0', 200) # Страница по курсору
+            call('GET /search keyword', 'GET', f'/search?query={quote(patients[i % len(patients)])}', 200) # Поиск пациента по ключевому слову
+            call('GET /search datetime', 'GET', f'/search?from={day}&to={day}', 200) # Поиск назначений за день
+            if include_archived: # Те же запросы поиска вместе с архивом
+                call('GET /search keyword archived', 'GET', f'/search?query={quote(patients[i % len(patients)])}&include_archived=true', 200)
+                call('GET /search datetime archived', 'GET', f'/search?from={day}&to={day}&include_archived=true', 200)
+
+            future = last.date() + timedelta(days=1 + i // len(doctors)) # День после периода данных, у каждого доктора одно новое назначение в день
+            booking = {
+                'doctor_name': doctors[i % len(doctors)],
+                'specialization_name': specialization,
+                'patient_name': patients[i % len(patients)],
+                'appointment_time': f'{future.isoformat()}T10:00',
+                'service': service
+            } # Данные нового назначения
+            appointment_id = call('POST /appointments', 'POST', '/appointments', 201, json=booking).get_json()['id'] # Создание назначения
+            call('PUT /appointments', 'PUT', f'/appointments/{appointment_id}', 200, json={**booking, 'appointment_time': f'{future.isoformat()}T14:00'}) # Перенос назначения
+            call('DELETE /appointments', 'DELETE', f'/appointments/{appointment_id}', 200) # Удаление назначения
+    finally:
+        event.remove(engine, 'before_cursor_execute', count_statement) # Отписка от события после измерений
+    return {name: latency_summary(timings[name], counts[name]) for name in timings} # Возвращает сводку по каждому запросу
+
+def compare_to_baseline(results, baseline, tolerance=DEFAULT_TOLERANCE): # Функция поиска ухудшений относительно сохраненного прогона
+    regressions = [] # Список описаний ухудшений
+    for name, current in results.items(): # Перебор текущих измерений
+        previous = baseline.get(name) # Измерение того же запроса в базовом прогоне
+        if previous is None: # Новые измерения не сравниваются
+            continue
+        limit = previous['p50_ms'] * (1 + tolerance) # Допустимая медиана
+        if current['p50_ms'] > limit and current['p50_ms'] - previous['p50_ms'] >= MIN_REGRESSION_MS: # Медиана выросла больше допуска и не на уровне шума
+            regressions.append(f"{name}: p50 {current['p50_ms']} ms > {previous['p50_ms']} ms + {tolerance:.0%}")
+        if current.get('statements_max', 0) > previous.get('statements_max', 0): # Количество SQL-запросов не должно расти
+            regressions.append(f"{name}: {current['statements_max']} SQL statements > {previous['statements_max']}")
+    return regressions # Возвращает список ухудшений
+
+def print_results(results): # Функция вывода таблицы результатов
+    print(f"{'benchmark':<40} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'sql':>4} {'rows':>7}")
+    for name, result in results.items():
+        print(f"{name:<40} {result['p50_ms']:>9} {result['p95_ms']:>9} {result['p99_ms']:>9} {result.get('statements_max', ''):>4} {result.get('rows', ''):>7}")
+
+if __name__ == '__main__': # Проверка, выполняется ли скрипт напрямую
+    parser = argparse.ArgumentParser(description='Benchmark SQL queries and API endpoints on synthetic clinic data') # Создание разборщика аргументов
+    parser.add_argument('--doctors', type=int, default=50) # Количество докторов
+    parser.add_argument('--patients', type=int, default=20000) # Количество пациентов
+    parser.add_argument('--services', type=int, default=len(SERVICES)) # Количество услуг
+    parser.add_argument('--years', type=float, default=1.0) # Длина периода назначений в годах
+    parser.add_argument('--per-day', type=int, default=8) # Наибольшее количество назначений доктора в день
+    parser.add_argument('--repeat', type=int, default=5) # Количество повторов каждого SQL-запроса
+    parser.add_argument('--iterations', type=int, default=200) # Количество повторов каждого запроса к API
+    parser.add_argument('--database-url', default='sqlite://') # База данных для заполнения (по умолчанию в памяти)
+    parser.add_argument('--archive-url', default='sqlite://') # База данных архива (по умолчанию в памяти)
+    parser.add_argument('--archive-before', help='move appointments before this date (YYYY-MM-DD) to the archive before measuring') # Граница архивации
+    parser.add_argument('--output', help='write results as JSON to this file') # Файл для сохранения результатов
+    parser.add_argument('--baseline', help='JSON results of a previous run to gate against') # Файл базового прогона
+    parser.add_argument('--tolerance', type=float, default=DEFAULT_TOLERANCE) # Допустимый рост медианы относительно базового прогона
+    parser.add_argument('keywords', nargs='*', default=['Smith', 'Braces', 'Orthodontics', '4242']) # Ключевые слова для поиска
+    args = parser.parse_args() # Разбор аргументов
+
+    os.environ['DATABASE_URL'] = args.database_url # Приложение создает движок по переменной окружения при импорте
+    os.environ['ARCHIVE_DATABASE_URL'] = args.archive_url # и архив
+    from app import app, engine, response_cache, archive # Импорт приложения после выбора базы данных
+    with engine.connect() as connection: # Проверка, заполнена ли база данных
+        seeded = connection.execute(select(Appointment.id).limit(1)).first() is not None
+    if not seeded: # Заполнение пустой базы данных
+        started = time.perf_counter() # Время начала заполнения
+        count = seed(engine, doctors=args.doctors, patients=args.patients, services=args.services, days=round(365 * args.years), per_day=args.per_day) # Заполнение базы данных
+        print(f'seeded {count} appointments in {time.perf_counter() - started:.1f} s', file=sys.stderr) # Вывод времени заполнения
+
+    if args.archive_before: # Перенос старых назначений в архив перед измерениями
+        started = time.perf_counter() # Время начала архивации
+        count = archive_appointments(engine, archive, datetime.strptime(args.archive_before, '%Y-%m-%d')) # Архивация
+        print(f'archived {count} appointments in {time.perf_counter() - started:.1f} s', file=sys.stderr) # Вывод времени архивации
+
+    results = {} # Результаты всех измерений
+    results.update(compare_search(engine, args.keywords, args.repeat)) # Сравнение поиска
+    results.update(day_view(engine, (SEED_FIRST_DAY + timedelta(days=14)).isoformat(), args.doctors, args.repeat)) # Измерение дневного расписания
+    with app.test_client() as client: # Запросы к API без сетевого сервера
+        results.update(benchmark_endpoints(client, engine, response_cache, args.iterations, include_archived=bool(args.archive_before))) # Измерение задержек API
+    print_results(results) # Вывод таблицы результатов
+
+    if args.output: # Сохранение результатов для сравнения с последующими прогонами
+        report = {'parameters': {key: value for key, value in vars(args).items() if key not in ('output', 'baseline')}, 'results': results} # Отчет с параметрами прогона
+        with open(args.output, 'w', encoding='utf-8') as output:
+            json.dump(report, output, ensure_ascii=False, indent=2)
+    if args.baseline: # Сравнение с базовым прогоном
+        with open(args.baseline, encoding='utf-8') as baseline_file:
+            baseline = json.load(baseline_file)['results']
+        regressions = compare_to_baseline(results, baseline, args.tolerance) # Поиск ухудшений
+        for regression in regressions: # Вывод ухудшений
+            print(f'REGRESSION {regression}', file=sys.stderr)
+        sys.exit(1 if regressions else 0) # Ненулевой код возврата при ухудшениях
@@ -0,0 +1,180 @@
+from datetime import datetime # Импорт класса для работы с датой и временем
+from sqlalchemy import update, func # Импорт функций для построения запросов UPDATE
+from sqlalchemy.exc import IntegrityError # Импорт исключения нарушения ограничения NOT NULL
+from database_setup import Doctor, Specialization, Patient, Appointment, Service # Импорт моделей
+from reference_data import get_or_create # Импорт получения строк справочников с кэшированием
+from scheduling import booked, conflicting_appointments, has_conflict # Импорт проверки пересечений назначений
+from bulk_import import NAME_FIELDS # Импорт соответствия полей запроса справочникам и столбцам назначения
+from queries import TIME_FORMAT, DATE_FORMAT, parse_time_bound, range_filters # Импорт форматов даты и времени и условий периода
+
+MINUTES_PER_DAY = 24 * 60 # Количество минут в сутках для переноса назначений на другой день
+MAX_SHIFT_MINUTES = 10 * 366 * MINUTES_PER_DAY # Наибольший сдвиг назначений (10 лет), больший сдвиг считается ошибкой запроса
+
+# Функции изменения назначений принимают сессию и возвращают (тело ответа, статус),
+# поэтому их используют и WSGI-приложение (app.py), и ASGI-приложение (asgi.py) через AsyncSession.run_sync
+
+def booking_error(data): # Функция проверки полного набора полей назначения, возвращает ошибку или None
+    fields = (*NAME_FIELDS, 'appointment_time') # Поля, обязательные при создании и полном обновлении назначения
+    if not all(data.get(field) for field in fields): # Проверка, что все поля указаны
+        return "Missing required fields"
+    invalid = [field for field in fields if not isinstance(data[field], str)] # Поля, переданные не строкой
+    if invalid: # Если есть поля неверного типа
+        return f"Invalid value for {', '.join(invalid)}"
+    return None
+
+def create_appointment(session, data): # Функция создания нового назначения
+    doctor_name = data.get('doctor_name') # Получение имени доктора из данных запроса
+    specialization_name = data.get('specialization_name') # Получение названия специализации из данных запроса
+    patient_name = data.get('patient_name') # Получение имени пациента из данных запроса
+    appointment_time = data.get('appointment_time') # Получение времени назначения из данных запроса
+    service_name = data.get('service') # Получение названия услуги из данных запроса
+    error = booking_error(data) # Проверка, что все поля указаны и являются строками
+    if error: # Если поля не указаны или неверного типа
+        return {"error": error}, 400 # Возвращает ошибку данных запроса
+    try:
+        appointment_time = datetime.strptime(appointment_time, TIME_FORMAT) # Преобразование строки времени назначения в объект datetime
+    except (TypeError, ValueError): # Обработка исключения, если формат даты и времени неверный
+        return {"error": "Invalid datetime format"}, 400 # Возвращает ошибку формата даты и времени
+
+    new_appointment = Appointment( # Создание нового назначения
+        doctor_id=get_or_create(session, Doctor, doctor_name), # Получение или создание записи о докторе
+        patient_id=get_or_create(session, Patient, patient_name), # Получение или создание записи о пациенте
+        service_id=get_or_create(session, Service, service_name), # Получение или создание записи об услуге
+        specialization_id=get_or_create(session, Specialization, specialization_name), # Получение или создание записи о специализации
+        appointment_time=appointment_time
+    )
+    session.add(new_appointment) # Добавление нового назначения в сессию
+    session.flush() # Вставка назначения для получения его id до фиксации транзакции
+    appointment_id = new_appointment.id # Сохранение id, чтобы не перечитывать объект после фиксации
+    if has_conflict(session, appointment_id): # Проверка после вставки, когда транзакция уже удерживает блокировку записи
+        session.rollback() # Отмена назначения, пересекающегося с другим назначением доктора
+        return {"error": "Doctor is already booked at this time"}, 409 # Возвращает ошибку пересечения назначений
+    session.commit() # Сохранение всех изменений в базе данных одной транзакцией
+
+    return {"id": appointment_id, "message": "Appointment created successfully"}, 201 # Возвращает сообщение об успешном создании назначения
+
+def update_appointment(session, appointment_id, data): # Функция обновления существующего назначения
+    appointment = session.get(Appointment, appointment_id) # Поиск назначения по id
+    if appointment is None: # Если назначение не найдено
+        return {"error": "Appointment not found"}, 404 # Возвращает ошибку отсутствия назначения
+
+    error = booking_error(data) # Проверка полей так же, как при создании назначения
+    if error: # Если поля не указаны или неверного типа
+        return {"error": error}, 400 # Возвращает ошибку данных запроса
+    try:
+        appointment_time = datetime.strptime(data['appointment_time'], TIME_FORMAT) # Преобразование строки времени назначения в объект datetime
+    except ValueError: # Обработка исключения, если формат даты и времени неверный
+        return {"error": "Invalid datetime format"}, 400 # Возвращает ошибку формата даты и времени
+
+    for column, value in reference_values(session, data).items(): # Перенаправление назначения на существующие или новые строки справочников, как в PATCH
+        setattr(appointment, column, value) # Общие строки справочников не переименовываются
+    appointment.appointment_time = appointment_time # Обновление времени назначения
+
+    session.flush() # Запись изменений в базу данных до фиксации транзакции
+    if has_conflict(session, appointment.id): # Проверка после изменения, когда транзакция уже удерживает блокировку записи
+        session.rollback() # Отмена изменений, пересекающихся с другим назначением доктора
+        return {"error": "Doctor is already booked at this time"}, 409 # Возвращает ошибку пересечения назначений
+    session.commit() # Сохранение изменений в базе данных
+
+    return {"message": "Appointment updated successfully"}, 200 # Возвращает сообщение об успешном обновлении назначения
+
+def delete_appointment(session, appointment_id): # Функция удаления существующего назначения
+    appointment = session.get(Appointment, appointment_id) # Поиск назначения по id
+    if appointment is None: # Если назначение не найдено
+        return {"error": "Appointment not found"}, 404 # Возвращает ошибку отсутствия назначения
+    session.delete(appointment) # Удаление назначения из базы данных
+    session.commit() # Сохранение изменений в базе данных
+    return {"message": "Appointment deleted successfully"}, 200 # Возвращает сообщение об успешном удалении назначения
+
+def reference_values(session, data): # Функция получения новых значений внешних ключей по переданным названиям без изменения строк справочников
+    values = {} # Столбцы назначения -> id строк справочников
+    for field, (model, column) in NAME_FIELDS.items(): # Перебор полей названий
+        if field in data: # Изменяются только переданные поля
+            if not isinstance(data[field], str) or not data[field]: # Название должно быть непустой строкой
+                raise ValueError(f"Invalid value for {field}")
+            values[column] = get_or_create(session, model, data[field]) # Существующая или новая строка справочника
+    return values # Возвращает новые значения столбцов
+
+def patch_appointment(session, appointment_id, data): # Функция частичного обновления назначения одним запросом UPDATE
+    if not isinstance(data, dict) or not data: # Проверка, что переданы изменяемые поля
+        return {"error": "No fields to update"}, 400 # Возвращает ошибку пустого запроса
+    unknown = sorted(data.keys() - NAME_FIELDS.keys() - {'appointment_time'}) # Поля, которые нельзя изменить
+    if unknown: # Если переданы неизвестные поля
+        return {"error": f"Unknown fields: {', '.join(unknown)}"}, 400 # Возвращает ошибку неизвестных полей
+    values = {} # Новые значения столбцов назначения
+    if 'appointment_time' in data: # Если передано новое время назначения
+        try:
+            values['appointment_time'] = datetime.strptime(data['appointment_time'], TIME_FORMAT) # Преобразование строки времени назначения в объект datetime
+        except (TypeError, ValueError): # Обработка исключения, если формат даты и времени неверный
+            return {"error": "Invalid datetime format"}, 400 # Возвращает ошибку формата даты и времени
+    try:
+        values.update(reference_values(session, data)) # Перенаправление внешних ключей на строки справочников
+    except ValueError as error: # Обработка исключения, если название неверное
+        session.rollback() # Отмена строк справочников, созданных для этого запроса
+        return {"error": str(error)}, 400 # Возвращает ошибку значения
+
+    updated = session.execute(
+        update(Appointment).where(Appointment.id == appointment_id).values(**values),
+        execution_options={'synchronize_session': False} # Объекты назначений не загружены в сессию, синхронизация не нужна
+    ).rowcount # Один запрос UPDATE только переданных столбцов, строки справочников не изменяются
+    if not updated: # Если назначение не найдено
+        session.rollback() # Отмена строк справочников, созданных для этого запроса
+        return {"error": "Appointment not found"}, 404 # Возвращает ошибку отсутствия назначения
+    if values.keys() & {'doctor_id', 'service_id', 'appointment_time'} and has_conflict(session, appointment_id): # Пересечение возможно только при смене доктора, услуги или времени
+        session.rollback() # Отмена изменений, пересекающихся с другим назначением доктора
+        return {"error": "Doctor is already booked at this time"}, 409 # Возвращает ошибку пересечения назначений
+    session.commit() # Сохранение изменений в базе данных
+    return {"message": "Appointment updated successfully"}, 200 # Возвращает сообщение об успешном обновлении назначения
+
+def move_appointments(session, doctor_id, args, data): # Функция изменения всех назначений доктора за период одним запросом UPDATE
+    if not args.get('from') and not args.get('datetime'): # Период обязателен, чтобы случайно не изменить все назначения доктора
+        return {"error": "Missing period"}, 400 # Возвращает ошибку отсутствия периода
+    if not isinstance(data, dict) or not data: # Проверка, что переданы изменения
+        return {"error": "No fields to update"}, 400 # Возвращает ошибку пустого запроса
+    unknown = sorted(data.keys() - NAME_FIELDS.keys() - {'shift_minutes', 'move_to'}) # Поля, которые нельзя изменить
+    if unknown: # Если переданы неизвестные поля
+        return {"error": f"Unknown fields: {', '.join(unknown)}"}, 400 # Возвращает ошибку неизвестных полей
+    minutes = data.get('shift_minutes', 0) # Сдвиг времени в минутах
+    if not isinstance(minutes, int) or isinstance(minutes, bool): # Сдвиг должен быть целым числом
+        return {"error": "Invalid value for shift_minutes"}, 400 # Возвращает ошибку значения
+    try:
+        filters = range_filters({
+            'datetime': args.get('datetime'), 'from': args.get('from'), 'to': args.get('to'), 'doctor_id': str(doctor_id)
+        }) # Условия периода и доктора, как в /search
+        if data.get('move_to'): # Перенос на другой день с сохранением времени
+            first_day = parse_time_bound(args.get('from') or args['datetime']).date() # Первый день выбранного периода
+            minutes += (datetime.strptime(data['move_to'], DATE_FORMAT).date() - first_day).days * MINUTES_PER_DAY # Сдвиг до нового дня
+    except (TypeError, ValueError): # Обработка исключения, если формат даты неверный
+        return {"error": "Invalid datetime format"}, 400 # Возвращает ошибку формата даты и времени
+    if abs(minutes) > MAX_SHIFT_MINUTES: # Проверка сдвига до запроса, иначе SQLite вернет NULL вместо времени за пределами своего диапазона
+        return {"error": "Shift is out of range"}, 400 # Возвращает ошибку величины сдвига
+    try:
+        values = reference_values(session, data) # Перенаправление внешних ключей на строки справочников
+    except ValueError as error: # Обработка исключения, если название неверное
+        session.rollback() # Отмена строк справочников, созданных для этого запроса
+        return {"error": str(error)}, 400 # Возвращает ошибку значения
+    if minutes: # Сдвиг времени выполняется в SQLite с сохранением формата хранения (дробная часть секунд)
+        values['appointment_time'] = func.datetime(Appointment.appointment_time, f'{minutes:+d} minutes').concat(
+            func.substr(Appointment.appointment_time, 20)
+        )
+    if not values: # Если изменять нечего (например, нулевой сдвиг)
+        return {"error": "No fields to update"}, 400 # Возвращает ошибку пустого запроса
+
+    try:
+        moved = session.execute(
+            update(Appointment).where(*filters).values(**values).returning(Appointment.id),
+            execution_options={'synchronize_session': False} # Объекты назначений не загружены в сессию, синхронизация не нужна
+        ).scalars().all() # Один запрос UPDATE для всех назначений периода, возвращающий их id
+    except IntegrityError: # Новое время за пределами диапазона дат SQLite (NULL нарушает NOT NULL)
+        session.rollback() # Отмена всех изменений
+        return {"error": "Shift is out of range"}, 400 # Возвращает ошибку величины сдвига
+    if moved and values.keys() & {'doctor_id', 'service_id', 'appointment_time'}: # Проверка пересечений, если изменились доктор, услуга или время
+        conflicts = session.execute(conflicting_appointments(booked.id.in_(moved))).all() # Все пересечения перенесенных назначений одним запросом
+        if conflicts: # Если перенесенные назначения пересекаются с другими назначениями
+            session.rollback() # Отмена всех изменений
+            return {
+                "error": "Doctor is already booked at this time",
+                "conflicts": sorted({other_id for appointment_id, other_id in conflicts})
+            }, 409 # Возвращает ошибку пересечения назначений с id занятых назначений
+    session.commit() # Сохранение изменений в базе данных
+    return {"updated": len(moved), "message": "Appointments updated successfully"}, 200 # Возвращает количество измененных назначений
@@ -0,0 +1,136 @@
+import argparse # Импорт модуля для разбора аргументов командной строки
+import csv # Импорт модуля для чтения CSV
+import json # Импорт модуля для разбора JSON
+import sys # Импорт модуля для доступа к стандартному вводу
+import time # Импорт модуля для измерения времени
+from datetime import datetime # Импорт класса для работы с датой и временем
+from itertools import islice # Импорт функции для разбиения потока на порции
+from sqlalchemy import select, insert # Импорт функций для построения запросов
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert # Импорт INSERT с поддержкой ON CONFLICT для SQLite
+from sqlalchemy.exc import SQLAlchemyError # Импорт базового исключения SQLAlchemy
+from database_setup import Doctor, Specialization, Patient, Appointment, Service, get_engine, migrate # Импорт моделей и вспомогательных функций
+from queries import TIME_FORMAT # Импорт формата даты и времени назначения
+
+DEFAULT_CHUNK_SIZE = 1000 # Количество строк, вставляемых одной транзакцией
+MAX_REPORTED_ERRORS = 1000 # Максимальное количество ошибок, подробно возвращаемых в отчете
+NAME_FIELDS = { # Соответствие полей записи справочникам и столбцам назначения
+    'doctor_name': (Doctor, 'doctor_id'),
+    'specialization_name': (Specialization, 'specialization_id'),
+    'patient_name': (Patient, 'patient_id'),
+    'service': (Service, 'service_id'),
+}
+
+# Потоки лучше открывать с errors='surrogateescape': байты не в UTF-8 доходят до parse_record и отклоняются только в своей строке.
+# В потоке со строгим декодированием ошибка завершает чтение и тоже попадает в отчет как ошибка строки
+
+def read_json_lines(stream): # Генератор записей из потока JSON Lines
+    try:
+        for line in stream: # Чтение построчно без загрузки всего файла
+            if line.strip(): # Пропуск пустых строк
+                try:
+                    yield json.loads(line) # Разбор строки JSON
+                except ValueError as error: # Обработка исключения, если строка не является JSON
+                    yield error # Ошибка передается дальше как запись, чтобы сохранить нумерацию строк
+    except UnicodeDecodeError as error: # Обработка исключения, если поток не в UTF-8
+        yield error
+
+def read_csv(stream): # Генератор записей из потока CSV с заголовком
+    try:
+        yield from csv.DictReader(stream) # Каждая строка возвращается как словарь по заголовку
+    except UnicodeDecodeError as error: # Обработка исключения, если поток не в UTF-8
+        yield error
+
+def parse_record(record): # Функция проверки записи и преобразования времени назначения
+    if isinstance(record, Exception): # Если запись не удалось разобрать
+        raise ValueError(f"Invalid record: {record}")
+    if not isinstance(record, dict): # Если запись не является объектом
+        raise ValueError("Record must be an object")
+    missing = [field for field in (*NAME_FIELDS, 'appointment_time') if not record.get(field)] # Поиск отсутствующих полей
+    if missing: # Если есть отсутствующие поля
+        raise ValueError(f"Missing required fields: {', '.join(missing)}")
+    for field in NAME_FIELDS: # Проверка названий до вставки, где ошибка прервала бы весь импорт
+        if not isinstance(record[field], str): # Название должно быть строкой
+            raise ValueError(f"Invalid value for {field}")
+        try:
+            record[field].encode('utf-8') # Байты не в UTF-8, прочитанные с surrogateescape, не кодируются обратно
+        except UnicodeEncodeError:
+            raise ValueError(f"Invalid UTF-8 in {field}") from None
+    try:
+        appointment_time = datetime.strptime(record['appointment_time'], TIME_FORMAT) # Преобразование строки времени назначения в объект datetime
+    except (TypeError, ValueError): # Обработка исключения, если формат даты и времени неверный
+        raise ValueError("Invalid datetime format") from None
+    return {**{field: record[field] for field in NAME_FIELDS}, 'appointment_time': appointment_time} # Возвращает проверенную запись
+
+def resolve_names(connection, model, names): # Функция получения id строк справочника для набора названий одной порцией
+    ids = dict(connection.execute(select(model.name, model.id).where(model.name.in_(names))).all()) # Поиск существующих строк одним запросом
+    missing = names - ids.keys() # Названия, для которых строк еще нет
+    if missing: # Если нужно создать строки
+        connection.execute(
+            sqlite_insert(model).on_conflict_do_nothing(index_elements=['name']),
+            [{'name': name} for name in missing]
+        ) # Массовая вставка недостающих строк
+        ids.update(connection.execute(select(model.name, model.id).where(model.name.in_(missing))).all()) # Получение id созданных строк
+    return ids # Возвращает соответствие название -> id
+
+def insert_chunk(connection, rows): # Функция вставки порции проверенных записей
+    ids = { # Разрешение названий всех справочников для порции
+        field: resolve_names(connection, model, {row[field] for row in rows})
+        for field, (model, column) in NAME_FIELDS.items()
+    }
+    connection.execute(insert(Appointment), [{
+        **{column: ids[field][row[field]] for field, (model, column) in NAME_FIELDS.items()},
+        'appointment_time': row['appointment_time']
+    } for row in rows]) # Массовая вставка назначений через executemany
+
+def import_records(engine, records, chunk_size=DEFAULT_CHUNK_SIZE): # Функция импорта потока записей порциями
+    report = {'inserted': 0, 'failed': 0, 'errors': []} # Отчет об импорте
+    started = time.perf_counter() # Время начала импорта
+
+    def fail(row_number, message): # Регистрация ошибки строки без прерывания импорта
+        report['failed'] += 1
+        if len(report['errors']) < MAX_REPORTED_ERRORS: # Ограничение размера отчета
+            report['errors'].append({'row': row_number, 'error': message})
+
+    numbered = enumerate(records, start=1) # Нумерация записей для отчета об ошибках
+    while True:
+        chunk = list(islice(numbered, chunk_size)) # Чтение очередной порции записей
+        if not chunk: # Если записи закончились
+            break
+        rows, row_numbers = [], [] # Проверенные записи порции и их номера
+        for row_number, record in chunk: # Проверка каждой записи
+            try:
+                rows.append(parse_record(record))
+                row_numbers.append(row_number)
+            except ValueError as error: # Неверная запись пропускается
+                fail(row_number, str(error))
+        if not rows: # Если в порции нет верных записей
+            continue
+        try:
+            with engine.begin() as connection: # Одна транзакция на порцию
+                insert_chunk(connection, rows)
+            report['inserted'] += len(rows)
+        except SQLAlchemyError as error: # Ошибка базы данных отменяет только текущую порцию
+            for row_number in row_numbers:
+                fail(row_number, f"Database error: {error.__class__.__name__}")
+
+    report['seconds'] = round(time.perf_counter() - started, 3) # Длительность импорта
+    report['rows_per_second'] = round(report['inserted'] / report['seconds']) if report['seconds'] else report['inserted'] # Пропускная способность
+    return report # Возвращает отчет об импорте
+
+if __name__ == '__main__': # Проверка, выполняется ли скрипт напрямую
+    parser = argparse.ArgumentParser(description='Import appointments from a JSON Lines or CSV file') # Создание разборщика аргументов
+    parser.add_argument('path', help="file to import, or '-' for standard input") # Путь к файлу
+    parser.add_argument('--format', choices=['jsonl', 'csv'], help='input format (default: by file extension)') # Формат файла
+    parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE) # Размер порции
+    args = parser.parse_args() # Разбор аргументов
+
+    input_format = args.format or ('csv' if args.path.endswith('.csv') else 'jsonl') # Определение формата по расширению
+    source = sys.stdin.fileno() if args.path == '-' else args.path # Стандартный ввод или файл
+    stream = open(source, newline='', encoding='utf-8', errors='surrogateescape', closefd=args.path != '-') # Открытие потока ввода без закрытия стандартного ввода
+    engine = get_engine() # Создание движка базы данных
+    migrate(engine) # Создание таблиц и индексов при необходимости
+    with stream:
+        reader = read_csv(stream) if input_format == 'csv' else read_json_lines(stream) # Выбор способа чтения
+        report = import_records(engine, reader, args.chunk_size) # Импорт записей
+    print(json.dumps(report, ensure_ascii=False, indent=2)) # Вывод отчета
+    print(f"{report['inserted']} inserted, {report['failed']} failed in {report['seconds']} s ({report['rows_per_second']} rows/s)", file=sys.stderr) # Вывод пропускной способности
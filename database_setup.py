@@ -1,32 +1,37 @@
-from sqlalchemy import Column, ForeignKey, Integer, String, DateTime # Импорт необходимых классов из SQLAlchemy
+import os # Импорт модуля для чтения переменных окружения
+from sqlalchemy import Column, ForeignKey, Integer, String, DateTime, Index # Импорт необходимых классов из SQLAlchemy
 from sqlalchemy.orm import relationship, declarative_base # Импорт классов для создания отношений и базовой модели
 from sqlalchemy.orm import sessionmaker # Импорт класса для создания сессий
-from sqlalchemy import create_engine # Импорт класса для создания движка базы данных
+from sqlalchemy import create_engine, event, inspect, DDL, text # Импорт классов для создания движка базы данных, событий, просмотра схемы и DDL
+from sqlalchemy.engine import make_url # Импорт функции для разбора URL базы данных
+from sqlalchemy.pool import QueuePool, StaticPool # Импорт пулов соединений
+from sqlalchemy.schema import CreateTable # Импорт DDL создания таблицы
 
 Base = declarative_base() # Создание базового класса для всех моделей
 
 class Doctor(Base): # Определение модели Doctor (Доктор)
     __tablename__ = 'doctor' # Название таблицы в базе данных
     id = Column(Integer, primary_key=True) # Определение столбца id как первичного ключа
-    name = Column(String(250), nullable=False) # Определение столбца name как строки длиной до 250 символов, обязательное поле
+    name = Column(String(250), nullable=False, unique=True, index=True) # Определение столбца name как строки длиной до 250 символов, обязательное уникальное индексируемое поле
     appointments = relationship('Appointment', back_populates='doctor', cascade="all, delete-orphan") # Определение отношения с таблицей Appointment
 
 class Specialization(Base): # Определение модели Specialization (Специализация)
     __tablename__ = 'specialization' # Название таблицы в базе данных
     id = Column(Integer, primary_key=True) # Определение столбца id как первичного ключа
-    name = Column(String(250), nullable=False) # Определение столбца name как строки длиной до 250 символов, обязательное поле
+    name = Column(String(250), nullable=False, unique=True, index=True) # Определение столбца name как строки длиной до 250 символов, обязательное уникальное индексируемое поле
     appointments = relationship('Appointment', back_populates='specialization', cascade="all, delete-orphan") # Определение отношения с таблицей Appointment
 
 class Patient(Base): # Определение модели Patient (Пациент)
     __tablename__ = 'patient' # Название таблицы в базе данных
     id = Column(Integer, primary_key=True) # Определение столбца id как первичного ключа
-    name = Column(String(250), nullable=False) # Определение столбца name как строки длиной до 250 символов, обязательное поле
+    name = Column(String(250), nullable=False, unique=True, index=True) # Определение столбца name как строки длиной до 250 символов, обязательное уникальное индексируемое поле
     appointments = relationship('Appointment', back_populates='patient', cascade="all, delete-orphan") # Определение отношения с таблицей Appointment
 
 class Service(Base): # Определение модели Service (Услуга)
     __tablename__ = 'service' # Название таблицы в базе данных
     id = Column(Integer, primary_key=True) # Определение столбца id как первичного ключа
-    name = Column(String(250), nullable=False) # Определение столбца name как строки длиной до 250 символов, обязательное поле
+    name = Column(String(250), nullable=False, unique=True, index=True) # Определение столбца name как строки длиной до 250 символов, обязательное уникальное индексируемое поле
+    duration_minutes = Column(Integer, nullable=False, default=30, server_default='30') # Определение столбца duration_minutes как длительности услуги в минутах
     appointments = relationship('Appointment', back_populates='service', cascade="all, delete-orphan") # Определение отношения с таблицей Appointment
 
 class Appointment(Base): # Определение модели Appointment (Назначение)
@@ -34,20 +39,199 @@ class Appointment(Base): # Определение модели Appointment (На
     id = Column(Integer, primary_key=True) # Определение столбца id как первичного ключа
     doctor_id = Column(Integer, ForeignKey('doctor.id')) # Определение столбца doctor_id как внешнего ключа, ссылающегося на таблицу doctor
     patient_id = Column(Integer, ForeignKey('patient.id')) # Определение столбца patient_id как внешнего ключа, ссылающегося на таблицу patient
-    service_id = Column(Integer, ForeignKey('service.id')) # Определение столбца service_id как внешнего ключа, ссылающегося на таблицу service
-    specialization_id = Column(Integer, ForeignKey('specialization.id')) # Определение столбца specialization_id как внешнего ключа, ссылающегося на таблицу specialization
-    appointment_time = Column(DateTime, nullable=False) # Определение столбца appointment_time как даты и времени, обязательное поле
+    service_id = Column(Integer, ForeignKey('service.id'), index=True) # Определение столбца service_id как внешнего ключа, ссылающегося на таблицу service
+    specialization_id = Column(Integer, ForeignKey('specialization.id'), index=True) # Определение столбца specialization_id как внешнего ключа, ссылающегося на таблицу specialization
+    appointment_time = Column(DateTime, nullable=False, index=True) # Определение столбца appointment_time как даты и времени, обязательное индексируемое поле
     
     doctor = relationship('Doctor', back_populates='appointments') # Определение отношения с таблицей Doctor
     patient = relationship('Patient', back_populates='appointments') # Определение отношения с таблицей Patient
     service = relationship('Service', back_populates='appointments') # Определение отношения с таблицей Service
     specialization = relationship('Specialization', back_populates='appointments') # Определение отношения с таблицей Specialization
 
-def get_engine(): # Функция для создания движка базы данных
-    return create_engine('sqlite:///:memory:') # Создание движка базы данных SQLite в памяти
+    __table_args__ = ( # Составные индексы для выборок назначений доктора и пациента по времени
+        Index('ix_appointment_doctor_time', 'doctor_id', 'appointment_time'),
+        Index('ix_appointment_patient_time', 'patient_id', 'appointment_time'),
+        {'sqlite_autoincrement': True}, # id удаленных (в том числе архивированных) назначений не выдаются повторно
+    )
+
+class CacheGeneration(Base): # Определение модели CacheGeneration (Поколение данных для кэша ответов)
+    __tablename__ = 'cache_generation' # Название таблицы в базе данных
+    id = Column(Integer, primary_key=True) # Определение столбца id как первичного ключа (строка 1 для кэша ответов, строка NAMES_GENERATION_ID для кэша названий справочников)
+    generation = Column(Integer, nullable=False, default=0) # Определение столбца generation как номера поколения, увеличиваемого при каждом изменении назначений
+
+SEARCH_INDEX_DDL = [ # Полнотекстовый индекс SQLite FTS5 по названиям, связанным с назначением
+    "CREATE VIRTUAL TABLE IF NOT EXISTS appointment_fts USING fts5("
+    "doctor, specialization, patient, service, tokenize='unicode61 remove_diacritics 2', prefix='2 3')",
+    "CREATE TRIGGER IF NOT EXISTS appointment_fts_insert AFTER INSERT ON appointment BEGIN "
+    "INSERT INTO appointment_fts(rowid, doctor, specialization, patient, service) VALUES (new.id, "
+    "(SELECT name FROM doctor WHERE id = new.doctor_id), "
+    "(SELECT name FROM specialization WHERE id = new.specialization_id), "
+    "(SELECT name FROM patient WHERE id = new.patient_id), "
+    "(SELECT name FROM service WHERE id = new.service_id)); END",
+    "CREATE TRIGGER IF NOT EXISTS appointment_fts_update "
+    "AFTER UPDATE OF doctor_id, specialization_id, patient_id, service_id ON appointment BEGIN "
+    "UPDATE appointment_fts SET "
+    "doctor = (SELECT name FROM doctor WHERE id = new.doctor_id), "
+    "specialization = (SELECT name FROM specialization WHERE id = new.specialization_id), "
+    "patient = (SELECT name FROM patient WHERE id = new.patient_id), "
+    "service = (SELECT name FROM service WHERE id = new.service_id) "
+    "WHERE rowid = new.id; END",
+    "CREATE TRIGGER IF NOT EXISTS appointment_fts_delete AFTER DELETE ON appointment BEGIN "
+    "DELETE FROM appointment_fts WHERE rowid = old.id; END",
+] + [ # При переименовании доктора, специализации, пациента или услуги обновляются их назначения в индексе
+    f"CREATE TRIGGER IF NOT EXISTS {name}_fts_rename AFTER UPDATE OF name ON {name} BEGIN "
+    f"UPDATE appointment_fts SET {name} = new.name "
+    f"WHERE rowid IN (SELECT id FROM appointment WHERE {name}_id = new.id); END"
+    for name in ('doctor', 'specialization', 'patient', 'service')
+]
+
+for statement in SEARCH_INDEX_DDL: # Создание индекса и триггеров вместе с таблицей appointment
+    event.listen(Appointment.__table__, 'after_create', DDL(statement).execute_if(dialect='sqlite'))
+event.listen(Appointment.__table__, 'after_drop', DDL('DROP TABLE IF EXISTS appointment_fts').execute_if(dialect='sqlite')) # Удаление индекса вместе с таблицей appointment
+
+NAMES_GENERATION_ID = 2 # Строка поколения названий справочников, увеличиваемого только при переименовании
+
+CACHE_GENERATION_DDL = [ # Строки поколений и триггеры, увеличивающие их при любом изменении видимых в ответах данных
+    "INSERT OR IGNORE INTO cache_generation (id, generation) VALUES (1, 0)",
+    f"INSERT OR IGNORE INTO cache_generation (id, generation) VALUES ({NAMES_GENERATION_ID}, 0)",
+] + [
+    f"CREATE TRIGGER IF NOT EXISTS appointment_generation_{action.lower()} AFTER {action} ON appointment BEGIN "
+    "UPDATE cache_generation SET generation = generation + 1 WHERE id = 1; END"
+    for action in ('INSERT', 'UPDATE', 'DELETE')
+] + [
+    f"CREATE TRIGGER IF NOT EXISTS {name}_generation_rename AFTER UPDATE OF name ON {name} BEGIN "
+    "UPDATE cache_generation SET generation = generation + 1 WHERE id = 1; END"
+    for name in ('doctor', 'specialization', 'patient', 'service')
+] + [
+    f"CREATE TRIGGER IF NOT EXISTS {name}_names_generation_rename AFTER UPDATE OF name ON {name} BEGIN "
+    f"UPDATE cache_generation SET generation = generation + 1 WHERE id = {NAMES_GENERATION_ID}; END"
+    for name in ('doctor', 'specialization', 'service')
+]
+
+for statement in CACHE_GENERATION_DDL: # Создание после всех таблиц, в том числе при миграции существующей базы данных
+    event.listen(Base.metadata, 'after_create', DDL(statement).execute_if(dialect='sqlite'))
+
+def rebuild_search_index(connection): # Функция полного перестроения полнотекстового индекса
+    connection.execute(text("DELETE FROM appointment_fts")) # Очистка индекса
+    connection.execute(text(
+        "INSERT INTO appointment_fts(rowid, doctor, specialization, patient, service) "
+        "SELECT appointment.id, doctor.name, specialization.name, patient.name, service.name FROM appointment "
+        "LEFT JOIN doctor ON doctor.id = appointment.doctor_id "
+        "LEFT JOIN specialization ON specialization.id = appointment.specialization_id "
+        "LEFT JOIN patient ON patient.id = appointment.patient_id "
+        "LEFT JOIN service ON service.id = appointment.service_id"
+    )) # Заполнение индекса по всем назначениям одним запросом
+
+DEFAULT_DATABASE_URL = 'sqlite:///dental_clinic.db' # URL базы данных по умолчанию (файл рядом с приложением)
+SCHEMA_VERSION = 1 # Версия схемы в PRAGMA user_version, увеличивается при каждом изменении upgrade()
+SQLITE_PRAGMAS = { # Настройки SQLite, применяемые к каждому новому соединению с файлом
+    'journal_mode': 'WAL', # Журнал с упреждающей записью: читатели не блокируют писателя
+    'synchronous': 'NORMAL', # В режиме WAL безопасно и заметно быстрее FULL
+    'busy_timeout': 5000, # Ожидание блокировки записи другим процессом в миллисекундах
+    'mmap_size': 268435456, # Чтение файла базы данных через отображение в память (256 МБ)
+}
+
+def set_sqlite_pragmas(dbapi_connection, connection_record): # Обработчик события подключения к файлу SQLite
+    cursor = dbapi_connection.cursor() # Создание курсора
+    for name, value in SQLITE_PRAGMAS.items(): # Применение каждой настройки
+        cursor.execute(f"PRAGMA {name} = {value}")
+    cursor.close() # Закрытие курсора
+
+def get_engine(url=None): # Функция для создания движка базы данных
+    url = make_url(url or os.environ.get('DATABASE_URL', DEFAULT_DATABASE_URL)) # URL из аргумента, переменной окружения или по умолчанию
+    if url.get_backend_name() != 'sqlite': # Если используется не SQLite
+        return create_engine(url, pool_pre_ping=True) # Создание движка с настройками пула по умолчанию
+    if url.database in (None, '', ':memory:'): # Если база данных SQLite в памяти
+        return create_engine(url, poolclass=StaticPool, connect_args={'check_same_thread': False}) # Одно общее соединение, чтобы все потоки видели одну базу
+    engine = create_engine(
+        url,
+        poolclass=QueuePool, # Пул соединений с файлом для одновременных читателей
+        pool_size=int(os.environ.get('DATABASE_POOL_SIZE', 5)), # Количество постоянно открытых соединений
+        max_overflow=int(os.environ.get('DATABASE_MAX_OVERFLOW', 10)), # Количество дополнительных соединений под нагрузкой
+        connect_args={'check_same_thread': False} # Соединения из пула используются разными потоками
+    ) # Создание движка базы данных SQLite в файле
+    event.listen(engine, 'connect', set_sqlite_pragmas) # Применение настроек к каждому новому соединению
+    return engine # Возвращает движок базы данных
 
 def create_all(engine): # Функция для создания всех таблиц в базе данных
     Base.metadata.create_all(engine) # Создание всех таблиц на основе определенных моделей
 
 def drop_all(engine): # Функция для удаления всех таблиц из базы данных
-    Base.metadata.drop_all(engine) # Удаление всех таблиц
\ No newline at end of file
+    Base.metadata.drop_all(engine) # Удаление всех таблиц
+
+def has_unique_name_index(connection, table_name): # Функция проверки, что названия справочника уже защищены уникальным индексом
+    return any(
+        index['unique'] and index['column_names'] == ['name'] for index in inspect(connection).get_indexes(table_name)
+    ) # При уникальном индексе дубликатов быть не может
+
+def merge_duplicate_names(connection, table_name): # Функция объединения строк справочника с одинаковым названием
+    keep = f"SELECT MIN(id) FROM {table_name} GROUP BY name" # Из каждой группы дубликатов остается строка с наименьшим id
+    connection.execute(text(
+        f"UPDATE appointment SET {table_name}_id = (SELECT MIN(kept.id) FROM {table_name} kept "
+        f"WHERE kept.name = (SELECT name FROM {table_name} WHERE id = appointment.{table_name}_id)) "
+        f"WHERE {table_name}_id NOT IN ({keep})"
+    )) # Перенаправление назначений на оставляемую строку
+    connection.execute(text(f"DELETE FROM {table_name} WHERE id NOT IN ({keep})")) # Удаление дубликатов
+
+def add_missing_columns(connection, table): # Функция добавления в существующую таблицу столбцов, появившихся в модели
+    existing = {column['name'] for column in inspect(connection).get_columns(table.name)} # Столбцы таблицы в базе данных
+    for column in table.columns: # Перебор столбцов модели
+        if column.name in existing: # Пропуск уже существующих столбцов
+            continue
+        definition = f"{column.name} {column.type.compile(connection.dialect)}" # Имя и тип столбца
+        if column.server_default is not None: # Значение по умолчанию для уже существующих строк
+            definition += f" NOT NULL DEFAULT {column.server_default.arg}" if not column.nullable else f" DEFAULT {column.server_default.arg}"
+        connection.execute(text(f"ALTER TABLE {table.name} ADD COLUMN {definition}")) # Добавление столбца
+
+def add_autoincrement(connection, table): # Функция пересоздания таблицы SQLite, созданной без AUTOINCREMENT, с сохранением строк
+    sql = connection.execute(text("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = :name"), {'name': table.name}).scalar() # Определение таблицы в базе данных
+    if sql is None or 'AUTOINCREMENT' in sql.upper(): # Если таблицы нет или она уже создана с AUTOINCREMENT
+        return
+    triggers = connection.execute(text(
+        "SELECT name FROM sqlite_master WHERE type = 'trigger' AND sql LIKE :pattern"
+    ), {'pattern': f'%{table.name}%'}).scalars().all() # Триггеры, ссылающиеся на таблицу, мешают удалению и переименованию
+    for trigger in triggers: # Удаление триггеров, они создаются заново после пересоздания таблицы
+        connection.execute(text(f"DROP TRIGGER {trigger}"))
+    rebuilt = f'{table.name}_rebuild' # Временное имя новой таблицы
+    create = str(CreateTable(table).compile(dialect=connection.dialect)) # DDL таблицы модели без индексов, чтобы не было конфликта имен индексов
+    connection.execute(text(create.replace(f'CREATE TABLE {table.name} ', f'CREATE TABLE {rebuilt} ', 1))) # Создание таблицы под временным именем
+    columns = ', '.join(column.name for column in table.columns) # Столбцы модели (недостающие уже добавлены)
+    connection.execute(text(f"INSERT INTO {rebuilt} ({columns}) SELECT {columns} FROM {table.name}")) # Копирование строк с прежними id
+    connection.execute(text(f"DROP TABLE {table.name}")) # Удаление прежней таблицы вместе с ее индексами
+    connection.execute(text(f"ALTER TABLE {rebuilt} RENAME TO {table.name}")) # Новая таблица получает прежнее имя
+    for statement in SEARCH_INDEX_DDL + CACHE_GENERATION_DDL: # Создание удаленных триггеров заново
+        connection.execute(text(statement))
+
+def schema_version(connection): # Функция чтения версии схемы базы данных SQLite (0 для новой или еще не обновленной базы данных)
+    if connection.dialect.name != 'sqlite': # Версия хранится только в заголовке файла SQLite
+        return 0
+    return connection.exec_driver_sql("PRAGMA user_version").scalar()
+
+def upgrade(connection): # Функция обновления схемы базы данных через открытое соединение
+    if schema_version(connection) >= SCHEMA_VERSION: # Обычный запуск приложения: одно чтение заголовка без блокировки записи
+        return
+    has_search_index = connection.dialect.has_table(connection, 'appointment_fts') # Проверка наличия полнотекстового индекса
+    Base.metadata.create_all(connection) # Создание недостающих таблиц
+    for table in Base.metadata.sorted_tables: # Перебор всех таблиц
+        add_missing_columns(connection, table) # Добавление недостающих столбцов
+    if connection.dialect.name == 'sqlite': # Назначения, созданные до AUTOINCREMENT, могли получать id удаленных назначений
+        add_autoincrement(connection, Appointment.__table__) # Пересоздание таблицы назначений с AUTOINCREMENT
+    for table_name in ('doctor', 'specialization', 'patient', 'service'): # Перебор справочников с уникальными названиями
+        if not has_unique_name_index(connection, table_name): # Объединение сканирует все назначения, поэтому выполняется только до создания индекса
+            merge_duplicate_names(connection, table_name) # Удаление дубликатов перед созданием уникальных индексов
+    for table in Base.metadata.sorted_tables: # Перебор всех таблиц
+        for index in table.indexes: # Перебор индексов таблицы
+            index.create(connection, checkfirst=True) # Создание индекса, если он отсутствует
+    if not has_search_index and connection.dialect.name == 'sqlite': # Если полнотекстового индекса не было
+        for statement in SEARCH_INDEX_DDL: # Создание индекса и триггеров
+            connection.execute(text(statement))
+        rebuild_search_index(connection) # Заполнение индекса по существующим назначениям
+    if connection.dialect.name == 'sqlite': # Запись версии в той же транзакции, что и изменения схемы
+        connection.exec_driver_sql(f"PRAGMA user_version = {SCHEMA_VERSION}")
+
+def migrate(engine): # Функция обновления схемы существующей базы данных
+    with engine.begin() as connection: # Выполнение миграции в одной транзакции
+        upgrade(connection)
+
+if __name__ == '__main__': # Проверка, выполняется ли скрипт напрямую
+    migrate(get_engine()) # Обновление схемы базы данных один раз до запуска процессов приложения
\ No newline at end of file
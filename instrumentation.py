@@ -0,0 +1,45 @@
+from threading import Lock # Импорт блокировки для потокобезопасного изменения счетчиков
+from sqlalchemy import event # Импорт системы событий SQLAlchemy
+
+class DatabaseStats: # Определение счетчиков сессий и соединений пула
+    def __init__(self): # Инициализация счетчиков
+        self.lock = Lock() # Блокировка для доступа из нескольких потоков
+        self.open_sessions = 0 # Количество сессий с незавершенной транзакцией
+        self.sessions_opened = 0 # Общее количество начатых транзакций сессий
+        self.pool_checked_out = 0 # Количество соединений, выданных из пула и еще не возвращенных
+        self.pool_checkouts = 0 # Общее количество выдач соединений из пула
+
+    def add(self, name, value): # Изменение счетчика на величину value
+        with self.lock:
+            setattr(self, name, getattr(self, name) + value)
+
+    def as_dict(self): # Получение текущих значений счетчиков
+        with self.lock:
+            return {
+                'open_sessions': self.open_sessions,
+                'sessions_opened': self.sessions_opened,
+                'pool_checked_out': self.pool_checked_out,
+                'pool_checkouts': self.pool_checkouts,
+            }
+
+def track_engine(engine, stats): # Функция подписки на события выдачи и возврата соединений пула
+    @event.listens_for(engine, 'checkout') # Соединение выдано из пула
+    def on_checkout(dbapi_connection, connection_record, connection_proxy):
+        stats.add('pool_checked_out', 1)
+        stats.add('pool_checkouts', 1)
+
+    @event.listens_for(engine, 'checkin') # Соединение возвращено в пул
+    def on_checkin(dbapi_connection, connection_record):
+        stats.add('pool_checked_out', -1)
+
+def track_sessions(session_factory, stats): # Функция подписки на события начала и завершения транзакций сессий
+    @event.listens_for(session_factory, 'after_transaction_create') # Начата транзакция сессии
+    def on_transaction_create(session, transaction):
+        if transaction.parent is None: # Учитываются только корневые транзакции, а не вложенные
+            stats.add('open_sessions', 1)
+            stats.add('sessions_opened', 1)
+
+    @event.listens_for(session_factory, 'after_transaction_end') # Транзакция сессии завершена (commit, rollback или close)
+    def on_transaction_end(session, transaction):
+        if transaction.parent is None:
+            stats.add('open_sessions', -1)
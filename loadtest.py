@@ -0,0 +1,82 @@
+import argparse # Импорт модуля для разбора аргументов командной строки
+import http.client # Импорт HTTP-клиента с постоянными соединениями
+import json # Импорт модуля для сериализации в JSON
+import math # Импорт математических функций для вычисления процентилей
+import threading # Импорт модуля для работы с потоками
+import time # Импорт модуля для измерения времени
+from urllib.parse import urlsplit # Импорт функции разбора URL
+
+# Нагрузочное сравнение WSGI- и ASGI-версий API: каждый клиент держит одно соединение
+# и последовательно отправляет запросы, пока не будет выполнено заданное количество.
+
+DEFAULT_PATHS = ['/appointments?limit=50', '/search?query=Smith'] # Запросы по умолчанию
+
+def percentile(values, fraction): # Функция вычисления процентиля по отсортированному списку
+    if not values: # Если измерений нет
+        return None
+    return values[max(0, math.ceil(fraction * len(values)) - 1)] # Ближайшее значение сверху
+
+def run_client(base_url, paths, count, latencies, errors, lock): # Функция одного клиента нагрузки
+    parts = urlsplit(base_url) # Разбор адреса сервера
+    connection = http.client.HTTPConnection(parts.hostname, parts.port or 80, timeout=30) # Постоянное соединение клиента
+    measured, failed = [], 0 # Длительности успешных запросов и количество ошибок клиента
+    for i in range(count): # Отправка запросов по очереди
+        path = paths[i % len(paths)] # Запросы чередуются
+        started = time.perf_counter() # Время начала запроса
+        try:
+            connection.request('GET', parts.path.rstrip('/') + path) # Отправка запроса
+            response = connection.getresponse() # Получение ответа
+            response.read() # Чтение тела ответа до конца
+            if response.status >= 500: # Ошибка сервера считается неудачным запросом
+                failed += 1
+                continue
+            measured.append(time.perf_counter() - started) # Длительность успешного запроса
+        except (OSError, http.client.HTTPException): # Обрыв или отказ соединения
+            failed += 1
+            connection.close() # Следующий запрос откроет новое соединение
+    connection.close() # Закрытие соединения клиента
+    with lock: # Объединение результатов всех клиентов
+        latencies.extend(measured)
+        errors[0] += failed
+
+def load_test(base_url, paths, concurrency=200, requests=10000): # Функция нагрузки сервера concurrency одновременными клиентами
+    latencies, errors, lock = [], [0], threading.Lock() # Общие результаты клиентов
+    per_client = [requests // concurrency + (i < requests % concurrency) for i in range(concurrency)] # Распределение запросов между клиентами
+    threads = [
+        threading.Thread(target=run_client, args=(base_url, paths, count, latencies, errors, lock))
+        for count in per_client if count
+    ] # Создание клиентов
+    started = time.perf_counter() # Время начала нагрузки
+    for thread in threads: # Запуск всех клиентов
+        thread.start()
+    for thread in threads: # Ожидание завершения всех клиентов
+        thread.join()
+    seconds = time.perf_counter() - started # Длительность нагрузки
+    latencies.sort() # Сортировка длительностей для вычисления процентилей
+    return {
+        'url': base_url,
+        'concurrency': len(threads),
+        'requests': len(latencies) + errors[0],
+        'errors': errors[0],
+        'seconds': round(seconds, 3),
+        'requests_per_second': round(len(latencies) / seconds, 1) if seconds else None,
+        'p50_ms': round(percentile(latencies, 0.50) * 1000, 2) if latencies else None,
+        'p99_ms': round(percentile(latencies, 0.99) * 1000, 2) if latencies else None,
+    } # Возвращает пропускную способность и задержки
+
+if __name__ == '__main__': # Проверка, выполняется ли скрипт напрямую
+    parser = argparse.ArgumentParser(description='Compare requests/sec and latency of running API servers') # Создание разборщика аргументов
+    parser.add_argument('urls', nargs='+', help='base URL of each server, e.g. http://127.0.0.1:4996 http://127.0.0.1:8000') # Адреса серверов
+    parser.add_argument('--path', action='append', dest='paths', help='request path, may be repeated (default: list and search)') # Запрашиваемые пути
+    parser.add_argument('--concurrency', type=int, default=200) # Количество одновременных клиентов
+    parser.add_argument('--requests', type=int, default=10000) # Общее количество запросов к каждому серверу
+    parser.add_argument('--json', action='store_true', help='print results as JSON') # Вывод результатов в формате JSON
+    args = parser.parse_args() # Разбор аргументов
+
+    results = [load_test(url, args.paths or DEFAULT_PATHS, args.concurrency, args.requests) for url in args.urls] # Нагрузка серверов по очереди
+    if args.json: # Если запрошен вывод в формате JSON
+        print(json.dumps(results, indent=2))
+    else: # Вывод таблицы результатов
+        print(f"{'url':<32} {'req/s':>9} {'p50 ms':>9} {'p99 ms':>9} {'errors':>7}")
+        for result in results:
+            print(f"{result['url']:<32} {result['requests_per_second'] or 0:>9} {result['p50_ms'] or 0:>9} {result['p99_ms'] or 0:>9} {result['errors']:>7}")
@@ -0,0 +1,164 @@
+import cProfile # Импорт профилировщика Python
+import os # Импорт модуля для работы с файлами и переменными окружения
+import threading # Импорт модуля для хранения данных текущего запроса в потоке
+import time # Импорт модуля для измерения времени
+from bisect import bisect_left # Импорт двоичного поиска для выбора интервала гистограммы
+from flask import request # Импорт объекта запроса Flask
+from sqlalchemy import event # Импорт системы событий SQLAlchemy
+
+REQUEST_DURATION_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0) # Границы интервалов длительности запроса в секундах
+STATEMENT_DURATION_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1.0) # Границы интервалов длительности SQL-запроса в секундах
+STATEMENT_COUNT_BUCKETS = (1, 2, 3, 5, 8, 13, 21, 34, 55) # Границы интервалов количества SQL-запросов на запрос
+SLOW_STATEMENTS_LOGGED = 5 # Количество самых долгих SQL-запросов в журнале медленного запроса
+DB_COUNTERS = ('sessions_opened', 'pool_checkouts') # Счетчики базы данных, которые только растут (остальные - текущие значения)
+
+def format_labels(pairs): # Функция форматирования меток в формате Prometheus
+    escaped = (
+        name + '="' + str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') + '"'
+        for name, value in pairs
+    ) # Экранирование обратной косой черты, кавычек и перевода строки в значениях
+    return '{' + ','.join(escaped) + '}' if pairs else '' # Возвращает метки в фигурных скобках
+
+class Histogram: # Определение потокобезопасной гистограммы в формате Prometheus
+    def __init__(self, name, help_text, buckets, label_names): # Инициализация гистограммы
+        self.name = name # Имя метрики
+        self.help_text = help_text # Описание метрики
+        self.buckets = buckets # Верхние границы интервалов
+        self.label_names = label_names # Имена меток
+        self.series = {} # Значения меток -> количества по интервалам, последний элемент - сумма значений
+        self.lock = threading.Lock() # Блокировка для доступа из нескольких потоков
+
+    def observe(self, value, *labels): # Учет одного значения
+        index = bisect_left(self.buckets, value) # Первый интервал, верхняя граница которого не меньше значения
+        with self.lock:
+            series = self.series.setdefault(labels, [0] * (len(self.buckets) + 1) + [0.0]) # Интервалы, +Inf и сумма
+            series[index] += 1
+            series[-1] += value
+
+    def render(self): # Формирование текста метрики в формате Prometheus
+        with self.lock:
+            items = sorted((labels, list(series)) for labels, series in self.series.items()) # Снимок значений
+        lines = [f'# HELP {self.name} {self.help_text}', f'# TYPE {self.name} histogram'] # Описание и тип метрики
+        for labels, series in items: # Перебор наборов меток
+            pairs = list(zip(self.label_names, labels)) # Метки набора
+            cumulative = 0 # Количество значений не больше текущей границы
+            for bound, count in zip((*self.buckets, '+Inf'), series[:-1]): # Интервалы в формате Prometheus накопительные
+                cumulative += count
+                lines.append(f'{self.name}_bucket{format_labels(pairs + [("le", bound)])} {cumulative}')
+            lines.append(f'{self.name}_sum{format_labels(pairs)} {series[-1]}') # Сумма значений
+            lines.append(f'{self.name}_count{format_labels(pairs)} {cumulative}') # Количество значений
+        return lines # Возвращает строки метрики
+
+def operation_of(statement): # Функция определения вида SQL-запроса для метки гистограммы
+    words = statement.split(None, 1) # Первое слово запроса
+    return words[0].upper() if words else 'UNKNOWN' # Возвращает SELECT, INSERT, UPDATE, DELETE и т. д.
+
+class RequestProfiler: # Определение включаемого по требованию сбора времени запросов, SQL-запросов и профилей медленных запросов
+    def __init__(self, engine, enabled=None, threshold_ms=None, profile_dir=None): # Инициализация по аргументам или переменным окружения
+        self.enabled = enabled if enabled is not None else os.environ.get('METRICS_ENABLED', '') in ('1', 'true') # Сбор метрик выключен по умолчанию
+        threshold = os.environ.get('PROFILE_THRESHOLD_MS') # Порог длительности для сохранения профиля из переменной окружения
+        self.threshold_ms = threshold_ms if threshold_ms is not None else float(threshold) if threshold else None # Без порога профилировщик не запускается
+        self.profile_dir = profile_dir or os.environ.get('PROFILE_DIR', 'profiles') # Каталог для сохранения профилей
+        self.logger = None # Журнал приложения для сообщений о медленных запросах
+        self.local = threading.local() # Данные текущего запроса потока
+        self.profile_lock = threading.Lock() # cProfile занимает один слот профилирования на процесс, поэтому профилируется один запрос за раз
+        self.request_duration = Histogram(
+            'clinic_http_request_duration_seconds', 'Wall time of HTTP requests.',
+            REQUEST_DURATION_BUCKETS, ('endpoint', 'method', 'status')
+        ) # Длительность запросов
+        self.request_statements = Histogram(
+            'clinic_http_request_sql_statements', 'SQL statements executed per HTTP request.',
+            STATEMENT_COUNT_BUCKETS, ('endpoint', 'method')
+        ) # Количество SQL-запросов на запрос
+        self.statement_duration = Histogram(
+            'clinic_sql_statement_duration_seconds', 'Duration of SQL statements.',
+            STATEMENT_DURATION_BUCKETS, ('operation',)
+        ) # Длительность SQL-запросов
+        event.listen(engine, 'before_cursor_execute', self.before_cursor_execute) # Подписка на начало выполнения SQL-запросов
+        event.listen(engine, 'after_cursor_execute', self.after_cursor_execute) # Подписка на окончание выполнения SQL-запросов
+
+    def init_app(self, app): # Регистрация обработчиков начала и окончания запроса в приложении Flask
+        self.logger = app.logger # Журнал приложения
+        app.before_request(self.start_request)
+        app.after_request(self.finish_request)
+        app.teardown_request(self.teardown_request) # Выполняется и тогда, когда after_request пропущен из-за исключения
+
+    def before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany): # Обработчик начала выполнения SQL-запроса
+        if self.enabled:
+            conn.info['statement_started'] = time.perf_counter() # Запросы одного соединения выполняются последовательно
+        else:
+            conn.info.pop('statement_started', None) # Сбор выключен, время не измеряется
+
+    def after_cursor_execute(self, conn, cursor, statement, parameters, context, executemany): # Обработчик окончания выполнения SQL-запроса
+        started = conn.info.pop('statement_started', None) # Время начала запроса
+        if started is None: # Если сбор был выключен при начале запроса
+            return
+        duration = time.perf_counter() - started # Длительность SQL-запроса
+        self.statement_duration.observe(duration, operation_of(statement)) # Учет в гистограмме
+        statements = getattr(self.local, 'statements', None) # SQL-запросы текущего HTTP-запроса
+        if statements is not None: # Запросы вне HTTP-запроса (например, потоковая выдача после ответа) учитываются только в гистограмме
+            statements.append((duration, statement))
+
+    def start_request(self): # Обработчик начала HTTP-запроса
+        if not self.enabled: # Если сбор выключен
+            return
+        self.local.statements = [] # SQL-запросы текущего HTTP-запроса
+        self.local.profile = None # Профилировщик текущего HTTP-запроса
+        if self.threshold_ms is not None and self.profile_lock.acquire(blocking=False): # Профиль нужен только при заданном пороге и если не профилируется другой запрос
+            profile = cProfile.Profile()
+            try:
+                profile.enable()
+            except ValueError: # Профилирование уже включено вне приложения
+                self.profile_lock.release()
+            else:
+                self.local.profile = profile
+        self.local.started = time.perf_counter() # Время начала HTTP-запроса
+
+    def finish_request(self, response): # Обработчик окончания HTTP-запроса
+        statements = getattr(self.local, 'statements', None) # SQL-запросы текущего HTTP-запроса
+        if statements is None: # Если сбор был выключен при начале запроса
+            return response
+        elapsed = time.perf_counter() - self.local.started # Длительность HTTP-запроса
+        profile = self.stop_profile() # Остановка профилировщика текущего HTTP-запроса
+        self.local.statements = None # Следующие SQL-запросы потока не относятся к этому запросу
+
+        endpoint = request.endpoint or 'unmatched' # Имя функции представления, а не путь, чтобы количество меток было ограничено
+        sql_seconds = sum(duration for duration, statement in statements) # Суммарное время SQL-запросов
+        self.request_duration.observe(elapsed, endpoint, request.method, response.status_code) # Учет длительности запроса
+        self.request_statements.observe(len(statements), endpoint, request.method) # Учет количества SQL-запросов
+        response.headers['Server-Timing'] = f'app;dur={elapsed * 1000:.1f}, db;dur={sql_seconds * 1000:.1f};desc="{len(statements)} statements"' # Время запроса и базы данных для инструментов разработчика браузера
+
+        if profile is not None and elapsed * 1000 >= self.threshold_ms: # Сохранение профиля медленного запроса
+            os.makedirs(self.profile_dir, exist_ok=True) # Создание каталога профилей
+            path = os.path.join(self.profile_dir, f"{time.strftime('%Y%m%dT%H%M%S')}-{request.method}-{endpoint}-{elapsed * 1000:.0f}ms.prof") # Имя файла профиля
+            profile.dump_stats(path) # Сохранение профиля для просмотра через pstats или snakeviz
+            slowest = sorted(statements, key=lambda item: item[0], reverse=True)[:SLOW_STATEMENTS_LOGGED] # Самые долгие SQL-запросы
+            self.logger.warning(
+                'Slow request %s %s: %.1f ms, %d SQL statements (%.1f ms), profile saved to %s%s',
+                request.method, request.path, elapsed * 1000, len(statements), sql_seconds * 1000, path,
+                ''.join(f'\n  {duration * 1000:8.2f} ms  {" ".join(statement.split())[:200]}' for duration, statement in slowest)
+            ) # Сообщение с самыми долгими SQL-запросами
+        return response # Возвращает ответ
+
+    def stop_profile(self): # Функция остановки профилировщика текущего запроса и освобождения слота профилирования
+        profile = getattr(self.local, 'profile', None) # Профилировщик текущего HTTP-запроса
+        if profile is not None:
+            profile.disable()
+            self.local.profile = None
+            self.profile_lock.release()
+        return profile # Возвращает остановленный профилировщик или None
+
+    def teardown_request(self, exception=None): # Обработчик завершения HTTP-запроса, в том числе с исключением
+        self.stop_profile() # Профилировщик не остается включенным в потоке после исключения
+        self.local.statements = None # SQL-запросы после завершения запроса не относятся к нему
+
+    def render(self, db_stats=None): # Формирование всех метрик в текстовом формате Prometheus
+        lines = [] # Строки метрик
+        for name, value in (db_stats or {}).items(): # Значения счетчиков базы данных
+            if name in DB_COUNTERS: # Растущие счетчики в формате Prometheus имеют суффикс _total
+                lines += [f'# TYPE clinic_db_{name}_total counter', f'clinic_db_{name}_total {value}']
+            else: # Текущие значения
+                lines += [f'# TYPE clinic_db_{name} gauge', f'clinic_db_{name} {value}']
+        for histogram in (self.request_duration, self.request_statements, self.statement_duration): # Гистограммы
+            lines += histogram.render()
+        return '\n'.join(lines) + '\n' # Возвращает текст метрик
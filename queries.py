@@ -0,0 +1,144 @@
+import json # Импорт модуля для сериализации в JSON
+import re # Импорт модуля регулярных выражений
+from datetime import datetime, timedelta # Импорт классов для работы с датой и временем
+from sqlalchemy import select, tuple_, table, column, literal_column # Импорт функций для построения запросов SELECT и условий
+from database_setup import Doctor, Specialization, Patient, Appointment, Service # Импорт моделей
+
+TIME_FORMAT = '%Y-%m-%dT%H:%M' # Формат даты и времени назначения в API
+DATE_FORMAT = '%Y-%m-%d' # Формат даты в API
+MAX_PAGE_SIZE = 1000 # Максимальный размер страницы при постраничной выдаче
+STREAM_CHUNK_SIZE = 500 # Количество строк, извлекаемых из курсора за один раз при потоковой выдаче
+
+def appointment_rows(): # Функция построения запроса-проекции назначений
+    return select( # Выборка только нужных столбцов вместо целых объектов, чтобы избежать ленивых загрузок (N+1)
+        Appointment.id,
+        Doctor.name.label('doctor'),
+        Specialization.name.label('specialization'),
+        Patient.name.label('patient'),
+        Service.name.label('service'),
+        Appointment.appointment_time
+    ).select_from(Appointment).outerjoin( # Все четыре названия получаются одним запросом с соединениями
+        Doctor, Appointment.doctor_id == Doctor.id
+    ).outerjoin(
+        Specialization, Appointment.specialization_id == Specialization.id
+    ).outerjoin(
+        Patient, Appointment.patient_id == Patient.id
+    ).outerjoin(
+        Service, Appointment.service_id == Service.id
+    )
+
+search_index = table('appointment_fts', column('rowid'), column('rank')) # Полнотекстовый индекс назначений (см. database_setup.SEARCH_INDEX_DDL)
+
+def match_expression(query): # Функция преобразования строки поиска в запрос FTS5
+    return ' '.join(f'"{token}"*' for token in re.findall(r'\w+', query)) # Каждое слово ищется по префиксу, все слова должны совпасть
+
+def keyword_search(statement, query, ranked=True): # Функция добавления полнотекстового поиска к запросу-проекции
+    match = match_expression(query) # Построение запроса FTS5
+    if not match: # Если в строке поиска нет слов, фильтр не применяется
+        return statement # Возвращает запрос без изменений
+    statement = statement.join(search_index, search_index.c.rowid == Appointment.id).where(
+        literal_column('appointment_fts').op('MATCH')(match)
+    ) # Поиск по индексу
+    return statement.order_by(search_index.c.rank) if ranked else statement # Сортировка по релевантности (bm25), если нужна
+
+def parse_time_bound(value, end=False): # Функция разбора границы периода: дата или дата и время
+    try:
+        return datetime.strptime(value, TIME_FORMAT) # Граница с точностью до минуты
+    except ValueError: # Если указана только дата
+        pass
+    try:
+        day = datetime.strptime(value, DATE_FORMAT) # Преобразование даты
+    except ValueError: # Обработка исключения, если формат даты и времени неверный
+        raise ValueError("Invalid datetime format") from None
+    return day + timedelta(days=1) if end else day # Дата окончания включает весь день
+
+def parse_id(value): # Функция разбора id из параметра запроса
+    try:
+        return int(value) # Преобразование строки в число
+    except ValueError: # Обработка исключения, если id не является числом
+        raise ValueError("Invalid search parameters") from None
+
+def range_filters(args, appointment_time=Appointment.appointment_time, doctor_id=Appointment.doctor_id, patient_id=Appointment.patient_id, service=Service.name): # Функция построения условий времени, доктора, пациента и услуги по параметрам запроса, столбцы можно заменить (например, для архива)
+    filters = [] # Список условий
+    if args.get('datetime'): # Точное время назначения
+        try:
+            filters.append(appointment_time == datetime.strptime(args['datetime'], TIME_FORMAT))
+        except ValueError: # Обработка исключения, если формат даты и времени неверный
+            raise ValueError("Invalid datetime format") from None
+    if args.get('from'): # Начало периода включительно
+        filters.append(appointment_time >= parse_time_bound(args['from']))
+    if args.get('to'): # Конец периода: дата включительно, дата и время не включительно
+        filters.append(appointment_time < parse_time_bound(args['to'], end=True))
+    if args.get('doctor_id'): # Назначения доктора (индекс doctor_id, appointment_time)
+        filters.append(doctor_id == parse_id(args['doctor_id']))
+    if args.get('patient_id'): # Назначения пациента (индекс patient_id, appointment_time)
+        filters.append(patient_id == parse_id(args['patient_id']))
+    if args.get('service'): # Назначения на услугу по точному названию
+        filters.append(service == args['service'])
+    return filters # Возвращает список условий
+
+def group_by_day(rows): # Функция группировки сериализованных назначений по дню
+    days = {} # Назначения по дням в порядке времени
+    for row in rows: # Перебор назначений
+        days.setdefault(row.appointment_time.strftime(DATE_FORMAT), []).append(serialize_row(row))
+    return days # Возвращает словарь день -> назначения
+
+def serialize_row(row): # Функция преобразования строки проекции в словарь для JSON
+    appointment_id, doctor, specialization, patient, service, appointment_time = row # Распаковка кортежа строки
+    return {
+        'id': appointment_id,
+        'doctor': doctor,
+        'specialization': specialization,
+        'patient': patient,
+        'service': service,
+        'appointment_time': appointment_time.strftime(TIME_FORMAT)
+    } # Возвращает словарь назначения
+
+def ordered(statement): # Функция упорядочивания назначений по ключу постраничной выдачи
+    return statement.order_by(Appointment.appointment_time, Appointment.id) # Сортировка по времени и id
+
+def encode_cursor(row): # Функция формирования курсора из последней строки страницы
+    return f"{row.appointment_time.isoformat()},{row.id}" # Курсор состоит из времени и id назначения
+
+def after_cursor(statement, cursor): # Функция добавления условия keyset-пагинации к запросу
+    time_str, appointment_id = cursor.rsplit(',', 1) # Разбор курсора на время и id, ValueError при неверном формате
+    after_time = datetime.fromisoformat(time_str) # Преобразование строки времени в объект datetime
+    after_id = int(appointment_id) # Преобразование id в число
+    return statement.where(
+        tuple_(Appointment.appointment_time, Appointment.id) > tuple_(after_time, after_id)
+    ) # Сравнение пар (время, id) начинает чтение индекса с позиции курсора, а не с начала таблицы
+
+def parse_limit(limit_str): # Функция проверки размера страницы
+    limit = int(limit_str) # Преобразование строки в число, ValueError при неверном формате
+    if not 1 <= limit <= MAX_PAGE_SIZE: # Проверка, что размер страницы в допустимых пределах
+        raise ValueError(limit_str) # Ошибка при недопустимом размере страницы
+    return limit # Возвращает размер страницы
+
+def search_statement(args): # Функция построения запроса поиска назначений по параметрам запроса
+    filters = range_filters(args) # Условия времени (datetime, from, to), доктора, пациента и услуги, ValueError при неверном формате
+    by_time = bool(filters) or args.get('group') == 'day' # При фильтрах по периоду и участникам и при группировке по дням результаты упорядочены по времени
+    statement = appointment_rows().where(*filters) # Все условия проверяются одним запросом по индексам
+    statement = keyword_search(statement, args.get('query', ''), ranked=not by_time) # Поиск по ключевому слову через полнотекстовый индекс
+    return ordered(statement) if by_time else statement # Без них результаты упорядочены по релевантности
+
+def page_statement(args): # Функция построения запроса страницы назначений, возвращает (запрос, размер страницы)
+    statement = ordered(appointment_rows()) # Построение упорядоченного запроса-проекции назначений
+    limit = None # По умолчанию выдаются все назначения
+    if args.get('after'): # Проверка, если указан курсор предыдущей страницы
+        statement = after_cursor(statement, args['after']) # Выборка назначений после курсора, ValueError при неверном формате
+    if args.get('limit'): # Проверка, если указан размер страницы
+        limit = parse_limit(args['limit']) # Проверка размера страницы
+        statement = statement.limit(limit) # Ограничение количества строк
+    return statement, limit # Возвращает запрос и размер страницы
+
+def stream_json(session, statement): # Генератор потоковой выдачи JSON-массива назначений, закрывающий сессию по завершении
+    try:
+        result = session.execute(statement.execution_options(yield_per=STREAM_CHUNK_SIZE)) # Выполнение запроса с порционным чтением из курсора
+        yield '[' # Начало JSON-массива
+        separator = '' # Разделитель перед первой строкой не нужен
+        for rows in result.partitions(): # Чтение строк порциями, чтобы не держать всю таблицу в памяти
+            yield separator + ','.join(json.dumps(serialize_row(row)) for row in rows) # Выдача порции строк
+            separator = ',' # Последующие порции отделяются запятой
+        yield ']' # Конец JSON-массива
+    finally:
+        session.close() # Генератор выполняется после завершения обработки запроса, поэтому курсор и сессию закрывает он сам, в том числе при обрыве соединения клиентом
@@ -0,0 +1,74 @@
+from collections import OrderedDict # Импорт упорядоченного словаря для реализации LRU-кэша
+from threading import Lock # Импорт блокировки для потокобезопасного доступа к кэшу
+from sqlalchemy import select, event # Импорт функций для построения запросов и системы событий
+from sqlalchemy.dialects.sqlite import insert # Импорт INSERT с поддержкой ON CONFLICT для SQLite
+from database_setup import Base, CacheGeneration, Doctor, Specialization, Service, NAMES_GENERATION_ID # Импорт моделей и строки поколения названий
+
+REFERENCE_CACHE_SIZE = 4096 # Максимальное количество названий в кэше справочников
+CACHED_MODELS = (Doctor, Service, Specialization) # Справочники с небольшим числом строк, которые кэшируются (пациенты не кэшируются)
+
+class LRUCache: # Определение потокобезопасного кэша с вытеснением давно неиспользуемых записей
+    def __init__(self, maxsize): # Инициализация кэша
+        self.maxsize = maxsize # Максимальное количество записей
+        self.data = OrderedDict() # Записи в порядке последнего использования
+        self.lock = Lock() # Блокировка для доступа из нескольких потоков
+
+    def get(self, key): # Получение значения по ключу или None
+        with self.lock:
+            if key not in self.data: # Если запись отсутствует
+                return None
+            self.data.move_to_end(key) # Отметка записи как недавно использованной
+            return self.data[key]
+
+    def set(self, key, value): # Сохранение значения по ключу
+        with self.lock:
+            self.data[key] = value
+            self.data.move_to_end(key) # Отметка записи как недавно использованной
+            if len(self.data) > self.maxsize: # Если кэш переполнен
+                self.data.popitem(last=False) # Вытеснение самой давно использованной записи
+
+    def discard(self, key): # Удаление записи, если она есть
+        with self.lock:
+            self.data.pop(key, None)
+
+    def clear(self): # Очистка кэша
+        with self.lock:
+            self.data.clear()
+
+name_cache = LRUCache(REFERENCE_CACHE_SIZE) # Кэш соответствия (таблица, название) -> (поколение названий, id)
+
+def names_generation(session): # Функция чтения поколения названий справочников один раз за транзакцию сессии
+    known = session.info.get('names_generation') # Поколение, прочитанное ранее в этой сессии
+    if known is not None and known[0] is session.get_transaction(): # Если оно прочитано в текущей транзакции
+        return known[1]
+    generation = session.execute(
+        select(CacheGeneration.generation).where(CacheGeneration.id == NAMES_GENERATION_ID)
+    ).scalar() # Триггеры переименования увеличивают его в любом процессе
+    session.info['names_generation'] = (session.get_transaction(), generation)
+    return generation
+
+def get_or_create(session, model, name): # Функция получения id строки справочника по названию с созданием при отсутствии
+    cached = model in CACHED_MODELS # Проверка, кэшируется ли справочник
+    key = (model.__tablename__, name) # Ключ кэша
+    if cached: # Если справочник кэшируется
+        generation = names_generation(session) # Поколение читается до поиска, поэтому переименование во время поиска делает запись устаревшей
+        entry = name_cache.get(key) # Поиск id в кэше
+        if entry is not None and entry[0] == generation: # Если с момента сохранения записи ничего не переименовано, запрос к базе данных не нужен
+            return entry[1]
+
+    entity_id = session.execute(select(model.id).where(model.name == name)).scalar() # Поиск строки по уникальному индексу названия
+    if entity_id is not None: # Если строка уже существует
+        if cached: # В кэш попадают только уже сохраненные строки, чтобы откат транзакции не оставил неверный id
+            name_cache.set(key, (generation, entity_id))
+        return entity_id
+
+    entity_id = session.execute(
+        insert(model).values(name=name).on_conflict_do_nothing(index_elements=['name']).returning(model.id)
+    ).scalar() # Вставка строки без ошибки, если ее одновременно создал другой запрос
+    if entity_id is None: # Если строку успел создать другой запрос
+        entity_id = session.execute(select(model.id).where(model.name == name)).scalar_one() # Получение id созданной строки
+    return entity_id # Возвращает id строки справочника
+
+@event.listens_for(Base.metadata, 'after_drop') # Очистка кэша при удалении таблиц, так как id становятся недействительными
+def clear_name_cache(target, connection, **kw): # Обработчик события удаления таблиц
+    name_cache.clear()
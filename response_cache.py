@@ -0,0 +1,38 @@
+from functools import wraps # Импорт декоратора для сохранения имени функции представления
+from hashlib import sha1 # Импорт хеш-функции для вычисления ETag
+from flask import Response, request # Импорт классов Flask
+from sqlalchemy import select, event # Импорт функций для построения запросов и системы событий
+from database_setup import Base, CacheGeneration # Импорт моделей
+from reference_data import LRUCache # Импорт LRU-кэша
+
+RESPONSE_CACHE_SIZE = 256 # Максимальное количество закэшированных ответов
+MAX_CACHED_BODY = 4 * 1024 * 1024 # Ответы большего размера не кэшируются
+
+class ResponseCache: # Определение кэша ответов GET-запросов, действительных до следующего изменения данных
+    def __init__(self, session_factory, maxsize=RESPONSE_CACHE_SIZE): # Инициализация кэша
+        self.session_factory = session_factory # Источник сессии запроса для чтения номера поколения
+        self.entries = LRUCache(maxsize) # Ответы по ключу (путь, параметры запроса)
+        event.listen(Base.metadata, 'after_drop', lambda *args, **kw: self.entries.clear()) # Очистка при удалении таблиц, так как поколение начинается заново
+
+    def generation(self): # Получение текущего номера поколения данных
+        return self.session_factory().execute(select(CacheGeneration.generation).where(CacheGeneration.id == 1)).scalar() # Чтение одной строки по первичному ключу
+
+    def cached(self, view): # Декоратор, кэширующий успешные ответы функции представления
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            key = (request.path, tuple(sorted(request.args.items(multi=True)))) # Ключ не зависит от порядка параметров
+            generation = self.generation() # Поколение читается до выполнения запроса, чтобы изменение во время него не закэшировало устаревший ответ
+            entry = self.entries.get(key) # Поиск ответа в кэше
+            if entry is not None and entry[0] == generation: # Если данные не изменились с момента сохранения ответа
+                response = Response(entry[1], headers=entry[2]) # Ответ из кэша без запроса к таблицам назначений
+                return response.make_conditional(request) # 304 Not Modified, если у клиента та же версия (If-None-Match)
+
+            response = view(*args, **kwargs) # Выполнение функции представления
+            if isinstance(response, tuple) or response.status_code != 200 or response.is_streamed: # Ошибки и потоковые ответы не кэшируются
+                return response
+            body = response.get_data() # Тело ответа
+            response.set_etag(sha1(body).hexdigest()) # ETag по содержимому одинаков во всех процессах
+            if len(body) <= MAX_CACHED_BODY: # Сохранение ответа, если он не слишком большой
+                self.entries.set(key, (generation, body, list(response.headers.items())))
+            return response.make_conditional(request) # 304 Not Modified, если у клиента та же версия (If-None-Match)
+        return wrapper # Возвращает обернутую функцию представления
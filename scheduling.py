@@ -0,0 +1,105 @@
+from bisect import bisect_left, bisect_right # Импорт двоичного поиска по отсортированным спискам
+from datetime import datetime, time, timedelta # Импорт классов для работы с датой и временем
+from sqlalchemy import select, and_, func # Импорт функций для построения запросов
+from sqlalchemy.orm import aliased # Импорт функции для создания псевдонимов моделей
+from database_setup import Appointment, Service # Импорт моделей
+from queries import DATE_FORMAT # Импорт формата даты в API
+
+WORKDAY_START = time(9, 0) # Начало рабочего дня
+WORKDAY_END = time(18, 0) # Конец рабочего дня
+DEFAULT_DURATION_MINUTES = 30 # Длительность назначения без услуги
+MAX_DURATION_MINUTES = 480 # Максимальная длительность услуги, ограничивает просмотр индекса назад по времени
+MAX_AVAILABILITY_DAYS = 62 # Максимальная длина периода запроса свободного времени в днях
+SQL_TIME_FORMAT = '%Y-%m-%d %H:%M:%S' # Формат времени, к которому приводятся обе стороны сравнения в SQLite
+
+booked = aliased(Appointment, name='booked') # Проверяемые назначения в запросе пересечений
+other = aliased(Appointment, name='other') # Другие назначения того же доктора в запросе пересечений
+booked_service = aliased(Service, name='booked_service') # Услуга проверяемого назначения
+other_service = aliased(Service, name='other_service') # Услуга другого назначения
+
+class DoctorSchedule: # Определение расписания доктора как отсортированного набора непересекающихся занятых интервалов
+    def __init__(self, intervals): # Инициализация по списку интервалов (начало, конец)
+        self.starts, self.ends = [], [] # Начала и концы интервалов, оба списка отсортированы
+        for start, end in sorted(intervals): # Перебор интервалов по времени начала
+            if self.ends and start < self.ends[-1]: # Если интервал пересекается с предыдущим
+                self.ends[-1] = max(self.ends[-1], end) # Объединение интервалов
+            else:
+                self.starts.append(start)
+                self.ends.append(end)
+
+    def conflicts(self, start, end): # Проверка пересечения интервала с занятыми за O(log n)
+        index = bisect_right(self.ends, start) # Первый занятый интервал, который заканчивается после start
+        return index < len(self.starts) and self.starts[index] < end # Пересечение, если он начинается раньше end
+
+    def free_slots(self, window_start, window_end, minutes): # Свободные промежутки окна длительностью не меньше minutes
+        duration = timedelta(minutes=minutes) # Минимальная длительность свободного промежутка
+        slots = [] # Список свободных промежутков
+        cursor = window_start # Начало текущего свободного промежутка
+        index = bisect_right(self.ends, window_start) # Первый занятый интервал, влияющий на окно
+        end_index = bisect_left(self.starts, window_end) # Первый занятый интервал после окна
+        for busy_start, busy_end in zip(self.starts[index:end_index], self.ends[index:end_index]): # Перебор занятых интервалов внутри окна
+            if busy_start - cursor >= duration: # Если до занятого интервала помещается назначение
+                slots.append((cursor, busy_start))
+            cursor = max(cursor, busy_end) # Свободный промежуток продолжается после занятого интервала
+        if window_end - cursor >= duration: # Свободный промежуток до конца окна
+            slots.append((cursor, window_end))
+        return slots # Возвращает список свободных промежутков
+
+def duration_of(service): # Выражение длительности услуги с учетом назначений без услуги
+    return func.coalesce(service.duration_minutes, DEFAULT_DURATION_MINUTES)
+
+def end_of(appointment, service): # Выражение времени окончания назначения в SQLite
+    return func.strftime(SQL_TIME_FORMAT, appointment.appointment_time, func.printf('+%d minutes', duration_of(service)))
+
+def load_schedule(session, doctor_id, start, end): # Функция загрузки занятых интервалов доктора за период одним запросом
+    rows = session.execute(
+        select(Appointment.appointment_time, duration_of(Service)).outerjoin(
+            Service, Appointment.service_id == Service.id
+        ).where(
+            Appointment.doctor_id == doctor_id,
+            Appointment.appointment_time >= start - timedelta(minutes=MAX_DURATION_MINUTES), # Назначения, начавшиеся до периода, но еще идущие
+            Appointment.appointment_time < end
+        )
+    ) # Выборка по составному индексу (doctor_id, appointment_time)
+    return DoctorSchedule((begin, begin + timedelta(minutes=minutes)) for begin, minutes in rows) # Возвращает расписание доктора
+
+def parse_availability_args(args): # Функция разбора параметров запроса свободного времени, возвращает (первый день, последний день, длительность)
+    first_day = datetime.strptime(args.get('from', ''), DATE_FORMAT).date() # Первый день периода
+    last_day = datetime.strptime(args.get('to', args.get('from', '')), DATE_FORMAT).date() # Последний день периода (по умолчанию один день)
+    minutes = int(args.get('duration', DEFAULT_DURATION_MINUTES)) # Нужная длительность свободного промежутка
+    if not 0 <= (last_day - first_day).days < MAX_AVAILABILITY_DAYS or minutes < 1: # Проверка периода и длительности
+        raise ValueError(args)
+    return first_day, last_day, minutes # Возвращает проверенные параметры
+
+def availability(session, doctor_id, first_day, last_day, minutes): # Функция вычисления свободного времени доктора по рабочим дням
+    schedule = load_schedule(
+        session, doctor_id,
+        datetime.combine(first_day, WORKDAY_START),
+        datetime.combine(last_day, WORKDAY_END)
+    ) # Загрузка расписания за весь период одним запросом
+    slots = [] # Список свободных промежутков
+    day = first_day # Текущий день
+    while day <= last_day: # Перебор дней периода
+        slots.extend(schedule.free_slots(datetime.combine(day, WORKDAY_START), datetime.combine(day, WORKDAY_END), minutes))
+        day += timedelta(days=1)
+    return slots # Возвращает свободные промежутки всех дней
+
+def conflicting_appointments(*criteria): # Функция построения запроса пар пересекающихся назначений одного доктора, criteria задаются для booked
+    return select(booked.id, other.id).select_from(booked).outerjoin(
+        booked_service, booked.service_id == booked_service.id
+    ).join(other, and_(
+        other.doctor_id == booked.doctor_id,
+        other.id != booked.id,
+        other.appointment_time < end_of(booked, booked_service), # Другое назначение начинается до окончания проверяемого
+        other.appointment_time >= func.strftime(
+            SQL_TIME_FORMAT, booked.appointment_time, f'-{MAX_DURATION_MINUTES} minutes'
+        ) # Ограничение диапазона поиска по индексу (doctor_id, appointment_time)
+    )).outerjoin(
+        other_service, other.service_id == other_service.id
+    ).where(
+        end_of(other, other_service) > func.strftime(SQL_TIME_FORMAT, booked.appointment_time), # Другое назначение заканчивается после начала проверяемого
+        *criteria
+    ) # Возвращает запрос пар (проверяемое, пересекающееся)
+
+def has_conflict(session, appointment_id): # Функция проверки, пересекается ли сохраненное назначение с другими назначениями доктора
+    return session.execute(conflicting_appointments(booked.id == appointment_id).limit(1)).first() is not None # Поиск хотя бы одного пересечения
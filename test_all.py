@@ -1,9 +1,23 @@
+import cProfile # Импорт профилировщика Python
+import io # Импорт модуля для работы с потоками байтов
+import json # Импорт модуля для разбора JSON
+import os # Импорт модуля для работы с переменными окружения
+import pstats # Импорт модуля для чтения профилей cProfile
+import threading # Импорт модуля для работы с потоками
+import tracemalloc # Импорт модуля для отслеживания выделения памяти
 import pytest # Импорт библиотеки pytest для написания и выполнения тестов
-from sqlalchemy import create_engine # Импорт класса для создания движка базы данных
+from sqlalchemy import create_engine, event, select, text, inspect # Импорт классов для создания движка базы данных, системы событий и запросов
 from sqlalchemy.orm import sessionmaker # Импорт класса для создания сессий
 from datetime import datetime # Импорт класса для работы с датами и временем
-from database_setup import Base, Doctor, Specialization, Patient, Appointment, Service, create_all, drop_all, get_engine # Импорт моделей и вспомогательных функций
-from app import app, engine # Импорт приложения Flask и движка базы данных
+os.environ.setdefault("DATABASE_URL", "sqlite://") # Тесты используют базу данных в памяти
+from database_setup import Base, Doctor, Specialization, Patient, Appointment, Service, create_all, drop_all, get_engine, migrate, SCHEMA_VERSION # Импорт моделей и вспомогательных функций
+from queries import appointment_rows, ordered, after_cursor # Импорт общей проекции назначений
+from scheduling import DoctorSchedule, conflicting_appointments # Импорт расписания доктора и запроса пересечений
+from benchmark import seed, benchmark_endpoints, compare_to_baseline # Импорт генератора данных и измерений производительности
+from profiling import Histogram # Импорт гистограммы метрик
+from bulk_import import import_records, read_csv # Импорт загрузки записей и чтения CSV
+from archive import Archive, archive_metadata, archive_appointments, purge_archive # Импорт архива старых назначений
+from app import app, engine, db_stats, DBSession, response_cache, profiler # Импорт приложения Flask, движка базы данных, сессий запросов, их счетчиков, кэша ответов и метрик
 
 @pytest.fixture(scope="function", autouse=True) # Определение фикстуры для настройки и очистки окружения перед и после каждого теста
 def setup_and_teardown(): # Функция настройки и очистки окружения
@@ -27,6 +41,15 @@ def test_client(): # Функция создания клиента тестир
         with app.app_context(): # Установка контекста приложения
             yield client # Передача управления тесту
 
+@pytest.fixture(scope="function") # Определение фикстуры для подсчета SQL-запросов
+def statement_counter(): # Функция подсчета SQL-запросов, выполненных движком
+    statements = [] # Список текстов выполненных запросов
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany): # Обработчик события выполнения запроса
+        statements.append(statement) # Сохранение текста запроса
+    event.listen(engine, 'before_cursor_execute', before_cursor_execute) # Подписка на событие выполнения запросов
+    yield statements # Передача списка запросов тесту
+    event.remove(engine, 'before_cursor_execute', before_cursor_execute) # Отписка от события после теста
+
 class TestDatabase: # Определение класса для тестирования базы данных
     def test_create_doctor(self, db_session): # Тест для создания нового доктора
         new_doctor = Doctor(name="Dr. Smith") # Создание новой записи о докторе
@@ -141,6 +164,19 @@ class TestApp: # Определение класса для тестирован
         assert response.status_code == 200 # Проверка, что статус ответа 200 (OK)
         assert response.json["message"] == "Appointment updated successfully" # Проверка, что ответ содержит ожидаемое сообщение
 
+    def test_update_appointment_to_existing_doctor_and_bad_payload(self, test_client, db_session): # Тест, что PUT переводит назначение к существующему доктору и отвечает 400 на неверные данные
+        booking = {"doctor_name": "Dr. Smith", "specialization_name": "Dentistry", "patient_name": "John Doe", "appointment_time": "2025-02-15T10:00", "service": "Cleaning"} # Данные назначения
+        first_id = test_client.post("/appointments", json=booking).json["id"] # Первое назначение
+        test_client.post("/appointments", json={**booking, "doctor_name": "Dr. Brown", "appointment_time": "2025-02-15T11:00"}) # Назначение другого доктора
+        response = test_client.put(f"/appointments/{first_id}", json={**booking, "doctor_name": "Dr. Brown"}) # Перевод назначения к доктору "Dr. Brown"
+        assert response.status_code == 200 # Проверка, что статус ответа 200 (OK)
+        assert [a["doctor"] for a in test_client.get("/appointments").json] == ["Dr. Brown", "Dr. Brown"] # Проверка, что назначение перенаправлено на существующего доктора
+        assert sorted(doctor.name for doctor in db_session.query(Doctor)) == ["Dr. Brown", "Dr. Smith"] # Проверка, что доктор "Dr. Smith" не переименован
+
+        for payload in ({**booking, "appointment_time": 5}, {**booking, "patient_name": ["John"]}, {"doctor_name": "Dr. Smith"}, [booking]): # Неверные данные запроса
+            assert test_client.put(f"/appointments/{first_id}", json=payload).status_code == 400 # Проверка, что статус ответа 400 (Bad Request)
+        assert test_client.put(f"/appointments/{first_id}", json={**booking, "appointment_time": "15.02.2025"}).json == {"error": "Invalid datetime format"} # Проверка ошибки формата времени
+
     def test_delete_appointment(self, test_client): # Тест для удаления существующего назначения через API
         response = test_client.post("/appointments", json={ # Выполнение POST-запроса для создания нового назначения
             "doctor_name": "Dr. Smith",
@@ -157,6 +193,108 @@ class TestApp: # Определение класса для тестирован
         response = test_client.get("/appointments") # Выполнение GET-запроса для получения списка назначений
         assert len(response.json) == 0 # Проверка, что список назначений пуст
 
+    def test_get_appointments_paginated(self, test_client): # Тест для постраничного получения списка назначений через API
+        for hour in (12, 10, 11): # Создание назначений не по порядку времени
+            response = test_client.post("/appointments", json={
+                "doctor_name": "Dr. Smith",
+                "specialization_name": "Dentistry",
+                "patient_name": "John Doe",
+                "appointment_time": f"2025-02-15T{hour}:00",
+                "service": "Cleaning"
+            })
+            assert response.status_code == 201 # Проверка, что статус ответа 201 (Created)
+
+        response = test_client.get("/appointments?limit=2") # Выполнение GET-запроса для первой страницы
+        assert response.status_code == 200 # Проверка, что статус ответа 200 (OK)
+        assert [a["appointment_time"] for a in response.json] == ["2025-02-15T10:00", "2025-02-15T11:00"] # Проверка порядка по времени
+        cursor = response.headers["X-Next-Cursor"] # Получение курсора следующей страницы
+
+        response = test_client.get("/appointments", query_string={"limit": 2, "after": cursor}) # Выполнение GET-запроса для следующей страницы
+        assert response.status_code == 200 # Проверка, что статус ответа 200 (OK)
+        assert [a["appointment_time"] for a in response.json] == ["2025-02-15T12:00"] # Проверка, что получено оставшееся назначение
+        assert "X-Next-Cursor" not in response.headers # Проверка, что следующей страницы нет
+
+    def test_get_appointments_invalid_pagination(self, test_client): # Тест для проверки обработки неверных параметров постраничной выдачи
+        for query_string in ({"limit": "0"}, {"limit": "abc"}, {"after": "invalid"}): # Перебор неверных параметров
+            response = test_client.get("/appointments", query_string=query_string) # Выполнение GET-запроса с неверными параметрами
+            assert response.status_code == 400 # Проверка, что статус ответа 400 (Bad Request)
+            assert response.json == {"error": "Invalid pagination parameters"} # Проверка, что ответ содержит ожидаемое сообщение об ошибке
+
+    def test_get_appointments_streamed(self, test_client): # Тест для потоковой выдачи списка назначений через API
+        for hour in (10, 11): # Создание двух назначений
+            response = test_client.post("/appointments", json={
+                "doctor_name": "Dr. Smith",
+                "specialization_name": "Dentistry",
+                "patient_name": "John Doe",
+                "appointment_time": f"2025-02-15T{hour}:00",
+                "service": "Cleaning"
+            })
+            assert response.status_code == 201 # Проверка, что статус ответа 201 (Created)
+
+        response = test_client.get("/appointments?stream=1") # Выполнение GET-запроса с потоковой выдачей
+        assert response.status_code == 200 # Проверка, что статус ответа 200 (OK)
+        appointments = json.loads(response.get_data(as_text=True)) # Разбор собранного потокового ответа
+        assert len(appointments) == 2 # Проверка, что получены оба назначения
+        assert appointments[0]["doctor"] == "Dr. Smith" # Проверка, что имя доктора совпадает с ожидаемым
+
+        response = test_client.get("/appointments?stream=1&after=2025-02-15T11:00:00,999") # Выполнение потокового GET-запроса без результатов
+        assert json.loads(response.get_data(as_text=True)) == [] # Проверка, что пустой поток является корректным JSON-массивом
+
+    def test_bulk_import_json_lines(self, test_client): # Тест для массовой загрузки назначений в формате JSON Lines через API
+        lines = [json.dumps({
+            "doctor_name": f"Dr. Smith {i % 2}",
+            "specialization_name": "Dentistry",
+            "patient_name": f"John Doe {i}",
+            "appointment_time": f"2025-02-15T{10 + i}:00",
+            "service": "Cleaning"
+        }) for i in range(5)] # Формирование пяти верных записей
+        lines.insert(2, json.dumps({"doctor_name": "Dr. Smith 0", "appointment_time": "2025-02-15T09:00"})) # Запись без обязательных полей
+        lines.insert(4, "not json") # Строка, которая не является JSON
+        response = test_client.post("/appointments/bulk?chunk_size=2", data="\n".join(lines), content_type="application/x-ndjson") # Выполнение POST-запроса с потоком записей
+        assert response.status_code == 200 # Проверка, что статус ответа 200 (OK)
+        assert response.json["inserted"] == 5 # Проверка, что все верные записи загружены
+        assert response.json["failed"] == 2 # Проверка, что неверные записи не прервали загрузку
+        assert [error["row"] for error in response.json["errors"]] == [3, 5] # Проверка номеров неверных записей
+        assert "rows_per_second" in response.json # Проверка, что отчет содержит пропускную способность
+        appointments = test_client.get("/appointments").json # Получение списка назначений
+        assert len(appointments) == 5 # Проверка, что назначения сохранены
+        assert {a["doctor"] for a in appointments} == {"Dr. Smith 0", "Dr. Smith 1"} # Проверка, что названия разрешены в строки справочников
+
+    def test_bulk_import_csv(self, test_client): # Тест для массовой загрузки назначений в формате CSV через API
+        data = (
+            "doctor_name,specialization_name,patient_name,appointment_time,service\n"
+            "Dr. Smith,Dentistry,John Doe,2025-02-15T10:00,Cleaning\n"
+            "Dr. Smith,Dentistry,Jane Doe,invalid-datetime,Cleaning\n"
+        ) # Формирование CSV с одной верной и одной неверной записью
+        response = test_client.post("/appointments/bulk", data=data, content_type="text/csv") # Выполнение POST-запроса с CSV
+        assert response.status_code == 200 # Проверка, что статус ответа 200 (OK)
+        assert response.json["inserted"] == 1 # Проверка, что верная запись загружена
+        assert response.json["errors"] == [{"row": 2, "error": "Invalid datetime format"}] # Проверка, что ошибка неверной записи указана
+        assert test_client.get("/search?query=Smith").json[0]["patient"] == "John Doe" # Проверка, что загруженное назначение попало в поисковый индекс
+
+    def test_bulk_import_rejects_bad_names_per_row(self, test_client): # Тест, что названия не строкой и байты не в UTF-8 отклоняются только в своей строке
+        booking = {"doctor_name": "Dr. Smith", "specialization_name": "Dentistry", "patient_name": "John Doe", "appointment_time": "2025-02-15T10:00", "service": "Cleaning"} # Данные назначения
+        lines = [json.dumps(booking), json.dumps({**booking, "patient_name": ["Jane Doe"]})] # Верная запись и запись с именем списком
+        response = test_client.post("/appointments/bulk", data="\n".join(lines), content_type="application/x-ndjson") # Выполнение POST-запроса с потоком записей
+        assert response.status_code == 200 # Проверка, что статус ответа 200 (OK)
+        assert response.json["inserted"] == 1 and response.json["errors"] == [{"row": 2, "error": "Invalid value for patient_name"}] # Проверка, что неверная запись не прервала загрузку
+
+        data = (
+            b"doctor_name,specialization_name,patient_name,appointment_time,service\n"
+            b"Dr. Smith,Dentistry,J\xe9r\xf4me,2025-02-15T11:00,Cleaning\n"
+            b"Dr. Smith,Dentistry,Jane Doe,2025-02-15T12:00,Cleaning\n"
+        ) # CSV, в котором одна строка в Latin-1
+        response = test_client.post("/appointments/bulk", data=data, content_type="text/csv") # Выполнение POST-запроса с CSV
+        assert response.status_code == 200 # Проверка, что статус ответа 200 (OK)
+        assert response.json["inserted"] == 1 and response.json["errors"] == [{"row": 1, "error": "Invalid UTF-8 in patient_name"}] # Проверка, что отклонена только строка не в UTF-8
+
+        report = import_records(engine, read_csv(io.TextIOWrapper(io.BytesIO(data), encoding="utf-8", newline=""))) # Поток со строгим декодированием
+        assert report["inserted"] == 0 and report["errors"][0]["error"].startswith("Invalid record:") # Проверка, что ошибка декодирования попала в отчет
+
+    def test_bulk_import_unsupported_content_type(self, test_client): # Тест для проверки обработки неподдерживаемого формата
+        response = test_client.post("/appointments/bulk", data="<xml/>", content_type="application/xml") # Выполнение POST-запроса с XML
+        assert response.status_code == 415 # Проверка, что статус ответа 415 (Unsupported Media Type)
+
     def test_search_appointments_by_query(self, test_client): # Тест для поиска назначений по ключевому слову через API
         response = test_client.post("/appointments", json={ # Выполнение POST-запроса для создания нового назначения
             "doctor_name": "Dr. Smith",
@@ -171,6 +309,43 @@ class TestApp: # Определение класса для тестирован
         assert len(response.json) == 1 # Проверка, что найдено одно назначение
         assert response.json[0]["doctor"] == "Dr. Smith" # Проверка, что имя доктора в найденном назначении совпадает с ожидаемым
 
+    def test_search_appointments_by_prefix(self, test_client): # Тест для поиска назначений по началу слова через API
+        response = test_client.post("/appointments", json={ # Выполнение POST-запроса для создания нового назначения
+            "doctor_name": "Др. Иванов",
+            "specialization_name": "Dentistry",
+            "patient_name": "John Doe",
+            "appointment_time": "2025-02-15T10:00",
+            "service": "Cleaning"
+        })
+        assert response.status_code == 201 # Проверка, что статус ответа 201 (Created)
+        response = test_client.get("/search?query=иван") # Выполнение GET-запроса для поиска по началу фамилии без учета регистра
+        assert len(response.json) == 1 # Проверка, что найдено одно назначение
+        response = test_client.get("/search?query=john clean") # Выполнение GET-запроса для поиска по нескольким словам
+        assert len(response.json) == 1 # Проверка, что найдено одно назначение
+        response = test_client.get("/search?query=john braces") # Выполнение GET-запроса, где совпадает только одно слово
+        assert len(response.json) == 0 # Проверка, что назначения не найдены
+
+    def test_search_index_follows_updates(self, test_client): # Тест синхронизации поискового индекса при изменении и удалении назначений
+        response = test_client.post("/appointments", json={ # Выполнение POST-запроса для создания нового назначения
+            "doctor_name": "Dr. Smith",
+            "specialization_name": "Dentistry",
+            "patient_name": "John Doe",
+            "appointment_time": "2025-02-15T10:00",
+            "service": "Cleaning"
+        })
+        appointment_id = response.json["id"] # Получение id нового назначения
+        test_client.put(f"/appointments/{appointment_id}", json={ # Выполнение PUT-запроса для обновления назначения
+            "doctor_name": "Dr. Brown",
+            "specialization_name": "Orthodontics",
+            "patient_name": "Jane Doe",
+            "appointment_time": "2025-02-15T11:00",
+            "service": "Braces"
+        })
+        assert len(test_client.get("/search?query=Smith").json) == 0 # Проверка, что старое имя доктора больше не находится
+        assert len(test_client.get("/search?query=Brown").json) == 1 # Проверка, что новое имя доктора находится
+        test_client.delete(f"/appointments/{appointment_id}") # Выполнение DELETE-запроса для удаления назначения
+        assert len(test_client.get("/search?query=Brown").json) == 0 # Проверка, что удаленное назначение не находится
+
     def test_search_appointments_by_datetime(self, test_client): # Тест для поиска назначений по дате и времени через API
         response = test_client.post("/appointments", json={ # Выполнение POST-запроса для создания нового назначения
             "doctor_name": "Dr. Smith",
@@ -185,7 +360,684 @@ class TestApp: # Определение класса для тестирован
         assert len(response.json) == 1 # Проверка, что найдено одно назначение
         assert response.json[0]["appointment_time"] == "2025-02-15T10:00" # Проверка, что время назначения в найденном назначении совпадает с ожидаемым
 
+    def test_search_appointments_by_range(self, test_client): # Тест для поиска назначений доктора за период через API
+        for doctor_name, appointment_time in (("Dr. Smith", "2025-02-15T12:00"), ("Dr. Smith", "2025-02-15T09:00"),
+                                              ("Dr. Brown", "2025-02-15T10:00"), ("Dr. Smith", "2025-02-16T10:00"),
+                                              ("Dr. Smith", "2025-02-14T10:00")): # Назначения в разные дни и к разным докторам
+            response = test_client.post("/appointments", json={
+                "doctor_name": doctor_name,
+                "specialization_name": "Dentistry",
+                "patient_name": "John Doe",
+                "appointment_time": appointment_time,
+                "service": "Cleaning"
+            })
+            assert response.status_code == 201 # Проверка, что статус ответа 201 (Created)
+
+        response = test_client.get("/search?from=2025-02-15&to=2025-02-15&doctor_id=1") # Выполнение GET-запроса дневного расписания доктора
+        assert response.status_code == 200 # Проверка, что статус ответа 200 (OK)
+        assert [a["appointment_time"] for a in response.json] == ["2025-02-15T09:00", "2025-02-15T12:00"] # Проверка фильтра и порядка по времени
+
+        response = test_client.get("/search?from=2025-02-15T10:00&to=2025-02-16T10:00&service=Cleaning&group=day") # Выполнение GET-запроса с группировкой по дням
+        assert response.json == {"2025-02-15": [
+            test_client.get("/search?datetime=2025-02-15T10:00").json[0],
+            test_client.get("/search?datetime=2025-02-15T12:00").json[0]
+        ]} # Проверка, что конец периода с временем не включается и назначения сгруппированы по дню
+
+        response = test_client.get("/search?query=Smith&patient_id=1&from=2025-02-16") # Выполнение GET-запроса с ключевым словом и периодом
+        assert [a["appointment_time"] for a in response.json] == ["2025-02-16T10:00"] # Проверка, что условия объединяются
+
+        response = test_client.get("/search?query=Smith&group=day") # Выполнение GET-запроса только с ключевым словом и группировкой по дням
+        assert [[a["appointment_time"] for a in day] for day in response.json.values()] == [
+            ["2025-02-14T10:00"], ["2025-02-15T09:00", "2025-02-15T12:00"], ["2025-02-16T10:00"]
+        ] # Проверка, что дни и назначения внутри дня упорядочены по времени, а не по релевантности
+
+        response = test_client.get("/search?doctor_id=abc") # Выполнение GET-запроса с неверным id
+        assert response.status_code == 400 # Проверка, что статус ответа 400 (Bad Request)
+        assert response.json == {"error": "Invalid search parameters"} # Проверка, что ответ содержит ожидаемое сообщение об ошибке
+
     def test_invalid_datetime_format(self, test_client): # Тест для проверки обработки неверного формата даты и времени через API
         response = test_client.get("/search?datetime=invalid-datetime") # Выполнение GET-запроса с неверным форматом даты и времени
         assert response.status_code == 400 # Проверка, что статус ответа 400 (Bad Request)
-        assert response.json == {"error": "Invalid datetime format"} # Проверка, что ответ содержит ожидаемое сообщение об ошибке
\ No newline at end of file
+        assert response.json == {"error": "Invalid datetime format"} # Проверка, что ответ содержит ожидаемое сообщение об ошибке
+
+class TestPerformance: # Определение класса для тестирования производительности запросов
+    def create_appointments(self, test_client, count, hour=10): # Вспомогательная функция для создания нескольких назначений
+        for i in range(count): # Создание назначений с разными докторами, пациентами и услугами
+            response = test_client.post("/appointments", json={
+                "doctor_name": f"Dr. Smith {i}",
+                "specialization_name": f"Dentistry {i}",
+                "patient_name": f"John Doe {i}",
+                "appointment_time": f"2025-02-{i % 28 + 1:02d}T{hour}:00",
+                "service": f"Cleaning {i}"
+            })
+            assert response.status_code == 201 # Проверка, что статус ответа 201 (Created)
+
+    def test_create_appointment_reuses_reference_rows(self, test_client, statement_counter, db_session): # Тест, что повторная запись использует кэш справочников
+        self.create_appointments(test_client, 1, hour=10) # Создание первого назначения со вставкой строк справочников
+        self.create_appointments(test_client, 1, hour=11) # Создание второго назначения, при котором строки справочников попадают в кэш
+        statement_counter.clear() # Сброс счетчика запросов
+        self.create_appointments(test_client, 1, hour=12) # Создание назначения с теми же доктором, услугой и специализацией
+        assert len(statement_counter) == 4 # Проверка, что выполнены только чтение поколения названий, поиск пациента, вставка и проверка пересечений
+        assert db_session.query(Doctor).count() == 1 # Проверка, что дубликат доктора не создан
+        assert len(test_client.get("/appointments").json) == 3 # Проверка, что созданы все три назначения
+
+    def test_update_keeps_reference_rows(self, test_client, db_session): # Тест, что обновление назначения не переименовывает общие строки справочников
+        self.create_appointments(test_client, 1) # Создание назначения с доктором "Dr. Smith 0"
+        test_client.put("/appointments/1", json={ # Перевод назначения к новому доктору
+            "doctor_name": "Dr. Brown",
+            "specialization_name": "Dentistry 0",
+            "patient_name": "John Doe 0",
+            "appointment_time": "2025-02-01T10:00",
+            "service": "Cleaning 0"
+        })
+        self.create_appointments(test_client, 1, hour=11) # Повторная запись к доктору "Dr. Smith 0"
+        doctors = sorted(a["doctor"] for a in test_client.get("/appointments").json) # Получение имен докторов всех назначений
+        assert doctors == ["Dr. Brown", "Dr. Smith 0"] # Проверка, что каждое назначение у своего доктора
+        assert db_session.query(Doctor).count() == 2 # Проверка, что повторная запись использовала прежнюю строку доктора
+
+    def test_reference_cache_checked_after_rename_elsewhere(self, test_client, db_session): # Тест, что переименование в другом процессе делает кэш устаревшим
+        self.create_appointments(test_client, 1, hour=10) # Создание назначения с доктором "Dr. Smith 0"
+        self.create_appointments(test_client, 1, hour=11) # Повторная запись, при которой доктор попадает в кэш
+        with engine.begin() as connection: # Переименование мимо этого процесса, без очистки его кэша
+            connection.execute(text("UPDATE doctor SET name = 'Dr. Brown' WHERE name = 'Dr. Smith 0'"))
+        self.create_appointments(test_client, 1, hour=12) # Запись к доктору "Dr. Smith 0" после переименования
+        doctors = sorted(a["doctor"] for a in test_client.get("/appointments").json) # Получение имен докторов всех назначений
+        assert doctors == ["Dr. Brown", "Dr. Brown", "Dr. Smith 0"] # Проверка, что создан новый доктор, а не использован переименованный
+
+    def test_create_appointment_invalid_payload(self, test_client): # Тест для проверки обработки неполных данных при создании назначения
+        response = test_client.post("/appointments", json={"doctor_name": "Dr. Smith"}) # Выполнение POST-запроса без обязательных полей
+        assert response.status_code == 400 # Проверка, что статус ответа 400 (Bad Request)
+        assert response.json == {"error": "Missing required fields"} # Проверка, что ответ содержит ожидаемое сообщение об ошибке
+
+    def test_create_appointment_wrong_types(self, test_client): # Тест, что поля неверного типа и тело не-объект отклоняются с ошибкой 400
+        booking = {"doctor_name": "Dr. Smith", "specialization_name": "Dentistry", "patient_name": "John Doe", "appointment_time": "2025-02-15T10:00", "service": "Cleaning"} # Данные назначения
+        response = test_client.post("/appointments", json={**booking, "appointment_time": 5}) # Время числом
+        assert response.status_code == 400 and response.json == {"error": "Invalid value for appointment_time"} # Проверка сообщения об ошибке
+        assert test_client.post("/appointments", json={**booking, "doctor_name": ["Dr. Smith"]}).status_code == 400 # Имя списком
+        for body in ("null", "[1, 2]", "not json"): # Тело не является JSON-объектом
+            response = test_client.post("/appointments", data=body, content_type="application/json") # Выполнение POST-запроса
+            assert response.status_code == 400 and response.json == {"error": "Invalid JSON body"} # Проверка сообщения об ошибке
+        assert test_client.get("/appointments").json == [] # Проверка, что ничего не создано
+
+    def test_get_appointments_single_query(self, test_client, statement_counter): # Тест, что список назначений загружается одним запросом
+        self.create_appointments(test_client, 25) # Создание 25 назначений
+        statement_counter.clear() # Сброс счетчика запросов
+        response = test_client.get("/appointments") # Выполнение GET-запроса для получения списка назначений
+        assert response.status_code == 200 # Проверка, что статус ответа 200 (OK)
+        assert len(response.json) == 25 # Проверка, что получены все назначения
+        assert len([s for s in statement_counter if "cache_generation" not in s]) == 1 # Проверка, что выполнен ровно один SQL-запрос к назначениям
+
+    def test_search_single_query(self, test_client, statement_counter): # Тест, что поиск выполняется одним запросом
+        self.create_appointments(test_client, 25) # Создание 25 назначений
+        statement_counter.clear() # Сброс счетчика запросов
+        response = test_client.get("/search?query=Smith") # Выполнение GET-запроса для поиска назначений по ключевому слову
+        assert response.status_code == 200 # Проверка, что статус ответа 200 (OK)
+        assert len(response.json) == 25 # Проверка, что найдены все назначения
+        assert response.json[0]["service"].startswith("Cleaning") # Проверка, что название услуги сериализовано
+        assert len([s for s in statement_counter if "cache_generation" not in s]) == 1 # Проверка, что выполнен ровно один SQL-запрос к назначениям
+
+def query_plan(statement): # Функция получения плана выполнения запроса через EXPLAIN QUERY PLAN
+    compiled = statement.compile(engine) # Компиляция запроса для диалекта SQLite
+    parameters = tuple(None for _ in compiled.positiontup) # План не зависит от значений параметров
+    with engine.connect() as connection: # Открытие соединения
+        rows = connection.exec_driver_sql(f"EXPLAIN QUERY PLAN {compiled}", parameters).all() # Получение плана
+    return [row[-1] for row in rows] # Возвращает описания шагов плана
+
+class TestSchema: # Определение класса для тестирования индексов схемы
+    @pytest.mark.parametrize("model", [Doctor, Specialization, Patient, Service]) # Проверка для каждого справочника
+    def test_lookup_by_name_uses_index(self, model): # Тест, что поиск справочника по имени использует уникальный индекс
+        plan = query_plan(select(model.id).where(model.name == "Dr. Smith")) # Получение плана поиска по имени
+        assert any(f"ix_{model.__tablename__}_name" in step for step in plan) # Проверка, что используется индекс по имени
+
+    def test_search_by_datetime_uses_index(self): # Тест, что поиск по времени использует индекс
+        plan = query_plan(appointment_rows().where(Appointment.appointment_time == datetime(2025, 2, 15, 10))) # Получение плана поиска по времени
+        assert any("SEARCH appointment USING INDEX ix_appointment_appointment_time" in step for step in plan) # Проверка, что используется индекс по времени
+
+    def test_doctor_time_range_uses_index(self): # Тест, что выборка назначений доктора за период использует составной индекс
+        plan = query_plan(select(Appointment.id).where(
+            Appointment.doctor_id == 1,
+            Appointment.appointment_time >= datetime(2025, 2, 15),
+            Appointment.appointment_time < datetime(2025, 2, 16)
+        )) # Получение плана выборки назначений доктора за день
+        assert any("ix_appointment_doctor_time" in step for step in plan) # Проверка, что используется составной индекс
+
+    def test_keyset_page_uses_index_order(self): # Тест, что постраничная выдача не сортирует таблицу целиком
+        plan = query_plan(ordered(after_cursor(appointment_rows(), "2025-02-15T10:00:00,1")).limit(50)) # Получение плана выборки страницы
+        assert any("SEARCH appointment USING INDEX ix_appointment_appointment_time (appointment_time>?)" in step for step in plan) # Проверка, что чтение индекса начинается с курсора
+        assert not any("TEMP B-TREE" in step for step in plan) # Проверка, что отдельная сортировка не нужна
+
+    def test_migrate_legacy_database(self): # Тест миграции базы данных, созданной без индексов
+        legacy_engine = create_engine("sqlite://") # Создание отдельной базы данных в памяти
+        with legacy_engine.begin() as connection: # Создание таблиц в прежнем виде без индексов
+            for table_name in ("doctor", "specialization", "patient", "service"):
+                connection.execute(text(f"CREATE TABLE {table_name} (id INTEGER PRIMARY KEY, name VARCHAR(250) NOT NULL)"))
+            connection.execute(text(
+                "CREATE TABLE appointment (id INTEGER PRIMARY KEY, doctor_id INTEGER, patient_id INTEGER, "
+                "service_id INTEGER, specialization_id INTEGER, appointment_time DATETIME NOT NULL)"
+            ))
+            connection.execute(text("INSERT INTO doctor (id, name) VALUES (1, 'Dr. Smith'), (2, 'Dr. Smith')")) # Дубликаты доктора
+            connection.execute(text("INSERT INTO patient (id, name) VALUES (1, 'John Doe')"))
+            connection.execute(text("INSERT INTO service (id, name) VALUES (1, 'Cleaning')"))
+            connection.execute(text("INSERT INTO specialization (id, name) VALUES (1, 'Dentistry')"))
+            connection.execute(text(
+                "INSERT INTO appointment VALUES (1, 1, 1, 1, 1, '2025-02-15 10:00:00'), (2, 2, 1, 1, 1, '2025-02-15 11:00:00')"
+            ))
+
+        migrate(legacy_engine) # Обновление схемы
+        statements = [] # Запросы повторной миграции
+        event.listen(legacy_engine, "before_cursor_execute", lambda conn, cursor, statement, *args: statements.append(statement))
+        migrate(legacy_engine) # Повторная миграция не должна ничего менять
+        assert statements == ["PRAGMA user_version"] # Проверка, что при запуске обновленной базы только сверяется версия схемы
+
+        with legacy_engine.connect() as connection: # Проверка результата миграции
+            assert connection.execute(text("SELECT COUNT(*) FROM doctor")).scalar() == 1 # Дубликаты объединены
+            assert connection.execute(text("SELECT DISTINCT doctor_id FROM appointment")).scalars().all() == [1] # Назначения перенаправлены
+            matches = connection.execute(text("SELECT rowid FROM appointment_fts WHERE appointment_fts MATCH 'smith'")).scalars().all() # Поиск по индексу
+            assert sorted(matches) == [1, 2] # Полнотекстовый индекс заполнен по существующим назначениям
+        index_names = {index["name"] for index in inspect(legacy_engine).get_indexes("appointment")} # Получение индексов таблицы назначений
+        assert {"ix_appointment_doctor_time", "ix_appointment_patient_time"} <= index_names # Составные индексы созданы
+        with legacy_engine.begin() as connection: # Проверка, что таблица назначений пересоздана с AUTOINCREMENT
+            assert "AUTOINCREMENT" in connection.execute(text("SELECT sql FROM sqlite_master WHERE name = 'appointment'")).scalar()
+            connection.execute(text("DELETE FROM appointment WHERE id = 2")) # Удаление назначения с наибольшим id
+            connection.execute(text("INSERT INTO appointment (doctor_id, patient_id, service_id, specialization_id, appointment_time) VALUES (1, 1, 1, 1, '2025-02-16 10:00:00')"))
+            assert connection.execute(text("SELECT MAX(id) FROM appointment")).scalar() == 3 # Проверка, что id удаленного назначения не выдан повторно
+            matches = connection.execute(text("SELECT rowid FROM appointment_fts WHERE appointment_fts MATCH 'smith'")).scalars().all() # Поиск по индексу
+            assert sorted(matches) == [1, 3] # Триггеры полнотекстового индекса восстановлены
+
+    def test_migrate_skips_merge_with_unique_indexes(self): # Тест, что объединение дубликатов не сканирует назначения, если уникальные индексы уже есть
+        indexed_engine = create_engine("sqlite://") # Создание отдельной базы данных в памяти
+        create_all(indexed_engine) # Таблицы с уникальными индексами, но без версии схемы
+        statements = [] # Запросы миграции
+        event.listen(indexed_engine, "before_cursor_execute", lambda conn, cursor, statement, *args: statements.append(statement))
+        migrate(indexed_engine) # Обновление схемы
+        assert not [statement for statement in statements if statement.startswith("UPDATE appointment")] # Проверка, что назначения не перенаправлялись
+        with indexed_engine.connect() as connection: # Проверка записанной версии схемы
+            assert connection.exec_driver_sql("PRAGMA user_version").scalar() == SCHEMA_VERSION
+
+class TestEngine: # Определение класса для тестирования настроек движка базы данных
+    def test_file_engine_pragmas(self, tmp_path): # Тест, что соединения с файлом получают настройки SQLite
+        file_engine = get_engine(f"sqlite:///{tmp_path / 'clinic.db'}") # Создание движка для файла во временном каталоге
+        with file_engine.connect() as connection: # Открытие соединения
+            assert connection.exec_driver_sql("PRAGMA journal_mode").scalar() == "wal" # Проверка режима журнала
+            assert connection.exec_driver_sql("PRAGMA synchronous").scalar() == 1 # Проверка режима синхронизации NORMAL
+            assert connection.exec_driver_sql("PRAGMA busy_timeout").scalar() == 5000 # Проверка времени ожидания блокировки
+        file_engine.dispose() # Закрытие соединений пула
+
+    def test_file_engine_persists_across_engines(self, tmp_path): # Тест, что данные в файле сохраняются после пересоздания движка
+        url = f"sqlite:///{tmp_path / 'clinic.db'}" # URL базы данных во временном каталоге
+        first_engine = get_engine(url) # Создание первого движка
+        create_all(first_engine) # Создание всех таблиц
+        with first_engine.begin() as connection: # Вставка доктора
+            connection.execute(Doctor.__table__.insert().values(name="Dr. Smith"))
+        first_engine.dispose() # Закрытие соединений первого движка
+        second_engine = get_engine(url) # Создание второго движка, как после перезапуска
+        with second_engine.connect() as connection: # Проверка сохраненных данных
+            assert connection.execute(select(Doctor.name)).scalar() == "Dr. Smith"
+        second_engine.dispose() # Закрытие соединений второго движка
+
+    def test_memory_engine_shared_between_threads(self): # Тест, что база данных в памяти одна для всех потоков
+        memory_engine = get_engine("sqlite://") # Создание движка базы данных в памяти
+        create_all(memory_engine) # Создание всех таблиц
+        with memory_engine.begin() as connection: # Вставка доктора
+            connection.execute(Doctor.__table__.insert().values(name="Dr. Smith"))
+        names = [] # Список имен, прочитанных в другом потоке
+        def read_names(): # Чтение имен докторов в другом потоке
+            with memory_engine.connect() as connection:
+                names.extend(connection.execute(select(Doctor.name)).scalars())
+        thread = threading.Thread(target=read_names) # Создание потока
+        thread.start() # Запуск потока
+        thread.join() # Ожидание завершения потока
+        assert names == ["Dr. Smith"] # Проверка, что другой поток видит те же данные
+
+class TestSessionLifecycle: # Определение класса для тестирования закрытия сессий
+    def exercise_endpoints(self, test_client, iteration): # Вспомогательная функция для вызова всех маршрутов
+        response = test_client.post("/appointments", json={ # Создание назначения
+            "doctor_name": "Dr. Smith",
+            "specialization_name": "Dentistry",
+            "patient_name": f"John Doe {iteration}",
+            "appointment_time": "2025-02-15T10:00",
+            "service": "Cleaning"
+        })
+        appointment_id = response.json["id"] # Получение id нового назначения
+        test_client.get("/appointments") # Получение списка назначений
+        test_client.get("/appointments?stream=1").get_data() # Потоковое получение списка назначений
+        test_client.get("/search?query=Smith") # Поиск по ключевому слову
+        test_client.get("/search?datetime=invalid") # Поиск с ошибкой формата
+        test_client.put(f"/appointments/{appointment_id}", json={ # Обновление назначения
+            "doctor_name": "Dr. Smith",
+            "specialization_name": "Dentistry",
+            "patient_name": f"John Doe {iteration}",
+            "appointment_time": "2025-02-15T11:00",
+            "service": "Cleaning"
+        })
+        test_client.delete(f"/appointments/{appointment_id}") # Удаление назначения
+
+    def test_sessions_closed_after_requests(self, test_client): # Тест, что после запросов не остается открытых сессий и соединений
+        before = db_stats.as_dict() # Счетчики до запросов
+        self.exercise_endpoints(test_client, 0) # Вызов всех маршрутов
+        after = db_stats.as_dict() # Счетчики после запросов
+        assert after["sessions_opened"] > before["sessions_opened"] # Проверка, что сессии использовались
+        assert after["open_sessions"] == before["open_sessions"] # Проверка, что все сессии закрыты
+        assert after["pool_checked_out"] == before["pool_checked_out"] # Проверка, что все соединения возвращены в пул
+        assert not DBSession.registry.has() # Проверка, что сессия запроса удалена после его завершения
+        assert test_client.get("/stats").json["open_sessions"] == after["open_sessions"] # Проверка маршрута счетчиков
+
+    def test_soak_memory_is_flat(self, test_client): # Нагрузочный тест, что память не растет при многократных запросах
+        for iteration in range(30): # Прогрев кэшей запросов и интерпретатора
+            self.exercise_endpoints(test_client, iteration)
+        before = db_stats.as_dict() # Счетчики до нагрузки
+        tracemalloc.start() # Начало отслеживания выделения памяти
+        try:
+            warm = tracemalloc.get_traced_memory()[0] # Объем памяти после прогрева
+            for iteration in range(200): # Многократный вызов всех маршрутов
+                self.exercise_endpoints(test_client, iteration)
+            growth = tracemalloc.get_traced_memory()[0] - warm # Прирост памяти
+        finally:
+            tracemalloc.stop() # Завершение отслеживания выделения памяти
+        assert growth < 1024 * 1024 # Проверка, что прирост памяти меньше 1 МБ
+        after = db_stats.as_dict() # Счетчики после нагрузки
+        assert after["open_sessions"] == before["open_sessions"] # Проверка, что нет незакрытых сессий
+        assert after["pool_checked_out"] == before["pool_checked_out"] # Проверка, что нет утекших соединений
+
+class TestScheduling: # Определение класса для тестирования расписания докторов
+    def book(self, test_client, doctor_name, appointment_time, service="Cleaning"): # Вспомогательная функция для создания назначения
+        return test_client.post("/appointments", json={
+            "doctor_name": doctor_name,
+            "specialization_name": "Dentistry",
+            "patient_name": "John Doe",
+            "appointment_time": appointment_time,
+            "service": service
+        }) # Возвращает ответ на создание назначения
+
+    def test_doctor_schedule_conflicts(self): # Тест проверки пересечений по расписанию доктора
+        day = datetime(2025, 2, 15) # День расписания
+        schedule = DoctorSchedule([
+            (day.replace(hour=10), day.replace(hour=10, minute=30)),
+            (day.replace(hour=12), day.replace(hour=13)),
+            (day.replace(hour=12, minute=30), day.replace(hour=13, minute=30)) # Пересекающиеся интервалы объединяются
+        ]) # Создание расписания из занятых интервалов
+        assert schedule.conflicts(day.replace(hour=10, minute=15), day.replace(hour=10, minute=45)) # Пересечение с началом
+        assert schedule.conflicts(day.replace(hour=13, minute=15), day.replace(hour=14)) # Пересечение с объединенным интервалом
+        assert not schedule.conflicts(day.replace(hour=10, minute=30), day.replace(hour=11)) # Вплотную после занятого интервала
+        assert not schedule.conflicts(day.replace(hour=11), day.replace(hour=12)) # Вплотную до занятого интервала
+
+    def test_overlapping_booking_rejected(self, test_client): # Тест, что пересекающееся назначение к тому же доктору отклоняется
+        assert self.book(test_client, "Dr. Smith", "2025-02-15T10:00").status_code == 201 # Первое назначение с 10:00 до 10:30
+        response = self.book(test_client, "Dr. Smith", "2025-02-15T10:15") # Назначение, пересекающееся с первым
+        assert response.status_code == 409 # Проверка, что статус ответа 409 (Conflict)
+        assert response.json == {"error": "Doctor is already booked at this time"} # Проверка, что ответ содержит ожидаемое сообщение об ошибке
+        assert self.book(test_client, "Dr. Smith", "2025-02-15T10:30").status_code == 201 # Назначение сразу после первого допустимо
+        assert self.book(test_client, "Dr. Brown", "2025-02-15T10:15").status_code == 201 # Другой доктор в то же время допустим
+        assert len(test_client.get("/appointments").json) == 3 # Проверка, что отклоненное назначение не сохранено
+
+    def test_overlapping_edit_rejected(self, test_client): # Тест, что перенос назначения на занятое время отклоняется
+        self.book(test_client, "Dr. Smith", "2025-02-15T10:00") # Первое назначение
+        appointment_id = self.book(test_client, "Dr. Smith", "2025-02-15T11:00").json["id"] # Второе назначение
+        response = test_client.put(f"/appointments/{appointment_id}", json={ # Перенос второго назначения на время первого
+            "doctor_name": "Dr. Smith",
+            "specialization_name": "Dentistry",
+            "patient_name": "John Doe",
+            "appointment_time": "2025-02-15T10:10",
+            "service": "Cleaning"
+        })
+        assert response.status_code == 409 # Проверка, что статус ответа 409 (Conflict)
+        times = [a["appointment_time"] for a in test_client.get("/appointments").json] # Получение времени назначений
+        assert times == ["2025-02-15T10:00", "2025-02-15T11:00"] # Проверка, что изменение отменено
+
+    def test_doctor_availability(self, test_client): # Тест для получения свободного времени доктора через API
+        self.book(test_client, "Dr. Smith", "2025-02-15T10:00") # Назначение с 10:00 до 10:30
+        doctor_id = 1 # id созданного доктора
+        self.book(test_client, "Dr. Smith", "2025-02-15T17:45") # Назначение с 17:45 до 18:15
+        response = test_client.get(f"/doctors/{doctor_id}/availability?from=2025-02-15&to=2025-02-16&duration=60") # Запрос свободных промежутков от часа
+        assert response.status_code == 200 # Проверка, что статус ответа 200 (OK)
+        assert response.json["free"] == [
+            {"start": "2025-02-15T09:00", "end": "2025-02-15T10:00"},
+            {"start": "2025-02-15T10:30", "end": "2025-02-15T17:45"},
+            {"start": "2025-02-16T09:00", "end": "2025-02-16T18:00"}
+        ] # Проверка свободных промежутков за два дня
+
+    def test_doctor_availability_errors(self, test_client): # Тест для проверки ошибок запроса свободного времени
+        assert test_client.get("/doctors/1/availability?from=2025-02-15").status_code == 404 # Доктор не существует
+        assert test_client.get("/doctors/1/availability?from=15.02.2025").status_code == 400 # Неверный формат даты
+        assert test_client.get("/doctors/1/availability?from=2025-02-15&to=2025-02-14").status_code == 400 # Конец периода раньше начала
+
+class TestResponseCache: # Определение класса для тестирования кэша ответов
+    def book(self, test_client, appointment_time): # Вспомогательная функция для создания назначения
+        return test_client.post("/appointments", json={
+            "doctor_name": "Dr. Smith",
+            "specialization_name": "Dentistry",
+            "patient_name": "John Doe",
+            "appointment_time": appointment_time,
+            "service": "Cleaning"
+        }) # Возвращает ответ на создание назначения
+
+    def test_repeated_poll_served_from_cache(self, test_client, statement_counter): # Тест, что повторный запрос без изменений не читает назначения
+        self.book(test_client, "2025-02-15T10:00") # Создание назначения
+        first = test_client.get("/appointments?limit=10") # Первый запрос заполняет кэш
+        statement_counter.clear() # Сброс счетчика запросов
+        second = test_client.get("/appointments?limit=10") # Повторный запрос
+        assert second.json == first.json # Проверка, что ответ совпадает
+        assert second.headers["ETag"] == first.headers["ETag"] # Проверка, что версия ответа совпадает
+        assert second.headers["Content-Type"] == "application/json" # Проверка, что тип содержимого сохранен
+        assert len(statement_counter) == 1 and "cache_generation" in statement_counter[0] # Проверка, что прочитан только номер поколения
+
+    def test_if_none_match_returns_not_modified(self, test_client): # Тест, что неизменившийся ответ возвращается как 304
+        self.book(test_client, "2025-02-15T10:00") # Создание назначения
+        etag = test_client.get("/search?query=Smith").headers["ETag"] # Получение версии ответа
+        response = test_client.get("/search?query=Smith", headers={"If-None-Match": etag}) # Запрос с версией клиента
+        assert response.status_code == 304 # Проверка, что статус ответа 304 (Not Modified)
+        assert response.get_data() == b"" # Проверка, что тело ответа не передается
+
+    def test_writes_invalidate_cache(self, test_client): # Тест, что создание, изменение и удаление назначения обновляют ответ
+        assert test_client.get("/appointments").json == [] # Кэширование пустого списка
+        appointment_id = self.book(test_client, "2025-02-15T10:00").json["id"] # Создание назначения
+        assert len(test_client.get("/appointments").json) == 1 # Проверка, что кэш обновлен после создания
+        etag = test_client.get("/search?query=Smith").headers["ETag"] # Кэширование результата поиска
+        test_client.put(f"/appointments/{appointment_id}", json={ # Переименование доктора через обновление назначения
+            "doctor_name": "Dr. Brown",
+            "specialization_name": "Dentistry",
+            "patient_name": "John Doe",
+            "appointment_time": "2025-02-15T10:00",
+            "service": "Cleaning"
+        })
+        response = test_client.get("/search?query=Smith", headers={"If-None-Match": etag}) # Запрос со старой версией
+        assert response.status_code == 200 and response.json == [] # Проверка, что кэш обновлен после изменения
+        test_client.delete(f"/appointments/{appointment_id}") # Удаление назначения
+        assert test_client.get("/appointments").json == [] # Проверка, что кэш обновлен после удаления
+
+@pytest.fixture(scope="function") # Определение фикстуры для создания клиента тестирования ASGI-приложения
+def asgi_client(): # Функция создания клиента тестирования ASGI-приложения
+    pytest.importorskip("aiosqlite") # Тесты пропускаются, если асинхронный драйвер SQLite не установлен
+    testclient = pytest.importorskip("starlette.testclient") # Тесты пропускаются, если Starlette не установлен
+    import asgi # Импорт ASGI-приложения после проверки зависимостей
+    async def drop_tables(): # Удаление таблиц асинхронной базы данных после теста
+        async with asgi.engine.begin() as connection:
+            await connection.run_sync(drop_all)
+    with testclient.TestClient(asgi.app) as client: # Запуск приложения с обновлением схемы при старте
+        yield client # Передача управления тесту
+        client.portal.call(drop_tables) # Очистка базы данных в цикле событий приложения
+
+class TestAsgi: # Определение класса для тестирования ASGI-приложения
+    def book(self, client, appointment_time, doctor_name="Dr. Smith"): # Создание назначения через API
+        return client.post("/appointments", json={
+            "doctor_name": doctor_name,
+            "specialization_name": "Dentistry",
+            "patient_name": "John Doe",
+            "appointment_time": appointment_time,
+            "service": "Cleaning"
+        }) # Возвращает ответ на создание назначения
+
+    def test_appointment_lifecycle(self, asgi_client): # Тест создания, обновления, поиска и удаления назначения через ASGI-приложение
+        assert asgi_client.get("/").json() == {"message": "Welcome to the Dental Clinic API"} # Проверка главной страницы
+        response = self.book(asgi_client, "2025-02-15T10:00") # Создание назначения
+        assert response.status_code == 201 # Проверка, что статус ответа 201 (Created)
+        appointment_id = response.json()["id"] # Получение id назначения
+        assert self.book(asgi_client, "2025-02-15T10:15").status_code == 409 # Проверка, что пересекающееся назначение отклоняется
+        response = asgi_client.put(f"/appointments/{appointment_id}", json={
+            "doctor_name": "Dr. Brown",
+            "specialization_name": "Dentistry",
+            "patient_name": "John Doe",
+            "appointment_time": "2025-02-15T11:00",
+            "service": "Cleaning"
+        }) # Обновление назначения
+        assert response.status_code == 200 # Проверка, что статус ответа 200 (OK)
+        assert asgi_client.patch(f"/appointments/{appointment_id}", json={"patient_name": "Jane Roe"}).status_code == 200 # Частичное обновление назначения
+        results = asgi_client.get("/search?query=Brown").json() # Поиск по новому имени доктора
+        assert [row["appointment_time"] for row in results] == ["2025-02-15T11:00"] # Проверка, что найдено обновленное назначение
+        assert asgi_client.get("/search?datetime=bad").status_code == 400 # Проверка ошибки параметров поиска
+        assert asgi_client.delete(f"/appointments/{appointment_id}").status_code == 200 # Удаление назначения
+        assert asgi_client.delete(f"/appointments/{appointment_id}").status_code == 404 # Проверка, что повторное удаление возвращает 404
+        assert asgi_client.post("/appointments", content=b"not json").status_code == 400 # Проверка ошибки тела запроса
+
+    def test_pagination_and_stream(self, asgi_client): # Тест постраничной и потоковой выдачи назначений через ASGI-приложение
+        for hour in range(10, 15): # Создание пяти назначений
+            assert self.book(asgi_client, f"2025-02-15T{hour}:00").status_code == 201
+        first = asgi_client.get("/appointments?limit=3") # Первая страница
+        assert len(first.json()) == 3 # Проверка размера страницы
+        second = asgi_client.get("/appointments", params={"limit": 3, "after": first.headers["X-Next-Cursor"]}) # Вторая страница по курсору
+        assert len(second.json()) == 2 and "X-Next-Cursor" not in second.headers # Проверка, что это последняя страница
+        streamed = asgi_client.get("/appointments?stream=1") # Потоковая выдача
+        assert streamed.json() == first.json() + second.json() # Проверка, что потоковая выдача совпадает со страницами
+        assert asgi_client.get("/appointments?limit=0").status_code == 400 # Проверка ошибки параметров постраничной выдачи
+
+    def test_doctor_availability(self, asgi_client): # Тест получения свободного времени доктора через ASGI-приложение
+        self.book(asgi_client, "2025-02-15T10:00") # Создание назначения
+        doctor_id = 1 # id созданного доктора
+        response = asgi_client.get(f"/doctors/{doctor_id}/availability?from=2025-02-15") # Запрос свободного времени
+        assert response.json()["free"] == [
+            {"start": "2025-02-15T09:00", "end": "2025-02-15T10:00"},
+            {"start": "2025-02-15T10:30", "end": "2025-02-15T18:00"}
+        ] # Проверка свободных промежутков до и после назначения
+        assert asgi_client.get("/doctors/999/availability?from=2025-02-15").status_code == 404 # Проверка отсутствия доктора
+
+class TestBenchmark: # Определение класса для тестирования набора измерений производительности
+    def test_seed_schedules_do_not_overlap(self, db_session): # Тест, что синтетические назначения не пересекаются и попадают в рабочие дни
+        count = seed(engine, doctors=3, patients=20, services=4, days=7, per_day=6) # Заполнение базы данных за неделю
+        assert count == db_session.query(Appointment).count() > 0 # Проверка, что все назначения вставлены
+        assert db_session.execute(conflicting_appointments()).first() is None # Проверка, что у докторов нет пересекающихся назначений
+        times = db_session.execute(select(Appointment.appointment_time)).scalars().all() # Время всех назначений
+        assert all(moment.weekday() < 5 and 9 <= moment.hour < 18 for moment in times) # Проверка, что назначения только в рабочее время
+
+    def test_endpoint_benchmark(self, test_client): # Тест измерения задержек и количества SQL-запросов API
+        count = seed(engine, doctors=2, patients=10, days=7, per_day=4) # Заполнение базы данных
+        results = benchmark_endpoints(test_client, engine, response_cache, iterations=3) # Измерение запросов к API
+        assert set(results) == {
+            'GET /appointments', 'GET /search keyword', 'GET /search datetime',
+            'POST /appointments', 'PUT /appointments', 'DELETE /appointments'
+        } # Проверка, что измерены все запросы
+        for result in results.values(): # Проверка сводки каждого запроса
+            assert result['runs'] == 3 and 0 < result['p50_ms'] <= result['p99_ms'] <= result['max_ms'] # Проверка процентилей
+        assert results['GET /appointments']['statements_max'] == 2 # Номер поколения кэша и одна страница назначений
+        assert len(test_client.get("/appointments").json) == count # Проверка, что созданные при измерении назначения удалены
+
+    def test_compare_to_baseline(self): # Тест сравнения с базовым прогоном
+        baseline = {'GET /search keyword': {'p50_ms': 10.0, 'statements_max': 2}} # Базовый прогон
+        assert compare_to_baseline({'GET /search keyword': {'p50_ms': 12.0, 'statements_max': 2}}, baseline) == [] # Рост в пределах допуска
+        assert compare_to_baseline({'GET /search keyword': {'p50_ms': 20.0, 'statements_max': 2}}, baseline) != [] # Рост медианы больше допуска
+        assert compare_to_baseline({'GET /search keyword': {'p50_ms': 10.0, 'statements_max': 3}}, baseline) != [] # Рост количества SQL-запросов
+        assert compare_to_baseline({'GET /new': {'p50_ms': 99.0}}, baseline) == [] # Новые измерения не сравниваются
+
+class TestProfiling: # Определение класса для тестирования метрик запросов и профилей медленных запросов
+    @pytest.fixture(autouse=True) # Включение сбора метрик на время теста
+    def enable_metrics(self, monkeypatch, tmp_path): # Функция включения сбора метрик с сохранением профилей во временный каталог
+        monkeypatch.setattr(profiler, "enabled", True)
+        monkeypatch.setattr(profiler, "profile_dir", str(tmp_path))
+
+    def test_metrics_disabled_by_default(self, test_client, monkeypatch): # Тест, что без включения метрики недоступны и заголовок не добавляется
+        monkeypatch.setattr(profiler, "enabled", False) # Выключение сбора метрик
+        assert test_client.get("/metrics").status_code == 404 # Проверка, что метрики недоступны
+        assert "Server-Timing" not in test_client.get("/").headers # Проверка, что запросы не измеряются
+
+    def test_metrics_histograms(self, test_client): # Тест гистограмм длительности запросов и SQL-запросов
+        response = test_client.post("/appointments", json={
+            "doctor_name": "Dr. Metrics",
+            "specialization_name": "Dentistry",
+            "patient_name": "John Doe",
+            "appointment_time": "2025-02-15T10:00",
+            "service": "Cleaning"
+        }) # Создание назначения
+        assert response.headers["Server-Timing"].startswith("app;dur=") # Проверка заголовка с временем запроса и базы данных
+        response = test_client.get("/metrics") # Получение метрик
+        assert response.status_code == 200 and response.mimetype == "text/plain" # Проверка формата ответа
+        text = response.get_data(as_text=True) # Текст метрик
+        assert '# TYPE clinic_http_request_duration_seconds histogram' in text # Проверка типа метрики
+        assert 'clinic_http_request_duration_seconds_bucket{endpoint="new_appointment",method="POST",status="201",le="+Inf"} 1' in text # Проверка учета запроса
+        assert 'clinic_sql_statement_duration_seconds_count{operation="INSERT"}' in text # Проверка учета SQL-запросов по виду
+        assert '# TYPE clinic_db_open_sessions gauge' in text # Проверка текущих значений базы данных
+        assert '# TYPE clinic_db_sessions_opened_total counter' in text and 'clinic_db_pool_checkouts_total ' in text # Проверка растущих счетчиков базы данных
+
+    def test_histogram_buckets_are_cumulative(self): # Тест накопительных интервалов гистограммы
+        histogram = Histogram("test_seconds", "Test.", (0.1, 1.0), ("route",)) # Гистограмма с двумя границами
+        for value in (0.05, 0.1, 0.5, 2.0): # Значения в каждом интервале и на границе
+            histogram.observe(value, "a")
+        assert histogram.render()[2:] == [
+            'test_seconds_bucket{route="a",le="0.1"} 2',
+            'test_seconds_bucket{route="a",le="1.0"} 3',
+            'test_seconds_bucket{route="a",le="+Inf"} 4',
+            'test_seconds_sum{route="a"} 2.65',
+            'test_seconds_count{route="a"} 4'
+        ] # Проверка строк метрики
+
+    def test_slow_request_profile_dumped(self, test_client, monkeypatch, tmp_path, caplog): # Тест сохранения профиля запроса дольше порога
+        monkeypatch.setattr(profiler, "threshold_ms", 0.0) # Любой запрос считается медленным
+        test_client.get("/appointments") # Выполнение запроса
+        dumps = list(tmp_path.glob("*-GET-get_appointments-*ms.prof")) # Поиск файла профиля
+        assert len(dumps) == 1 # Проверка, что профиль сохранен
+        assert pstats.Stats(str(dumps[0])).total_calls > 0 # Проверка, что файл является профилем cProfile
+        assert "Slow request GET /appointments" in caplog.text and "SELECT" in caplog.text # Проверка сообщения с SQL-запросами
+
+    def test_one_request_profiled_at_a_time(self, test_client, monkeypatch, tmp_path): # Тест, что запрос во время профилирования другого запроса не профилируется
+        monkeypatch.setattr(profiler, "threshold_ms", 0.0) # Любой запрос считается медленным
+        with profiler.profile_lock: # Другой запрос уже профилируется
+            assert test_client.get("/appointments").status_code == 200 # Проверка, что запрос выполнен без ошибки
+        assert list(tmp_path.glob("*.prof")) == [] # Проверка, что профиль не сохранен
+
+    def test_profile_stopped_after_exception(self, monkeypatch): # Тест, что профилировщик останавливается, если after_request не выполнен
+        monkeypatch.setattr(profiler, "threshold_ms", 0.0) # Любой запрос считается медленным
+        with app.test_request_context("/appointments"): # Запрос, завершившийся исключением до after_request
+            profiler.start_request()
+            assert profiler.profile_lock.locked() # Проверка, что запрос профилируется
+            profiler.teardown_request(RuntimeError("failed"))
+        assert not profiler.profile_lock.locked() # Проверка, что слот профилирования освобожден
+        other = cProfile.Profile() # Профилирование снова доступно в этом потоке
+        other.enable()
+        other.disable()
+
+class TestPatch: # Определение класса для тестирования частичного и пакетного изменения назначений
+    def book(self, test_client, doctor_name, appointment_time): # Создание назначения через API
+        return test_client.post("/appointments", json={
+            "doctor_name": doctor_name,
+            "specialization_name": "Dentistry",
+            "patient_name": "John Doe",
+            "appointment_time": appointment_time,
+            "service": "Cleaning"
+        }).json["id"] # Возвращает id назначения
+
+    def test_patch_repoints_without_renaming(self, test_client, statement_counter, db_session): # Тест, что PATCH перенаправляет назначение, не переименовывая доктора
+        first_id = self.book(test_client, "Dr. Smith", "2025-02-15T10:00") # Назначение, которое изменяется
+        other_id = self.book(test_client, "Dr. Smith", "2025-02-15T11:00") # Другое назначение того же доктора
+        self.book(test_client, "Dr. Brown", "2025-02-16T10:00") # Существующий доктор, на которого переназначается запись
+        statement_counter.clear() # Сброс счетчика запросов
+        response = test_client.patch(f"/appointments/{first_id}", json={"doctor_name": "Dr. Brown"}) # Изменение только доктора
+        assert response.status_code == 200 # Проверка, что статус ответа 200 (OK)
+        updates = [statement for statement in statement_counter if statement.startswith("UPDATE")] # Выполненные запросы UPDATE
+        assert len(updates) == 1 and updates[0].startswith("UPDATE appointment SET doctor_id") # Проверка, что изменен только столбец назначения одним запросом
+        names = dict(db_session.execute(select(Appointment.id, Doctor.name).join(Doctor, Appointment.doctor_id == Doctor.id)).all()) # Имена докторов назначений
+        assert names[first_id] == "Dr. Brown" and names[other_id] == "Dr. Smith" # Проверка, что другое назначение и строка доктора не изменились
+        assert db_session.query(Doctor).count() == 2 # Проверка, что новые доктора не созданы
+        appointment = test_client.get("/search?query=Brown").json # Назначения доктора Brown
+        assert {row["appointment_time"] for row in appointment} == {"2025-02-15T10:00", "2025-02-16T10:00"} # Проверка, что время не изменилось
+
+    def test_patch_errors(self, test_client): # Тест ошибок частичного обновления назначения
+        first_id = self.book(test_client, "Dr. Smith", "2025-02-15T10:00") # Первое назначение
+        second_id = self.book(test_client, "Dr. Smith", "2025-02-15T11:00") # Второе назначение
+        assert test_client.patch(f"/appointments/{first_id}", json={}).status_code == 400 # Нет изменяемых полей
+        assert test_client.patch(f"/appointments/{first_id}", json={"room": "1"}).status_code == 400 # Неизвестное поле
+        assert test_client.patch(f"/appointments/{first_id}", json={"appointment_time": "15.02.2025"}).status_code == 400 # Неверный формат даты
+        assert test_client.patch(f"/appointments/{first_id}", json={"patient_name": ""}).status_code == 400 # Пустое название
+        assert test_client.patch("/appointments/999", json={"patient_name": "Jane Roe"}).status_code == 404 # Назначение не существует
+        response = test_client.patch(f"/appointments/{second_id}", json={"appointment_time": "2025-02-15T10:15"}) # Перенос на занятое время
+        assert response.status_code == 409 # Проверка, что статус ответа 409 (Conflict)
+        assert test_client.get("/search?datetime=2025-02-15T11:00").json[0]["id"] == second_id # Проверка, что назначение не перенесено
+
+    def test_move_doctor_day(self, test_client, statement_counter): # Тест переноса всех назначений доктора за день одним запросом
+        for hour in (10, 11, 12): # Назначения доктора в переносимый день
+            self.book(test_client, "Dr. Smith", f"2025-02-15T{hour}:00")
+        self.book(test_client, "Dr. Smith", "2025-02-16T10:00") # Назначение в другой день не переносится
+        statement_counter.clear() # Сброс счетчика запросов
+        response = test_client.patch("/doctors/1/appointments?from=2025-02-15&to=2025-02-15", json={"move_to": "2025-02-17"}) # Перенос дня
+        assert response.status_code == 200 and response.json["updated"] == 3 # Проверка количества перенесенных назначений
+        assert len([statement for statement in statement_counter if statement.startswith("UPDATE appointment")]) == 1 # Проверка, что назначения перенесены одним запросом
+        assert test_client.get("/search?from=2025-02-15&to=2025-02-15").json == [] # Проверка, что день освобожден
+        moved = test_client.get("/search?datetime=2025-02-17T11:00").json # Поиск по точному времени после переноса
+        assert len(moved) == 1 and moved[0]["doctor"] == "Dr. Smith" # Проверка, что время сохранено в том же формате
+        assert len(test_client.get("/search?from=2025-02-16&to=2025-02-16").json) == 1 # Проверка, что другой день не изменен
+
+    def test_move_doctor_day_out_of_range(self, test_client): # Тест, что сдвиг за пределы диапазона дат отклоняется с ошибкой 400
+        self.book(test_client, "Dr. Smith", "2025-02-17T10:00") # Назначение в обычный день
+        self.book(test_client, "Dr. Smith", "9999-12-31T23:00") # Назначение в последний день диапазона SQLite
+        for query, body in (
+            ("from=2025-02-17", {"shift_minutes": 1000000000000}), # Слишком большой сдвиг
+            ("from=2025-02-17&to=2025-02-17", {"move_to": "0001-01-01"}), # Перенос слишком далеко назад
+            ("from=9999-12-31", {"shift_minutes": 120}), # Время после переноса больше 9999 года
+        ):
+            response = test_client.patch(f"/doctors/1/appointments?{query}", json=body) # Выполнение PATCH-запроса
+            assert response.status_code == 400 and response.json == {"error": "Shift is out of range"} # Проверка сообщения об ошибке
+        times = [a["appointment_time"] for a in test_client.get("/appointments").json] # Время назначений после запросов
+        assert times == ["2025-02-17T10:00", "9999-12-31T23:00"] # Проверка, что назначения не изменены
+
+    def test_move_doctor_day_conflict(self, test_client): # Тест, что перенос на занятый день отменяется целиком
+        self.book(test_client, "Dr. Smith", "2025-02-15T10:00") # Переносимое назначение
+        self.book(test_client, "Dr. Smith", "2025-02-15T14:00") # Переносимое назначение
+        blocking_id = self.book(test_client, "Dr. Smith", "2025-02-16T14:00") # Занятое время в новом дне
+        response = test_client.patch("/doctors/1/appointments?from=2025-02-15&to=2025-02-15", json={"shift_minutes": 24 * 60}) # Сдвиг на сутки
+        assert response.status_code == 409 and response.json["conflicts"] == [blocking_id] # Проверка ошибки с id занятого назначения
+        assert len(test_client.get("/search?from=2025-02-15&to=2025-02-15").json) == 2 # Проверка, что ни одно назначение не перенесено
+        response = test_client.patch("/doctors/1/appointments?from=2025-02-15&to=2025-02-15", json={"doctor_name": "Dr. Brown"}) # Передача дня другому доктору
+        assert response.status_code == 200 and response.json["updated"] == 2 # Проверка количества переназначенных назначений
+        assert test_client.patch("/doctors/1/appointments", json={"doctor_name": "Dr. Brown"}).status_code == 400 # Период обязателен
+        assert test_client.patch("/doctors/1/appointments?from=bad", json={"doctor_name": "Dr. Brown"}).status_code == 400 # Неверный формат даты
+
+class TestArchive: # Определение класса для тестирования архивации старых назначений
+    @pytest.fixture # Определение фикстуры архива в памяти, подключенного к приложению
+    def test_archive(self, monkeypatch): # Функция создания архива на время теста
+        test_archive = Archive("sqlite://") # Отдельная база данных в памяти
+        monkeypatch.setattr("app.archive", test_archive) # Поиск приложения использует этот архив
+        yield test_archive # Передача архива тесту
+        archive_metadata.drop_all(test_archive.get_engine()) # Удаление таблиц архива
+
+    def book(self, test_client, patient_name, appointment_time): # Создание назначения через API
+        return test_client.post("/appointments", json={
+            "doctor_name": "Dr. Smith",
+            "specialization_name": "Dentistry",
+            "patient_name": patient_name,
+            "appointment_time": appointment_time,
+            "service": "Cleaning"
+        }).json["id"] # Возвращает id назначения
+
+    def test_old_appointments_moved_to_archive(self, test_client, test_archive, db_session): # Тест переноса старых назначений и поиска с include_archived
+        old_ids = [self.book(test_client, "John Doe", f"2020-03-0{day}T10:00") for day in (2, 3, 4)] # Старые назначения
+        recent_id = self.book(test_client, "John Doe", "2025-03-03T10:00") # Недавнее назначение
+        assert archive_appointments(engine, test_archive, datetime(2021, 1, 1), chunk_size=2) == 3 # Перенос порциями по две строки
+        assert [row.id for row in db_session.query(Appointment)] == [recent_id] # Проверка, что в основной таблице осталось только недавнее назначение
+
+        assert [row["id"] for row in test_client.get("/search?query=Doe").json] == [recent_id] # Без include_archived архив не используется
+        results = test_client.get("/search?query=Doe&include_archived=true").json # Поиск по ключевому слову вместе с архивом
+        assert [row["id"] for row in results] == [recent_id, *old_ids] # Сначала текущие назначения, затем архивные
+        assert results[1] == {"id": old_ids[0], "doctor": "Dr. Smith", "specialization": "Dentistry", "patient": "John Doe", "service": "Cleaning", "appointment_time": "2020-03-02T10:00"} # Проверка, что архив хранит названия
+        results = test_client.get("/search?from=2020-03-03&to=2025-12-31&include_archived=1").json # Поиск по периоду вместе с архивом
+        assert [row["id"] for row in results] == [*old_ids[1:], recent_id] # Результаты упорядочены по времени
+        assert test_client.get("/search?datetime=2020-03-02T10:00&include_archived=1").json[0]["id"] == old_ids[0] # Поиск по точному времени в архиве
+
+    def test_archive_rerun_and_purge(self, test_client, test_archive): # Тест повторного переноса и удаления по сроку хранения
+        appointment_id = self.book(test_client, "John Doe", "2020-03-02T10:00") # Старое назначение
+        archive_appointments(engine, test_archive, datetime(2021, 1, 1)) # Перенос в архив
+        with engine.begin() as connection: # Имитация сбоя после фиксации архива: назначение снова в основной таблице
+            connection.execute(Appointment.__table__.insert().values(id=appointment_id, doctor_id=1, specialization_id=1, patient_id=1, service_id=1, appointment_time=datetime(2020, 3, 2, 10)))
+        assert archive_appointments(engine, test_archive, datetime(2021, 1, 1)) == 1 # Повторный перенос
+        assert len(test_client.get("/search?query=Doe&include_archived=true").json) == 1 # Проверка, что индекс архива не содержит дубликатов
+        etag = test_client.get("/search?query=Doe&include_archived=true").headers["ETag"] # Версия ответа с архивом
+        assert purge_archive(engine, test_archive, datetime(2021, 1, 1)) == 1 # Удаление по сроку хранения
+        response = test_client.get("/search?query=Doe&include_archived=true", headers={"If-None-Match": etag}) # Запрос со старой версией
+        assert response.status_code == 200 and response.json == [] # Проверка, что кэш ответов обновлен и индекс архива очищен
+
+    def test_archived_ids_not_reused(self, test_client, test_archive): # Тест, что новое назначение не получает id архивного и не перезаписывает его
+        self.book(test_client, "John Doe", "2025-03-03T10:00") # Недавнее назначение
+        old_id = self.book(test_client, "OldPatient", "2020-03-02T10:00") # Старое назначение с наибольшим id
+        archive_appointments(engine, test_archive, datetime(2021, 1, 1)) # Перенос в архив
+        new_id = self.book(test_client, "NewPatient", "2020-03-03T10:00") # Новое назначение после удаления строки с наибольшим id
+        assert new_id != old_id # Проверка, что id не выдан повторно
+        archive_appointments(engine, test_archive, datetime(2021, 1, 1)) # Повторный перенос
+        results = test_client.get("/search?from=2020-01-01&to=2020-12-31&include_archived=1").json # Архивные назначения
+        assert [(row["id"], row["patient"]) for row in results] == [(old_id, "OldPatient"), (new_id, "NewPatient")] # Проверка, что обе строки в архиве
+
+        with test_archive.get_engine().begin() as connection: # Архив, заполненный до AUTOINCREMENT, может содержать id больше счетчика
+            connection.execute(text("UPDATE archived_appointment SET id = 100 WHERE id = :id"), {"id": new_id})
+        archive_appointments(engine, test_archive, datetime(2021, 1, 1)) # Перенос поднимает счетчик основной базы данных до архива
+        assert self.book(test_client, "Jane Doe", "2025-03-04T10:00") == 101 # Проверка, что следующий id больше архивных
+
+    def test_archive_opened_lazily(self, tmp_path): # Тест, что поиск без архива не создает файл архива
+        path = tmp_path / "archive.db" # Путь к файлу архива
+        lazy_archive = Archive(f"sqlite:///{path}") # Архив в файле
+        assert lazy_archive.search({"query": "Doe"}) == [] and lazy_archive.engine is None # Проверка, что подключения нет
+        assert not path.exists() # Проверка, что файл не создан